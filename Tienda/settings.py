@@ -103,6 +103,16 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché (fragmentos de tarjetas, contadores, etc.). En memoria por proceso;
+# en producción con varios procesos conviene Redis o Memcached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tienda',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
 # ✅ CONFIGURACIONES PERSONALIZADAS CRÍTICAS
 AUTH_USER_MODEL = 'usuarios.CustomUser'  # Modelo de usuario personalizado
 
@@ -197,4 +207,101 @@ MAX_COMMISSION_RATE = 25
 # Colores principales (opcional para personalizar)
 PRIMARY_COLOR = "#3B82F6"  # Azul
 SECONDARY_COLOR = "#10B981"  # Verde
-ACCENT_COLOR = "#8B5CF6"  # Morado
\ No newline at end of file
+ACCENT_COLOR = "#8B5CF6"  # Morado
+
+# ============================================================================
+# 🛍️ CONFIGURACIÓN DEL CATÁLOGO
+# ============================================================================
+
+# Productos por página en el catálogo (paginación por cursor)
+CATALOGO_TAMANO_PAGINA = 24
+
+# Motor de búsqueda de productos. Si no se define se elige según la base de
+# datos (FTS5 en SQLite, tsvector en PostgreSQL).
+# BUSQUEDA_BACKEND = 'productos.busqueda.BackendPostgres'
+
+# Autocompletado del buscador: sugerencias por consulta y segundos tras los
+# que cada proceso recarga su índice en memoria (cambios de otros procesos)
+AUTOCOMPLETAR_LIMITE = 8
+AUTOCOMPLETAR_TTL = 300
+
+# Segundos que se guarda el HTML de cada tarjeta de producto (además se
+# invalida al guardar o borrar el producto)
+TARJETAS_CACHE_TTL = 60 * 60 * 24
+
+# Totales del catálogo (segundos). Se invalidan al guardar/borrar productos;
+# el TTL es solo un respaldo
+CATALOGO_TOTALES_TTL = 300
+
+# Caché de páginas completas para visitantes anónimos (landing, catálogo,
+# detalle). Con GZIP el HTML se guarda y se entrega ya comprimido
+PAGINAS_CACHE_TTL = 300
+PAGINAS_CACHE_GZIP = True
+
+# Variantes de imágenes de producto (media/productos/variantes/): segundos
+# antes de volver a intentar con una imagen que no se pudo procesar
+IMAGENES_REINTENTO_FALLIDAS = 300
+
+# Comprobantes de pago: lado máximo (px) y calidad JPEG al recomprimirlos,
+# y lado de la vista previa que muestra el admin
+COMPROBANTE_LADO_MAXIMO = 1600
+COMPROBANTE_CALIDAD = 80
+COMPROBANTE_LADO_PREVIEW = 320
+
+# Caché LRU (por proceso) de códigos ?ref= y afiliaciones: entradas y
+# segundos que vive cada una
+REFERIDOS_CAPACIDAD = 5000
+REFERIDOS_TTL = 300
+
+# Cookie firmada con la atribución del afiliado (?ref=) y días que dura
+ATRIBUCION_COOKIE = 'atribucion_afiliado'
+ATRIBUCION_TTL = 60 * 60 * 24 * 30
+
+# Clicks en links de afiliado (escritura diferida, ver productos/clics.py):
+# segundos entre escrituras, clicks por bulk_create y máximo en memoria
+CLICKS_INTERVALO = 5
+CLICKS_LOTE = 500
+CLICKS_MAXIMO = 10000
+
+# Visitantes únicos por link de afiliado (sketches HyperLogLog): precisión
+# (2**p bytes por sketch, error ~1.04/sqrt(2**p)) y días que muestra la
+# página de links
+VISITANTES_PRECISION = 12
+VISITANTES_DIAS = 30
+
+# Links cortos de afiliado (/r/<codigo>/): entradas y segundos de la caché
+# LRU por proceso que resuelve los códigos
+LINKS_CAPACIDAD = 10000
+LINKS_TTL = 600
+
+# Carrito en cookie firmada (productos/carrito.py): nombre, días que dura y
+# máximo de productos distintos (una cookie no puede pasar de ~4 KB)
+CARRITO_COOKIE = 'carrito'
+CARRITO_TTL = 60 * 60 * 24 * 14
+CARRITO_MAXIMO_ITEMS = 30
+
+# Segundos que se aparta el stock al abrir la confirmación del pedido
+# (productos/reservas.py); las vencidas se borran con liberar_reservas
+RESERVAS_TTL = 60 * 10
+
+# Números de pedido que cada proceso toma de una vez del contador diario
+# (productos/secuencias.py). Con bloques se toca menos la fila del contador
+# (los checkouts simultáneos no se esperan), a cambio de huecos y desorden
+# entre procesos; con 1 son correlativos
+PEDIDOS_BLOQUE_NUMEROS = 10
+
+# Cola de salida de emails (productos/correos.py, comando enviar_correos):
+# intentos antes de abandonar, espera del primer reintento (se duplica en
+# cada uno) y segundos que un envío en curso tiene reservado cada email
+CORREOS_MAX_INTENTOS = 5
+CORREOS_ESPERA_REINTENTO = 60
+CORREOS_RESERVA = 60 * 5
+
+# Tareas en segundo plano (productos/tareas.py, comando procesar_tareas):
+# hilos por proceso, segundos entre revisiones de la cola vacía, segundos
+# que una tarea tomada queda reservada, intentos y espera del primer reintento
+TAREAS_HILOS = 4
+TAREAS_INTERVALO = 1
+TAREAS_RESERVA = 60 * 10
+TAREAS_MAX_INTENTOS = 3
+TAREAS_ESPERA_REINTENTO = 30
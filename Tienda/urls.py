@@ -7,6 +7,7 @@ from django.conf.urls.static import static
 
 # Importar la vista de landing page
 from usuarios.views import landing_page
+from productos.views import redirigir_link_corto
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,6 +15,9 @@ urlpatterns = [
     # ======= LANDING PAGE COMO PÁGINA PRINCIPAL =======
     path('', landing_page, name='landing_page'),
 
+    # ======= LINKS CORTOS DE AFILIADOS =======
+    path('r/<str:codigo>/', redirigir_link_corto, name='link_corto'),
+
     # ======= AUTENTICACIÓN OAUTH =======
     path('accounts/', include('allauth.urls')),  # URLs de allauth para Google OAuth
 
@@ -2,9 +2,15 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from django.db import transaction
 from django.db.models import Sum
+from django.utils import timezone
 from django.contrib.admin import SimpleListFilter
-from .models import Producto, Pedido, ItemPedido, ConfiguracionPagos
+from .models import Producto, Pedido, ItemPedido, ConfiguracionPagos, ClickAfiliado, ReservaStock, CorreoPendiente, Tarea
+from .busqueda import get_backend
+from .imagenes import url_variante
+from .inventario import cantidades_fisicas, devolver as devolver_stock
+from . import tareas
 import csv
 from django.http import HttpResponse
 
@@ -83,13 +89,13 @@ class ItemPedidoInline(admin.TabularInline):
         if obj.producto:
             return format_html(
                 '<div style="display: flex; align-items: center;">'
-                '<img src="{}" style="width: 40px; height: 40px; object-fit: cover; border-radius: 4px; margin-right: 8px;">'
+                '<img src="{}" loading="lazy" style="width: 40px; height: 40px; object-fit: cover; border-radius: 4px; margin-right: 8px;">'
                 '<div>'
                 '<strong>{}</strong><br>'
                 '<small style="color: #666;">{}</small>'
                 '</div>'
                 '</div>',
-                obj.producto.imagen.url if obj.producto.imagen else '/static/img/no-image.png',
+                url_variante(obj.producto.imagen, 'thumb') if obj.producto.imagen else '/static/img/no-image.png',
                 obj.producto.nombre,
                 obj.producto.get_tipo_producto_display()
             )
@@ -138,13 +144,20 @@ class ProductoAdmin(admin.ModelAdmin):
     def imagen_miniatura(self, obj):
         if obj.imagen:
             return format_html(
-                '<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 6px;">',
-                obj.imagen.url
+                '<img src="{}" loading="lazy" style="width: 50px; height: 50px; object-fit: cover; border-radius: 6px;">',
+                url_variante(obj.imagen, 'thumb')
             )
         return '📷 Sin imagen'
 
     imagen_miniatura.short_description = '🖼️'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Usar el índice de texto completo en vez de icontains sobre nombre/descripción
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        # Sin límite: en el admin tienen que aparecer todas las coincidencias
+        return get_backend().filtrar(queryset, search_term, solo_activos=False), False
+
     def precio_display(self, obj):
         return format_html('<strong>₲{}</strong>', f'{obj.precio:,}')
 
@@ -389,13 +402,13 @@ class PedidoAdmin(admin.ModelAdmin):
         if obj.comprobante_pago:
             return format_html(
                 '<div style="text-align: center;">'
-                '<img src="{}" style="max-width: 300px; max-height: 300px; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">'
+                '<img src="{}" loading="lazy" style="max-width: 300px; max-height: 300px; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">'
                 '<br><br>'
                 '<a href="{}" target="_blank" style="background: #2563eb; color: white; padding: 8px 16px; border-radius: 6px; text-decoration: none;">'
                 '🔍 Ver en tamaño completo'
                 '</a>'
                 '</div>',
-                obj.comprobante_pago.url,
+                obj.comprobante_preview.url if obj.comprobante_preview else obj.comprobante_pago.url,
                 obj.comprobante_pago.url
             )
         return format_html('<em style="color: #9ca3af;">No hay comprobante subido</em>')
@@ -429,7 +442,7 @@ class PedidoAdmin(admin.ModelAdmin):
                 '<tr>'
                 '<td style="padding: 8px; border-bottom: 1px solid #f3f4f6;">'
                 '<div style="display: flex; align-items: center;">'
-                '<img src="{}" style="width: 30px; height: 30px; object-fit: cover; border-radius: 4px; margin-right: 8px;">'
+                '<img src="{}" loading="lazy" style="width: 30px; height: 30px; object-fit: cover; border-radius: 4px; margin-right: 8px;">'
                 '<div>'
                 '<strong>{}</strong><br>'
                 '<small style="color: #6b7280;">{}</small>'
@@ -440,7 +453,7 @@ class PedidoAdmin(admin.ModelAdmin):
                 '<td style="padding: 8px; text-align: right; border-bottom: 1px solid #f3f4f6;">₲{}</td>'
                 '<td style="padding: 8px; text-align: right; border-bottom: 1px solid #f3f4f6;"><strong>₲{}</strong></td>'
                 '</tr>',
-                item.producto.imagen.url if item.producto.imagen else '/static/img/no-image.png',
+                url_variante(item.producto.imagen, 'thumb') if item.producto.imagen else '/static/img/no-image.png',
                 item.producto.nombre,
                 item.producto.get_tipo_producto_display(),
                 item.cantidad,
@@ -507,21 +520,19 @@ class PedidoAdmin(admin.ModelAdmin):
 
     def cancelar_pedido_devolver_stock(self, request, queryset):
         """Cancelar pedidos y devolver stock a los productos"""
-        from django.db import transaction
-
         count = 0
         productos_actualizados = []
 
         with transaction.atomic():
             for pedido in queryset:
                 if pedido.estado in ['PENDIENTE', 'CONFIRMADO', 'PROCESANDO']:
-                    # Devolver stock para cada item del pedido
-                    for item in pedido.items.all():
-                        if item.producto.tipo_producto == 'FISICO':
-                            # Devolver stock
-                            item.producto.stock += item.cantidad
-                            item.producto.save()
-                            productos_actualizados.append(f"{item.producto.nombre} (+{item.cantidad})")
+                    # Devolver stock para cada item del pedido (UPDATE stock = stock + n)
+                    items = list(pedido.items.select_related('producto'))
+                    devolver_stock(cantidades_fisicas(items))
+                    productos_actualizados.extend(
+                        f"{item.producto.nombre} (+{item.cantidad})"
+                        for item in items if item.producto.tipo_producto == 'FISICO'
+                    )
 
                     # Cambiar estado a cancelado
                     pedido.estado = 'CANCELADO'
@@ -613,10 +624,10 @@ class ItemPedidoAdmin(admin.ModelAdmin):
     def producto_info(self, obj):
         return format_html(
             '<div style="display: flex; align-items: center;">'
-            '<img src="{}" style="width: 30px; height: 30px; object-fit: cover; border-radius: 4px; margin-right: 8px;">'
+            '<img src="{}" loading="lazy" style="width: 30px; height: 30px; object-fit: cover; border-radius: 4px; margin-right: 8px;">'
             '<strong>{}</strong>'
             '</div>',
-            obj.producto.imagen.url if obj.producto.imagen else '/static/img/no-image.png',
+            url_variante(obj.producto.imagen, 'thumb') if obj.producto.imagen else '/static/img/no-image.png',
             obj.producto.nombre
         )
 
@@ -657,4 +668,83 @@ class ConfiguracionPagosAdmin(admin.ModelAdmin):
 
     def has_add_permission(self, request):
         # Solo permitir una configuración
-        return not ConfiguracionPagos.objects.exists()
\ No newline at end of file
+        return not ConfiguracionPagos.objects.exists()
+
+# ============================================================================
+# 📈 ADMIN PARA CLICKS DE AFILIADOS
+# ============================================================================
+
+@admin.register(ClickAfiliado)
+class ClickAfiliadoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'afiliado', 'producto', 'visitante')
+    list_filter = ('fecha',)
+    search_fields = ('afiliado__username', 'producto__nombre')
+    list_select_related = ('afiliado', 'producto')
+    date_hierarchy = 'fecha'
+
+    # Registro de solo lectura: las filas las escribe clics.py
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReservaStock)
+class ReservaStockAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'cantidad', 'usuario', 'vence')
+    list_filter = ('vence',)
+    search_fields = ('usuario__username', 'producto__nombre')
+    list_select_related = ('usuario', 'producto')
+
+    # Las reservas las crea el checkout (reservas.py); acá solo se ven o se borran
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    list_display = ('asunto', 'destinatarios', 'fecha_creacion', 'enviado', 'intentos', 'proximo_intento')
+    list_filter = ('enviado', 'fecha_creacion')
+    search_fields = ('asunto', 'destinatarios', 'pedido__numero_pedido')
+    readonly_fields = [campo.name for campo in CorreoPendiente._meta.fields]
+    actions = ['reintentar']
+
+    def has_add_permission(self, request):
+        return False
+
+    def reintentar(self, request, queryset):
+        """Vuelve a poner en la cola los emails sin enviar (también los abandonados)"""
+        count = queryset.filter(enviado__isnull=True).update(
+            proximo_intento=timezone.now(), intentos=0
+        )
+        if count:
+            # Los emails los manda la tarea enviar_correos: se encola ya
+            transaction.on_commit(tareas.enviar_correos.encolar)
+        self.message_user(request, f'{count} emails vuelven a la cola de salida')
+
+    reintentar.short_description = "🔁 Reintentar envío"
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'estado', 'prioridad', 'ejecutar_desde', 'intentos', 'trabajador', 'fecha_fin')
+    list_filter = ('estado', 'nombre')
+    search_fields = ('nombre',)
+    readonly_fields = [campo.name for campo in Tarea._meta.fields]
+    actions = ['reintentar']
+
+    def has_add_permission(self, request):
+        return False
+
+    def reintentar(self, request, queryset):
+        """Vuelve a poner en la cola las tareas fallidas"""
+        count = queryset.filter(estado='FALLIDA').update(
+            estado='PENDIENTE', ejecutar_desde=timezone.now(), intentos=0, fecha_fin=None
+        )
+        self.message_user(request, f'{count} tareas vuelven a la cola')
+
+    reintentar.short_description = "🔁 Reintentar tareas fallidas"
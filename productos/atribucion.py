@@ -0,0 +1,81 @@
+"""
+Atribución de ventas a afiliados con una cookie firmada.
+
+Cuando alguien llega a un producto con ?ref=, el código se resuelve una vez
+(ver referidos.py) y se guarda en la cookie "<afiliado_id>:<producto_id>"
+firmada con la SECRET_KEY (TimestampSigner: incluye la hora de emisión y
+vence a los ATRIBUCION_TTL segundos). El carrito y la confirmación del
+pedido leen la atribución de la cookie sin consultar la base de datos; si
+alguien la modifica, la firma deja de validar y simplemente se ignora.
+
+Gana el último link: cada visita con un ?ref= válido reemplaza la cookie.
+"""
+from functools import wraps
+
+from django.conf import settings
+
+from . import referidos
+from .clics import registrar_click
+
+
+SALT = 'productos.atribucion'
+
+
+def _nombre_cookie():
+    return getattr(settings, 'ATRIBUCION_COOKIE', 'atribucion_afiliado')
+
+
+def _ttl():
+    return getattr(settings, 'ATRIBUCION_TTL', 60 * 60 * 24 * 30)
+
+
+def leer_atribucion(request):
+    """{'afiliado_id': int, 'producto_id': int} de la cookie, o None si no hay o no es válida"""
+    valor = request.get_signed_cookie(_nombre_cookie(), default=None, salt=SALT, max_age=_ttl())
+    if not valor:
+        return None
+    try:
+        afiliado_id, producto_id = (int(parte) for parte in valor.split(':'))
+    except ValueError:
+        return None
+    return {'afiliado_id': afiliado_id, 'producto_id': producto_id}
+
+
+def guardar_atribucion(response, afiliado_id, producto_id):
+    response.set_signed_cookie(
+        _nombre_cookie(), f'{afiliado_id}:{producto_id}', salt=SALT,
+        max_age=_ttl(), httponly=True, samesite='Lax',
+        secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+    )
+
+
+def afiliado_para(request, producto_id):
+    """Id del afiliado atribuido si la cookie corresponde a ese producto"""
+    atribucion = leer_atribucion(request)
+    if atribucion and atribucion['producto_id'] == producto_id:
+        return atribucion['afiliado_id']
+    return None
+
+
+def registrar_atribucion(vista):
+    """
+    Decorador para detalle_producto: si la URL trae un ?ref= de un afiliado
+    del producto, deja la cookie en la respuesta. Va por fuera de las cachés
+    de página y del GET condicional para que también se aplique a las
+    respuestas servidas desde la caché o con 304. Cada visita así cuenta
+    como un click del link (ver clics.py).
+    """
+    @wraps(vista)
+    def envoltura(request, producto_id, *args, **kwargs):
+        response = vista(request, producto_id, *args, **kwargs)
+        ref_code = request.GET.get('ref')
+        if ref_code and response.status_code in (200, 304):
+            referido = referidos.resolver_codigo(ref_code)
+            if referido is not None and referidos.esta_afiliado(producto_id, referido.id):
+                if request.method == 'GET':
+                    registrar_click(request, referido.id, producto_id)
+                atribucion = leer_atribucion(request)
+                if atribucion != {'afiliado_id': referido.id, 'producto_id': producto_id}:
+                    guardar_atribucion(response, referido.id, producto_id)
+        return response
+    return envoltura
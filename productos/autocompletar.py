@@ -0,0 +1,131 @@
+"""
+Autocompletado de nombres de productos con un índice de prefijos en memoria.
+
+El índice es un arreglo ordenado de claves normalizadas que se consulta con
+bisect: cada consulta es O(log n + k) y no toca la base de datos. Se
+construye una vez por proceso y luego se actualiza de forma incremental
+con las señales de Producto (ver signals.py).
+
+Cada proceso tiene su propia copia; para que los cambios hechos desde otros
+procesos también lleguen, el índice se reconstruye en segundo plano cuando
+supera AUTOCOMPLETAR_TTL segundos, sin bloquear las consultas.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+from .busqueda import normalizar_texto, TOKEN_RE
+from .models import Producto
+
+
+def _claves(nombre):
+    """
+    Claves de un nombre: el nombre completo y cada sufijo que empieza en una
+    palabra ("cafe tostado" -> "cafe tostado", "tostado"), junto con la
+    posición de la palabra para ranquear primero los inicios de nombre.
+    """
+    palabras = TOKEN_RE.findall(normalizar_texto(nombre))
+    return [(' '.join(palabras[i:]), i) for i in range(len(palabras))]
+
+
+class IndicePrefijos:
+    def __init__(self):
+        self._entradas = []  # [(clave, posicion, producto_id)] ordenado
+        self._nombres = {}   # producto_id -> nombre para mostrar
+        self._lock = threading.Lock()
+        self._construido_en = None
+        self._reconstruyendo = False
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+    def _cargar(self):
+        entradas, nombres = [], {}
+        for pk, nombre in Producto.objects.filter(activo=True).values_list('pk', 'nombre').iterator():
+            nombres[pk] = nombre
+            entradas.extend((clave, pos, pk) for clave, pos in _claves(nombre))
+        entradas.sort()
+        return entradas, nombres
+
+    def construir(self):
+        entradas, nombres = self._cargar()
+        with self._lock:
+            self._entradas, self._nombres = entradas, nombres
+            self._construido_en = time.monotonic()
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            self.construir()
+        finally:
+            self._reconstruyendo = False
+            # El hilo no pasa por request_finished: cierra su conexión
+            connection.close()
+
+    def _asegurar_vigente(self):
+        if self._construido_en is None:
+            self.construir()
+            return
+        ttl = getattr(settings, 'AUTOCOMPLETAR_TTL', 300)
+        if time.monotonic() - self._construido_en > ttl and not self._reconstruyendo:
+            self._reconstruyendo = True
+            threading.Thread(target=self._reconstruir_en_segundo_plano, daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Actualización incremental
+    # ------------------------------------------------------------------
+    def _quitar(self, producto_id):
+        nombre = self._nombres.pop(producto_id, None)
+        if nombre is None:
+            return
+        for clave, pos in _claves(nombre):
+            i = bisect_left(self._entradas, (clave, pos, producto_id))
+            if i < len(self._entradas) and self._entradas[i] == (clave, pos, producto_id):
+                del self._entradas[i]
+
+    def actualizar(self, producto):
+        if self._construido_en is None:
+            return  # se cargará completo en la primera consulta
+        with self._lock:
+            self._quitar(producto.pk)
+            if producto.activo:
+                self._nombres[producto.pk] = producto.nombre
+                for clave, pos in _claves(producto.nombre):
+                    insort(self._entradas, (clave, pos, producto.pk))
+
+    def eliminar(self, producto_id):
+        if self._construido_en is None:
+            return
+        with self._lock:
+            self._quitar(producto_id)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def sugerir(self, prefijo, limite=8):
+        """Hasta `limite` productos cuyo nombre (o alguna palabra) empieza con el prefijo"""
+        prefijo = ' '.join(TOKEN_RE.findall(normalizar_texto(prefijo)))
+        if not prefijo:
+            return []
+        self._asegurar_vigente()
+
+        candidatos = {}
+        with self._lock:
+            i = bisect_left(self._entradas, (prefijo,))
+            # Se revisan unas cuantas coincidencias más que el límite para poder ranquear
+            while i < len(self._entradas) and len(candidatos) < limite * 4:
+                clave, pos, pk = self._entradas[i]
+                if not clave.startswith(prefijo):
+                    break
+                if pk not in candidatos or pos < candidatos[pk][0]:
+                    candidatos[pk] = (pos, clave)
+                i += 1
+            nombres = self._nombres
+
+            ordenados = sorted(candidatos.items(), key=lambda item: (item[1][0] > 0, item[1][1]))
+            return [{'id': pk, 'nombre': nombres[pk]} for pk, _ in ordenados[:limite]]
+
+
+indice = IndicePrefijos()
@@ -0,0 +1,336 @@
+"""
+Búsqueda de productos con índice invertido.
+
+El índice vive en una tabla propia que se mantiene sincronizada con las
+señales de Producto (ver signals.py):
+
+- SQLite: tabla virtual FTS5 ranqueada con bm25.
+- PostgreSQL: tabla con un tsvector (config 'spanish') e índice GIN.
+- Otros motores: sin índice, con icontains (BackendSinIndice), para que
+  guardar productos y buscar sigan funcionando mientras no haya uno propio.
+
+El texto se normaliza en Python (minúsculas y sin tildes) antes de
+indexarlo y antes de consultar, así "cafe" encuentra "Café" en ambos motores.
+"""
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Producto
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMINOS = 8
+
+
+def normalizar_texto(texto):
+    """Pasa a minúsculas y elimina tildes/diacríticos ("Jamón" -> "jamon")"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_tildes.lower()
+
+
+def tokenizar(texto):
+    """Términos de búsqueda normalizados (se descartan los símbolos)"""
+    return TOKEN_RE.findall(normalizar_texto(texto))[:MAX_TERMINOS]
+
+
+# ============================================================================
+# 🔌 BACKENDS
+# ============================================================================
+
+class BackendBusqueda:
+    """Interfaz común de los motores de búsqueda"""
+
+    def indexar(self, producto):
+        raise NotImplementedError
+
+    def eliminar(self, producto_id):
+        raise NotImplementedError
+
+    def reconstruir(self):
+        """Vacía el índice y vuelve a indexar todos los productos"""
+        raise NotImplementedError
+
+    def buscar_ids(self, texto, limite=24, desplazamiento=0, solo_activos=True):
+        """Ids de productos ordenados por relevancia"""
+        raise NotImplementedError
+
+    def contar(self, texto, solo_activos=True):
+        raise NotImplementedError
+
+    def _subconsulta_ids(self, texto, solo_activos):
+        """(sql, params) de un SELECT con los ids que coinciden, o None si no hay términos"""
+        raise NotImplementedError
+
+    def filtrar(self, queryset, texto, solo_activos=True):
+        """
+        `queryset` reducido a los productos que coinciden, sin límite (para el
+        admin): filtra con una subconsulta en lugar de traer los ids
+        """
+        subconsulta = self._subconsulta_ids(texto, solo_activos)
+        if subconsulta is None:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(*subconsulta))
+
+
+class BackendSQLiteFTS5(BackendBusqueda):
+    tabla = 'productos_busqueda_fts'
+
+    def _consulta(self, texto):
+        # Cada término se cita (evita la sintaxis de FTS5) y se busca por prefijo
+        terminos = tokenizar(texto)
+        if not terminos:
+            return None
+        return ' '.join(f'"{t}"*' for t in terminos)
+
+    def indexar(self, producto):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.tabla} WHERE rowid = %s', [producto.pk])
+            cursor.execute(
+                f'INSERT INTO {self.tabla} (rowid, nombre, descripcion, activo) VALUES (%s, %s, %s, %s)',
+                [producto.pk, normalizar_texto(producto.nombre),
+                 normalizar_texto(producto.descripcion), int(producto.activo)]
+            )
+
+    def eliminar(self, producto_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.tabla} WHERE rowid = %s', [producto_id])
+
+    def reconstruir(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.tabla}')
+            filas = Producto.objects.values_list('pk', 'nombre', 'descripcion', 'activo')
+            cursor.executemany(
+                f'INSERT INTO {self.tabla} (rowid, nombre, descripcion, activo) VALUES (%s, %s, %s, %s)',
+                [(pk, normalizar_texto(n), normalizar_texto(d), int(a)) for pk, n, d, a in filas.iterator()]
+            )
+
+    def buscar_ids(self, texto, limite=24, desplazamiento=0, solo_activos=True):
+        consulta = self._consulta(texto)
+        if consulta is None:
+            return []
+        filtro_activo = ' AND activo = 1' if solo_activos else ''
+        with connection.cursor() as cursor:
+            # bm25: el nombre pesa 10 veces más que la descripción
+            cursor.execute(
+                f'SELECT rowid FROM {self.tabla} WHERE {self.tabla} MATCH %s{filtro_activo} '
+                f'ORDER BY bm25({self.tabla}, 10.0, 1.0) LIMIT %s OFFSET %s',
+                [consulta, limite, desplazamiento]
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def contar(self, texto, solo_activos=True):
+        consulta = self._consulta(texto)
+        if consulta is None:
+            return 0
+        filtro_activo = ' AND activo = 1' if solo_activos else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {self.tabla} WHERE {self.tabla} MATCH %s{filtro_activo}',
+                [consulta]
+            )
+            return cursor.fetchone()[0]
+
+    def _subconsulta_ids(self, texto, solo_activos):
+        consulta = self._consulta(texto)
+        if consulta is None:
+            return None
+        filtro_activo = ' AND activo = 1' if solo_activos else ''
+        return f'SELECT rowid FROM {self.tabla} WHERE {self.tabla} MATCH %s{filtro_activo}', [consulta]
+
+
+class BackendPostgres(BackendBusqueda):
+    tabla = 'productos_busqueda'
+    config = 'spanish'
+
+    def _consulta(self, texto):
+        terminos = tokenizar(texto)
+        if not terminos:
+            return None
+        return ' & '.join(f'{t}:*' for t in terminos)
+
+    def _documento_sql(self):
+        return (
+            f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'B')"
+        )
+
+    def indexar(self, producto):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.tabla} (producto_id, documento, activo) '
+                f'VALUES (%s, {self._documento_sql()}, %s) '
+                f'ON CONFLICT (producto_id) DO UPDATE '
+                f'SET documento = EXCLUDED.documento, activo = EXCLUDED.activo',
+                [producto.pk, normalizar_texto(producto.nombre),
+                 normalizar_texto(producto.descripcion), producto.activo]
+            )
+
+    def eliminar(self, producto_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.tabla} WHERE producto_id = %s', [producto_id])
+
+    def reconstruir(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.tabla}')
+            filas = Producto.objects.values_list('pk', 'nombre', 'descripcion', 'activo')
+            cursor.executemany(
+                f'INSERT INTO {self.tabla} (producto_id, documento, activo) '
+                f'VALUES (%s, {self._documento_sql()}, %s)',
+                [(pk, normalizar_texto(n), normalizar_texto(d), a) for pk, n, d, a in filas.iterator()]
+            )
+
+    def buscar_ids(self, texto, limite=24, desplazamiento=0, solo_activos=True):
+        consulta = self._consulta(texto)
+        if consulta is None:
+            return []
+        filtro_activo = ' AND activo' if solo_activos else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT producto_id FROM {self.tabla}, to_tsquery('{self.config}', %s) q "
+                f'WHERE documento @@ q{filtro_activo} '
+                f'ORDER BY ts_rank_cd(documento, q) DESC, producto_id DESC LIMIT %s OFFSET %s',
+                [consulta, limite, desplazamiento]
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def contar(self, texto, solo_activos=True):
+        consulta = self._consulta(texto)
+        if consulta is None:
+            return 0
+        filtro_activo = ' AND activo' if solo_activos else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {self.tabla} WHERE documento @@ to_tsquery('{self.config}', %s)"
+                f'{filtro_activo}',
+                [consulta]
+            )
+            return cursor.fetchone()[0]
+
+    def _subconsulta_ids(self, texto, solo_activos):
+        consulta = self._consulta(texto)
+        if consulta is None:
+            return None
+        filtro_activo = ' AND activo' if solo_activos else ''
+        return (
+            f"SELECT producto_id FROM {self.tabla} WHERE documento @@ to_tsquery('{self.config}', %s)"
+            f'{filtro_activo}',
+            [consulta],
+        )
+
+
+class BackendSinIndice(BackendBusqueda):
+    """
+    Respaldo para motores sin backend propio: no mantiene índice y busca con
+    icontains (cada término en el nombre o la descripción). Lento con muchos
+    productos y sin ignorar tildes, pero no rompe el guardado de productos.
+    """
+
+    def indexar(self, producto):
+        pass
+
+    def eliminar(self, producto_id):
+        pass
+
+    def reconstruir(self):
+        pass
+
+    def _coincidencias(self, texto, solo_activos):
+        # Sin normalizar: la base compara el texto tal como está guardado
+        terminos = TOKEN_RE.findall(str(texto).lower())[:MAX_TERMINOS]
+        if not terminos:
+            return None
+        productos = Producto.objects.all()
+        if solo_activos:
+            productos = productos.filter(activo=True)
+        for termino in terminos:
+            productos = productos.filter(Q(nombre__icontains=termino) | Q(descripcion__icontains=termino))
+        return productos
+
+    def buscar_ids(self, texto, limite=24, desplazamiento=0, solo_activos=True):
+        productos = self._coincidencias(texto, solo_activos)
+        if productos is None:
+            return []
+        return list(
+            productos.order_by('-fecha_creacion', '-pk')
+            .values_list('pk', flat=True)[desplazamiento:desplazamiento + limite]
+        )
+
+    def contar(self, texto, solo_activos=True):
+        productos = self._coincidencias(texto, solo_activos)
+        return 0 if productos is None else productos.count()
+
+    def filtrar(self, queryset, texto, solo_activos=True):
+        productos = self._coincidencias(texto, solo_activos)
+        if productos is None:
+            return queryset.none()
+        return queryset.filter(pk__in=productos.values('pk'))
+
+
+BACKENDS_POR_MOTOR = {
+    'sqlite': BackendSQLiteFTS5,
+    'postgresql': BackendPostgres,
+}
+
+_backend = None
+
+
+def get_backend():
+    """
+    Devuelve el backend configurado en BUSQUEDA_BACKEND (ruta a la clase)
+    o, si no está definido, el que corresponde al motor de la base de datos
+    (BackendSinIndice si el motor no tiene uno).
+    """
+    global _backend
+    if _backend is None:
+        ruta = getattr(settings, 'BUSQUEDA_BACKEND', None)
+        if ruta:
+            clase = import_string(ruta)
+        else:
+            clase = BACKENDS_POR_MOTOR.get(connection.vendor)
+            if clase is None:
+                logger.warning(
+                    'No hay backend de búsqueda para el motor "%s": se busca sin índice. '
+                    'Configura BUSQUEDA_BACKEND en settings.', connection.vendor
+                )
+                clase = BackendSinIndice
+        _backend = clase()
+    return _backend
+
+
+# ============================================================================
+# 🔎 API PÚBLICA
+# ============================================================================
+
+def buscar_productos(texto, limite=24, desplazamiento=0, queryset=None):
+    """
+    Busca productos activos y los devuelve en orden de relevancia junto con
+    el total de coincidencias. `queryset` permite anotar/ajustar los
+    productos cargados (por ejemplo con con_afiliacion).
+    """
+    backend = get_backend()
+    ids = backend.buscar_ids(texto, limite=limite, desplazamiento=desplazamiento)
+    if not ids:
+        return [], 0 if desplazamiento == 0 else backend.contar(texto)
+
+    if queryset is None:
+        queryset = Producto.objects.all()
+    por_id = queryset.filter(activo=True).in_bulk(ids)
+    productos = [por_id[pk] for pk in ids if pk in por_id]
+
+    if desplazamiento == 0 and len(ids) < limite:
+        total = len(ids)
+    else:
+        total = backend.contar(texto)
+    return productos, total
@@ -0,0 +1,150 @@
+"""
+Caché de páginas completas para visitantes anónimos.
+
+Las páginas públicas de la tienda (landing, catálogo, detalle) son iguales
+para todos los anónimos, así que se guardan ya renderizadas con la clave
+de la URL completa (incluido ?ref=, que cambia el contenido del detalle).
+
+Invalidación: todas las claves llevan un número de versión que las señales
+de Producto incrementan al confirmar cada cambio (ver signals.py); las
+entradas viejas dejan de leerse y expiran solas con PAGINAS_CACHE_TTL.
+
+No se cachea (ni se sirve desde la caché) cuando:
+- el usuario está logueado (las páginas muestran su menú, carrito, etc.),
+- hay mensajes pendientes de mostrar,
+- la respuesta deja cookies, usa la sesión o lleva un token CSRF.
+
+Las páginas cacheadas con formularios POST (agregar al carrito en el
+detalle) no pueden llevar el token en el HTML: lo toman con JS de la cookie
+CSRF, que asegurar_cookie_csrf deja por fuera de la caché.
+"""
+import gzip
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+
+CLAVE_VERSION = 'paginas:version'
+CLAVE_MODIFICADAS = 'paginas:modificadas'
+
+
+def version_paginas():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Si la clave se perdió (reinicio, desalojo) se arranca desde la hora
+        # actual: así nunca se reutiliza una versión anterior
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def paginas_modificadas():
+    """Cuándo se invalidaron las páginas por última vez (para Last-Modified)"""
+    fecha = cache.get(CLAVE_MODIFICADAS)
+    if fecha is None:
+        # Igual que la versión: sin el dato, se toma ahora para no quedarse atrás
+        cache.add(CLAVE_MODIFICADAS, timezone.now(), None)
+        fecha = cache.get(CLAVE_MODIFICADAS)
+    return fecha
+
+
+def invalidar_paginas():
+    """Deja obsoletas todas las páginas cacheadas"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+    cache.set(CLAVE_MODIFICADAS, timezone.now(), None)
+
+
+def _clave(request, grupo):
+    url = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f'pagina:{grupo}:{version_paginas()}:{url}'
+
+
+def _es_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _respuesta_guardable(request, response):
+    sesion = getattr(request, 'session', None)
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+        and not (sesion is not None and sesion.modified)
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _acepta_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def cachear_pagina_anonima(grupo):
+    """
+    Decorador para vistas públicas. `grupo` separa las claves por página
+    ('landing', 'catalogo', 'detalle') para poder reconocerlas en la caché.
+
+    Con PAGINAS_CACHE_GZIP el HTML se guarda comprimido y se entrega así a
+    los clientes que aceptan gzip (al resto se le descomprime).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not _es_cacheable(request):
+                return vista(request, *args, **kwargs)
+
+            usar_gzip = getattr(settings, 'PAGINAS_CACHE_GZIP', False)
+            clave = _clave(request, grupo)
+            guardado = cache.get(clave)
+            if guardado is not None:
+                tipo, cuerpo = guardado
+                response = HttpResponse(content_type=tipo)
+                if usar_gzip and _acepta_gzip(request):
+                    response.content = cuerpo
+                    response['Content-Encoding'] = 'gzip'
+                else:
+                    response.content = gzip.decompress(cuerpo) if usar_gzip else cuerpo
+                if usar_gzip:
+                    patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+
+            response = vista(request, *args, **kwargs)
+            if _respuesta_guardable(request, response):
+                cuerpo = response.content
+                if usar_gzip:
+                    cuerpo = gzip.compress(cuerpo, compresslevel=6)
+                cache.set(clave, (response['Content-Type'], cuerpo),
+                          getattr(settings, 'PAGINAS_CACHE_TTL', 300))
+            return response
+        return envoltura
+    return decorador
+
+
+def asegurar_cookie_csrf(vista):
+    """
+    Va por fuera de cachear_pagina_anonima: si el visitante anónimo todavía
+    no tiene la cookie CSRF, la respuesta (cacheada o no) se la deja.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        response = vista(request, *args, **kwargs)
+        if (not request.user.is_authenticated
+                and settings.CSRF_COOKIE_NAME not in request.COOKIES):
+            get_token(request)
+        return response
+    return envoltura
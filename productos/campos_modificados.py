@@ -0,0 +1,87 @@
+"""
+Guardado de modelos escribiendo solo las columnas que cambiaron.
+
+CamposModificadosMixin recuerda los valores de cada fila tal como se
+leyeron de la base (o como quedaron en el último save) y en save():
+
+- si no cambió nada, no escribe,
+- si cambió algo, hace save(update_fields=<lo modificado>) más los campos
+  auto_now (fecha_actualizacion), en lugar de un UPDATE de toda la fila.
+
+Las altas, los save() con update_fields explícito y los force_insert se
+guardan como siempre. Los modelos pueden agregar columnas que deben
+escribirse juntas sobreescribiendo campos_a_guardar().
+
+Uso:
+
+    class Pedido(CamposModificadosMixin, models.Model):
+        ...
+        if 'estado' in pedido.campos_modificados(): ...
+"""
+from django.db.models.fields.files import FieldFile
+
+
+def _valor(valor):
+    # Los FieldFile se modifican en el lugar al subir archivos: se guarda el nombre
+    return valor.name if isinstance(valor, FieldFile) else valor
+
+
+class CamposModificadosMixin:
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._recordar_estado()
+        return instancia
+
+    def _campos_seguidos(self):
+        return [campo for campo in self._meta.concrete_fields if not campo.primary_key]
+
+    def _recordar_estado(self, nombres=None):
+        """Toma los valores actuales como los guardados (de todos los campos o de `nombres`)"""
+        estado = dict(getattr(self, '_estado_guardado', {})) if nombres is not None else {}
+        for campo in self._campos_seguidos():
+            if nombres is not None and campo.name not in nombres and campo.attname not in nombres:
+                continue
+            if campo.attname in self.__dict__:  # los diferidos sin cargar no se siguen
+                estado[campo.attname] = _valor(self.__dict__[campo.attname])
+        self._estado_guardado = estado
+
+    def campos_modificados(self):
+        """Nombres de los campos que cambiaron desde que se leyó la fila (todos si es nueva)"""
+        if self._state.adding or not hasattr(self, '_estado_guardado'):
+            return {campo.name for campo in self._campos_seguidos()}
+        modificados = set()
+        for campo in self._campos_seguidos():
+            if campo.attname not in self.__dict__:
+                continue
+            if (campo.attname not in self._estado_guardado
+                    or _valor(self.__dict__[campo.attname]) != self._estado_guardado[campo.attname]):
+                modificados.add(campo.name)
+        return modificados
+
+    def valor_guardado(self, nombre):
+        """Valor que tiene el campo en la base según la última lectura o guardado"""
+        campo = self._meta.get_field(nombre)
+        return getattr(self, '_estado_guardado', {}).get(campo.attname)
+
+    def campos_a_guardar(self, modificados):
+        """Gancho para agregar columnas que deben escribirse junto con las modificadas"""
+        return modificados
+
+    def save(self, *args, **kwargs):
+        if (args or self._state.adding or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None
+                or not hasattr(self, '_estado_guardado')):
+            super().save(*args, **kwargs)
+            self._recordar_estado(kwargs.get('update_fields'))
+            return
+
+        modificados = set(self.campos_a_guardar(self.campos_modificados()))
+        if not modificados:
+            return
+        modificados |= {
+            campo.name for campo in self._campos_seguidos() if getattr(campo, 'auto_now', False)
+        }
+        super().save(update_fields=modificados, **kwargs)
+        self._recordar_estado(modificados)
@@ -0,0 +1,208 @@
+"""
+Carrito en una cookie firmada, sin filas en la base hasta confirmar.
+
+Antes cada "Agregar al carrito" creaba un Pedido PENDIENTE y sus
+ItemPedido, así que cada visita que agregaba algo y se iba dejaba escrituras
+(y filas) en la base. Ahora el carrito vive en la cookie CARRITO_COOKIE,
+firmada con la SECRET_KEY para que no se puedan tocar precios ni
+cantidades:
+
+    {'i': [[producto_id, cantidad, 'precio al agregar'], ...], 'a': afiliado_id}
+
+Agregar, cambiar cantidades o quitar productos solo reescribe la cookie.
+El Pedido y sus items se crean recién en confirmar_pedido (crear_pedido),
+que también es el único paso que pide estar logueado.
+
+Los carritos PENDIENTE que quedaron en la base de antes se pasan a la
+cookie la primera vez que su dueño abre el carrito (absorber_pendiente).
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import Producto, Pedido, ItemPedido
+from .secuencias import numero_pedido
+
+
+SALT = 'productos.carrito'
+
+
+def _nombre_cookie():
+    return getattr(settings, 'CARRITO_COOKIE', 'carrito')
+
+
+def _ttl():
+    return getattr(settings, 'CARRITO_TTL', 60 * 60 * 24 * 14)
+
+
+def maximo_items():
+    # Una cookie no puede pasar de ~4 KB
+    return getattr(settings, 'CARRITO_MAXIMO_ITEMS', 30)
+
+
+class LineaCarrito:
+    """Un producto del carrito, con los mismos atributos que ItemPedido usa en las plantillas"""
+
+    def __init__(self, producto, cantidad, precio_unitario):
+        self.producto = producto
+        self.producto_id = producto.pk
+        self.id = producto.pk  # las URLs de actualizar/eliminar usan el id del producto
+        self.cantidad = cantidad
+        self.precio_unitario = precio_unitario
+        self.subtotal = precio_unitario * cantidad
+        self.stock_suficiente = producto.tiene_stock(cantidad)
+
+
+class Carrito:
+    def __init__(self, items=None, afiliado_referido_id=None):
+        # producto_id -> (cantidad, precio_unitario)
+        self.items = dict(items or {})
+        self.afiliado_referido_id = afiliado_referido_id
+        self.modificado = False
+        self._lineas = None
+
+    # ------------------------------------------------------------------
+    # Cookie
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def desde_request(cls, request):
+        """Carrito de la cookie (uno vacío si no hay, venció o fue modificada)"""
+        if not hasattr(request, '_carrito'):
+            request._carrito = cls._leer(request.COOKIES.get(_nombre_cookie()))
+        return request._carrito
+
+    @classmethod
+    def _leer(cls, valor):
+        if not valor:
+            return cls()
+        try:
+            datos = signing.loads(valor, salt=SALT, max_age=_ttl())
+            items = {
+                int(producto_id): (int(cantidad), Decimal(precio))
+                for producto_id, cantidad, precio in datos.get('i', [])
+            }
+            return cls(items, datos.get('a'))
+        except (signing.BadSignature, ValueError, TypeError, InvalidOperation):
+            return cls()
+
+    def guardar(self, response):
+        """Escribe la cookie en la respuesta (o la borra si el carrito quedó vacío)"""
+        if not self.items:
+            response.delete_cookie(_nombre_cookie(), samesite='Lax')
+            return
+        datos = {
+            'i': [[pk, cantidad, str(precio)] for pk, (cantidad, precio) in self.items.items()],
+            'a': self.afiliado_referido_id,
+        }
+        response.set_cookie(
+            _nombre_cookie(), signing.dumps(datos, salt=SALT, compress=True),
+            max_age=_ttl(), httponly=True, samesite='Lax',
+            secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+        )
+
+    # ------------------------------------------------------------------
+    # Contenido
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.items)
+
+    def cantidad(self, producto_id):
+        return self.items.get(producto_id, (0, None))[0]
+
+    def agregar(self, producto, cantidad, afiliado_referido_id=None):
+        """Suma unidades guardando el precio del momento en que se agregó por primera vez"""
+        actual, precio = self.items.get(producto.pk, (0, producto.precio))
+        self.items[producto.pk] = (actual + cantidad, precio)
+        if not self.afiliado_referido_id and afiliado_referido_id:
+            self.afiliado_referido_id = afiliado_referido_id
+        self._cambio()
+
+    def actualizar(self, producto_id, cantidad):
+        if producto_id in self.items:
+            self.items[producto_id] = (cantidad, self.items[producto_id][1])
+            self._cambio()
+
+    def quitar(self, producto_id):
+        if self.items.pop(producto_id, None) is not None:
+            self._cambio()
+
+    def vaciar(self):
+        self.items.clear()
+        self.afiliado_referido_id = None
+        self._cambio()
+
+    def _cambio(self):
+        self.modificado = True
+        self._lineas = None
+
+    def lineas(self):
+        """LineaCarrito de cada producto que sigue activo, con una sola consulta"""
+        if self._lineas is None:
+            productos = Producto.objects.in_bulk(list(self.items))
+            self._lineas = [
+                LineaCarrito(productos[pk], cantidad, precio)
+                for pk, (cantidad, precio) in self.items.items()
+                if pk in productos and productos[pk].activo
+            ]
+        return self._lineas
+
+    @property
+    def total(self):
+        return sum((linea.subtotal for linea in self.lineas()), Decimal('0'))
+
+    # ------------------------------------------------------------------
+    # Base de datos
+    # ------------------------------------------------------------------
+
+    def absorber_pendiente(self, usuario):
+        """Pasa a la cookie el carrito PENDIENTE que el usuario tenga en la base (y lo borra)"""
+        pedido = Pedido.objects.filter(usuario=usuario, estado='PENDIENTE').first()
+        if pedido is None:
+            return False
+        for item in pedido.items.all():
+            if item.producto_id not in self.items and len(self.items) < maximo_items():
+                self.items[item.producto_id] = (item.cantidad, item.precio_unitario)
+        if not self.afiliado_referido_id:
+            self.afiliado_referido_id = pedido.afiliado_referido_id
+        pedido.delete()
+        self._cambio()
+        return True
+
+    def nuevo_pedido(self, usuario, **datos):
+        """
+        Pedido CONFIRMADO con los datos del checkout, todavía sin guardar.
+        Llamar fuera de la transacción del checkout: el número se toma acá,
+        así la fila del contador diario no queda bloqueada hasta el commit.
+        """
+        return Pedido(
+            usuario=usuario,
+            numero_pedido=numero_pedido(),
+            estado='CONFIRMADO',
+            fecha_confirmacion=timezone.now(),
+            afiliado_referido_id=self.afiliado_referido_id,
+            **datos,
+        )
+
+    def crear_pedido(self, pedido):
+        """
+        Guarda el pedido de nuevo_pedido() con sus items (un bulk_create) a
+        partir de las líneas del carrito. Llamar dentro de una transacción.
+        """
+        pedido.save()
+        items = ItemPedido.objects.bulk_create([
+            ItemPedido(
+                pedido=pedido,
+                producto=linea.producto,
+                cantidad=linea.cantidad,
+                precio_unitario=linea.precio_unitario,
+                subtotal=linea.subtotal,
+            )
+            for linea in self.lineas()
+        ])
+        # bulk_create no pasa por ItemPedido.save(): se suma el total de una vez
+        pedido.aplicar_delta(sum((item.subtotal for item in items), Decimal('0')))
+        return pedido
@@ -0,0 +1,193 @@
+"""
+Catálogo del lado del servidor: filtrado por tipo, ordenamiento en SQL y
+paginación por cursor (keyset) para que el costo de cada página no dependa
+del tamaño del catálogo.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+
+from .models import Producto
+
+
+# Opciones de orden: clave del <select> -> (campo, descendente)
+ORDENES = {
+    'recientes': ('fecha_creacion', True),
+    'precio-menor': ('precio', False),
+    'precio-mayor': ('precio', True),
+    'nombre': ('nombre', False),
+}
+ORDEN_DEFAULT = 'recientes'
+
+TIPOS_VALIDOS = ('FISICO', 'DIGITAL')
+
+
+def get_tamano_pagina():
+    return getattr(settings, 'CATALOGO_TAMANO_PAGINA', 24)
+
+
+# ============================================================================
+# 🔐 CURSORES
+# ============================================================================
+
+def _serializar_valor(campo, valor):
+    if campo == 'fecha_creacion':
+        return valor.isoformat()
+    return str(valor)
+
+
+def _deserializar_valor(campo, valor):
+    if campo == 'fecha_creacion':
+        return datetime.fromisoformat(valor)
+    if campo == 'precio':
+        return Decimal(valor)
+    return str(valor)
+
+
+def codificar_cursor(producto, orden, direccion):
+    """Codifica la posición de un producto dentro de un orden como texto para la URL"""
+    campo, _ = ORDENES[orden]
+    datos = [direccion, _serializar_valor(campo, getattr(producto, campo)), producto.pk]
+    crudo = json.dumps(datos, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, orden):
+    """
+    Devuelve (direccion, valor, pk) o None si el cursor es inválido.
+    Un cursor manipulado simplemente lleva a la primera página.
+    """
+    if not cursor:
+        return None
+    campo, _ = ORDENES[orden]
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        direccion, valor, pk = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if direccion not in ('sig', 'ant'):
+            return None
+        return direccion, _deserializar_valor(campo, valor), int(pk)
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+# ============================================================================
+# 📄 PAGINACIÓN POR CURSOR
+# ============================================================================
+
+class PaginaCatalogo:
+    """Resultado de una página del catálogo"""
+
+    def __init__(self, productos, cursor_siguiente=None, cursor_anterior=None):
+        self.productos = productos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.productos)
+
+    def __len__(self):
+        return len(self.productos)
+
+
+def _filtro_keyset(campo, descendente, valor, pk):
+    """Condición "estrictamente después de (valor, pk)" en el orden dado"""
+    op = 'lt' if descendente else 'gt'
+    return Q(**{f'{campo}__{op}': valor}) | Q(**{campo: valor, f'pk__{op}': pk})
+
+
+def paginar_catalogo(queryset, orden=ORDEN_DEFAULT, cursor=None, tamano=None):
+    """
+    Pagina un queryset de productos con keyset pagination.
+
+    Usa (campo de orden, id) como clave única, así cada página es un
+    rango indexado con LIMIT y no un OFFSET que crece con el catálogo.
+    """
+    if orden not in ORDENES:
+        orden = ORDEN_DEFAULT
+    tamano = tamano or get_tamano_pagina()
+    campo, descendente = ORDENES[orden]
+
+    posicion = decodificar_cursor(cursor, orden)
+    hacia_atras = posicion is not None and posicion[0] == 'ant'
+
+    # Para retroceder se recorre el índice en sentido inverso y luego se da vuelta
+    sentido = descendente != hacia_atras
+    prefijo = '-' if sentido else ''
+    qs = queryset.order_by(f'{prefijo}{campo}', f'{prefijo}pk')
+
+    if posicion is not None:
+        _, valor, pk = posicion
+        qs = qs.filter(_filtro_keyset(campo, sentido, valor, pk))
+
+    # Un elemento extra indica si hay más resultados en esa dirección
+    productos = list(qs[:tamano + 1])
+    hay_mas = len(productos) > tamano
+    productos = productos[:tamano]
+
+    if hacia_atras:
+        productos.reverse()
+        hay_siguiente = True
+        hay_anterior = hay_mas
+    else:
+        hay_siguiente = hay_mas
+        hay_anterior = posicion is not None
+
+    cursor_siguiente = cursor_anterior = None
+    if productos:
+        if hay_siguiente:
+            cursor_siguiente = codificar_cursor(productos[-1], orden, 'sig')
+        if hay_anterior:
+            cursor_anterior = codificar_cursor(productos[0], orden, 'ant')
+
+    return PaginaCatalogo(productos, cursor_siguiente, cursor_anterior)
+
+
+# ============================================================================
+# 🔎 FILTROS DEL CATÁLOGO
+# ============================================================================
+
+def productos_catalogo(tipo=None):
+    """Queryset base del catálogo público, opcionalmente filtrado por tipo"""
+    qs = Producto.objects.filter(activo=True)
+    if tipo in TIPOS_VALIDOS:
+        qs = qs.filter(tipo_producto=tipo)
+    return qs
+
+
+CLAVE_TOTALES = 'catalogo:totales'
+
+
+def contar_productos_por_tipo():
+    """
+    Totales del catálogo activo (total, fisicos, digitales) y la última
+    fecha_actualizacion (actualizado), calculados en una sola consulta y
+    guardados en la caché. Las señales de Producto los invalidan;
+    CATALOGO_TOTALES_TTL es solo el respaldo.
+    """
+    totales = cache.get(CLAVE_TOTALES)
+    if totales is None:
+        totales = Producto.objects.filter(activo=True).aggregate(
+            total=Count('id'),
+            fisicos=Count('id', filter=Q(tipo_producto='FISICO')),
+            digitales=Count('id', filter=Q(tipo_producto='DIGITAL')),
+            actualizado=Max('fecha_actualizacion'),
+        )
+        cache.set(CLAVE_TOTALES, totales, getattr(settings, 'CATALOGO_TOTALES_TTL', 300))
+    return totales
+
+
+def invalidar_totales():
+    cache.delete(CLAVE_TOTALES)
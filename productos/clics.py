@@ -0,0 +1,140 @@
+"""
+Registro de clicks en links de afiliado con escritura diferida.
+
+detalle_producto no escribe en la base de datos por cada visita con ?ref=:
+registrar_click() solo agrega el evento (afiliado, producto, fecha, hash
+del visitante) a una cola en memoria y vuelve. Un hilo de fondo por proceso
+vacía la cola cada CLICKS_INTERVALO segundos, o antes si se juntan
+CLICKS_LOTE eventos, con un bulk_create en la tabla ClickAfiliado (y
+suma los visitantes del lote a los sketches de visitantes.py).
+
+La cola tiene un máximo (CLICKS_MAXIMO): si la base de datos no da abasto,
+se descartan los clicks más viejos en lugar de crecer sin límite. Al
+terminar el proceso (atexit) se escribe lo que quede pendiente.
+"""
+import atexit
+import hashlib
+import hmac
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+def hash_visitante(request):
+    """
+    Identificador anónimo del visitante: HMAC (con la SECRET_KEY) de la IP
+    y el navegador. Sirve para contar visitantes distintos sin guardarlos.
+    """
+    crudo = '|'.join((
+        request.META.get('REMOTE_ADDR', ''),
+        request.META.get('HTTP_USER_AGENT', ''),
+    ))
+    return hmac.new(settings.SECRET_KEY.encode(), crudo.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+class BufferClicks:
+    """Cola acotada de clicks pendientes más el hilo que la vuelca a la base"""
+
+    def __init__(self):
+        self._cola = deque(maxlen=getattr(settings, 'CLICKS_MAXIMO', 10000))
+        self._lote = getattr(settings, 'CLICKS_LOTE', 500)
+        self._intervalo = getattr(settings, 'CLICKS_INTERVALO', 5)
+        self._hay_lote = threading.Event()
+        self._lock_escritura = threading.Lock()
+        self._lock_hilo = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self.descartados = 0
+
+    def agregar(self, afiliado_id, producto_id, visitante):
+        """Encola un click. No toca la base de datos ni espera al hilo."""
+        if len(self._cola) == self._cola.maxlen:
+            self.descartados += 1
+        self._cola.append((afiliado_id, producto_id, timezone.now(), visitante))
+        self._arrancar()
+        if len(self._cola) >= self._lote:
+            self._hay_lote.set()
+
+    def pendientes(self):
+        return len(self._cola)
+
+    def vaciar(self):
+        """Escribe en la base todo lo encolado hasta ahora. Devuelve cuántos se guardaron."""
+        from .models import ClickAfiliado
+        from .visitantes import acumular
+
+        with self._lock_escritura:
+            guardados = 0
+            while self._cola:
+                lote = []
+                while self._cola and len(lote) < self._lote:
+                    lote.append(self._cola.popleft())
+                try:
+                    ClickAfiliado.objects.bulk_create([
+                        ClickAfiliado(afiliado_id=afiliado_id, producto_id=producto_id,
+                                      fecha=fecha, visitante=visitante)
+                        for afiliado_id, producto_id, fecha, visitante in lote
+                    ], batch_size=self._lote)
+                except DatabaseError as e:
+                    # Producto o afiliado borrado mientras tanto, base caída...:
+                    # se pierde el lote, pero la cola sigue funcionando
+                    logger.warning('No se pudieron guardar %d clicks de afiliado: %s', len(lote), e)
+                    continue
+                guardados += len(lote)
+                try:
+                    acumular(lote)
+                except Exception as e:
+                    # Los clicks ya están guardados: solo faltan en los sketches
+                    logger.warning(
+                        'Se guardaron %d clicks de afiliado pero no se sumaron sus visitantes: %s',
+                        len(lote), e,
+                    )
+            return guardados
+
+    def _arrancar(self):
+        # Un hilo por proceso (tras un fork el hilo del padre no existe en el hijo)
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock_hilo:
+            if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name='clicks-afiliado', daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._hay_lote.wait(self._intervalo)
+            self._hay_lote.clear()
+            try:
+                if self._cola:
+                    self.vaciar()
+            except Exception:
+                logger.exception('Error al vaciar la cola de clicks de afiliado')
+            finally:
+                # El hilo no pasa por request_finished: cierra su conexión
+                connection.close()
+
+
+buffer = BufferClicks()
+
+
+def registrar_click(request, afiliado_id, producto_id):
+    buffer.agregar(afiliado_id, producto_id, hash_visitante(request))
+
+
+@atexit.register
+def _vaciar_al_salir():
+    try:
+        if buffer.pendientes():
+            buffer.vaciar()
+    except Exception:
+        logger.exception('No se pudieron guardar los clicks pendientes al salir')
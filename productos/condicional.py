@@ -0,0 +1,117 @@
+"""
+GET condicional (ETag / Last-Modified) para el catálogo y el detalle.
+
+Los validadores se calculan antes de la vista con datos baratos:
+- listados: la última fecha_actualizacion y el total de productos activos,
+  que ya vienen de la caché de totales (catalogo.contar_productos_por_tipo),
+- detalle: la fecha_actualizacion de la fila del producto.
+
+Esas fechas solo miran productos activos: desactivar o borrar uno no las
+mueve. Por eso el ETag incluye la versión de páginas y Last-Modified toma
+la fecha de su última invalidación (cache_paginas), que las señales
+cambian con cualquier alta, baja, desactivación o afiliación. El ETag
+incluye también la URL completa (filtros, cursor, ?ref=).
+
+Solo hay validadores para anónimos: a un usuario logueado las páginas le
+muestran su menú, rol y carrito, que no cambian ninguna de esas fechas.
+Tampoco con mensajes pendientes (la página no es la misma que se guardó
+el navegador).
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache_paginas import paginas_modificadas, version_paginas
+from .catalogo import contar_productos_por_tipo
+from .models import Producto
+
+
+def _sin_validadores(request):
+    return request.user.is_authenticated or bool(len(get_messages(request)))
+
+
+def _etag(request, *partes):
+    crudo = '|'.join(str(p) for p in (version_paginas(), request.get_full_path(), *partes))
+    # Débil: la misma página puede salir comprimida o no (Vary: Accept-Encoding)
+    return f'W/"{hashlib.sha1(crudo.encode()).hexdigest()}"'
+
+
+# ============================================================================
+# 📚 LISTADOS
+# ============================================================================
+
+def _ultima_fecha(*fechas):
+    return max((f for f in fechas if f is not None), default=None)
+
+
+def etag_catalogo(request, *args, **kwargs):
+    if _sin_validadores(request):
+        return None
+    totales = contar_productos_por_tipo()
+    return _etag(request, totales['actualizado'], totales['total'])
+
+
+def last_modified_catalogo(request, *args, **kwargs):
+    if _sin_validadores(request):
+        return None
+    return _ultima_fecha(contar_productos_por_tipo()['actualizado'], paginas_modificadas())
+
+
+# ============================================================================
+# 🔍 DETALLE
+# ============================================================================
+
+def _fecha_producto(request, producto_id):
+    # Se guarda en el request: ETag y Last-Modified usan la misma consulta
+    if not hasattr(request, '_fecha_producto'):
+        request._fecha_producto = Producto.objects.filter(
+            pk=producto_id, activo=True
+        ).values_list('fecha_actualizacion', flat=True).order_by('pk').first()
+    return request._fecha_producto
+
+
+def etag_detalle(request, producto_id, *args, **kwargs):
+    if _sin_validadores(request):
+        return None
+    fecha = _fecha_producto(request, producto_id)
+    if fecha is None:
+        return None
+    return _etag(request, producto_id, fecha.isoformat())
+
+
+def last_modified_detalle(request, producto_id, *args, **kwargs):
+    if _sin_validadores(request):
+        return None
+    fecha = _fecha_producto(request, producto_id)
+    if fecha is None:
+        return None
+    return _ultima_fecha(fecha, paginas_modificadas())
+
+
+def condicional(etag_func, last_modified_func):
+    """
+    Como @condition, pero además marca la respuesta con Cache-Control:
+    no-cache para que el navegador siempre revalide (y private si hay
+    usuario logueado) en lugar de reutilizarla por heurística.
+    """
+    def decorador(vista):
+        vista_condicional = condition(etag_func=etag_func, last_modified_func=last_modified_func)(vista)
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            response = vista_condicional(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+                if request.user.is_authenticated:
+                    patch_cache_control(response, no_cache=True, private=True)
+                else:
+                    patch_cache_control(response, no_cache=True)
+            return response
+        return envoltura
+    return decorador
+
+
+condicional_catalogo = condicional(etag_catalogo, last_modified_catalogo)
+condicional_detalle = condicional(etag_detalle, last_modified_detalle)
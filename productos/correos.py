@@ -0,0 +1,150 @@
+"""
+Cola de salida de emails (outbox).
+
+Antes confirmar_pedido mandaba el email de confirmación por SMTP dentro de
+la request: cada checkout esperaba al servidor de correo y los errores se
+perdían con fail_silently. Ahora encolar() guarda un CorreoPendiente en la
+misma transacción que el pedido (si el pedido se revierte, el email
+también) y los manda después la tarea enviar_correos (procesar_tareas, ver
+tareas.py) o el comando enviar_correos (p. ej. desde cron):
+
+- de a lotes, por una sola conexión SMTP (EMAIL_BACKEND) para todo el lote,
+- cada email tomado queda reservado CORREOS_RESERVA segundos, así otro
+  envío no lo repite y, si el proceso muere, se vuelve a intentar,
+- si falla, se reintenta con espera exponencial (CORREOS_ESPERA_REINTENTO,
+  2x, 4x...) hasta CORREOS_MAX_INTENTOS; después queda abandonado con el
+  error guardado (se puede reintentar desde el admin).
+
+En bases con SELECT ... SKIP LOCKED (PostgreSQL, MySQL 8) pueden correr
+varios enviar_correos a la vez; en SQLite conviene uno solo.
+
+Con EMAIL_BACKEND de locmem o de archivos funciona igual que con SMTP.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import CorreoPendiente
+from . import tareas
+
+
+logger = logging.getLogger(__name__)
+
+
+def _max_intentos():
+    return getattr(settings, 'CORREOS_MAX_INTENTOS', 5)
+
+
+def _espera_reintento(intentos):
+    base = getattr(settings, 'CORREOS_ESPERA_REINTENTO', 60)
+    return timedelta(seconds=min(base * 2 ** (intentos - 1), 60 * 60 * 6))
+
+
+def _reserva():
+    return timedelta(seconds=getattr(settings, 'CORREOS_RESERVA', 60 * 5))
+
+
+def encolar(asunto, cuerpo, destinatarios, pedido=None, remitente=None):
+    """Guarda el email para enviarlo después (dentro de la transacción actual)"""
+    correo = CorreoPendiente.objects.create(
+        pedido=pedido,
+        remitente=remitente or settings.DEFAULT_FROM_EMAIL,
+        destinatarios=', '.join(destinatarios),
+        asunto=asunto[:255],
+        cuerpo=cuerpo,
+        proximo_intento=timezone.now(),
+    )
+    # Después del commit: una tarea pendiente que ya exista verá este email
+    transaction.on_commit(tareas.enviar_correos.encolar)
+    return correo
+
+
+def pendientes():
+    return CorreoPendiente.objects.filter(enviado__isnull=True, proximo_intento__lte=timezone.now())
+
+
+def proximo_envio():
+    """Cuándo toca el próximo email sin enviar (reintentos incluidos), o None"""
+    return CorreoPendiente.objects.filter(
+        enviado__isnull=True, proximo_intento__isnull=False
+    ).aggregate(proximo=Min('proximo_intento'))['proximo']
+
+
+def _tomar(lote):
+    """Reserva hasta `lote` emails pendientes corriendo su próximo intento"""
+    with transaction.atomic():
+        consulta = pendientes().order_by('proximo_intento')
+        if connection.features.has_select_for_update_skip_locked:
+            consulta = consulta.select_for_update(skip_locked=True)
+        correos = list(consulta[:lote])
+        CorreoPendiente.objects.filter(pk__in=[c.pk for c in correos]).update(
+            proximo_intento=timezone.now() + _reserva()
+        )
+    return correos
+
+
+def _registrar_error(correo, error):
+    intentos = correo.intentos + 1
+    CorreoPendiente.objects.filter(pk=correo.pk).update(
+        intentos=intentos,
+        ultimo_error=f'{type(error).__name__}: {error}'[:2000],
+        proximo_intento=(
+            timezone.now() + _espera_reintento(intentos) if intentos < _max_intentos() else None
+        ),
+    )
+
+
+def enviar_pendientes(lote=100):
+    """
+    Envía un lote de emails pendientes por una sola conexión. Devuelve
+    (enviados, fallidos); (0, 0) si no había nada que enviar.
+    """
+    correos = _tomar(lote)
+    if not correos:
+        return 0, 0
+
+    enviados, fallidos = 0, 0
+    conexion = get_connection()
+    try:
+        for posicion, correo in enumerate(correos):
+            try:
+                # La primera vez, o después de un error (la conexión puede
+                # haber quedado rota), se abre una conexión nueva
+                conexion.open()
+            except Exception as e:
+                # Sin servidor de correo no se puede mandar nada del lote: se
+                # registra el error en todos para que se reintenten con espera
+                logger.warning('No se pudo conectar para enviar emails: %s', e)
+                for pendiente in correos[posicion:]:
+                    _registrar_error(pendiente, e)
+                return enviados, fallidos + len(correos) - posicion
+
+            mensaje = EmailMessage(
+                correo.asunto, correo.cuerpo, correo.remitente,
+                correo.lista_destinatarios(), connection=conexion,
+            )
+            try:
+                mensaje.send()
+            except Exception as e:
+                fallidos += 1
+                _registrar_error(correo, e)
+                try:
+                    conexion.close()
+                except Exception:
+                    pass
+                continue
+            enviados += 1
+            CorreoPendiente.objects.filter(pk=correo.pk).update(
+                enviado=timezone.now(), intentos=correo.intentos + 1, ultimo_error='',
+            )
+    finally:
+        try:
+            conexion.close()
+        except Exception:
+            pass
+    return enviados, fallidos
@@ -0,0 +1,167 @@
+"""
+Facetas del catálogo: cantidad de productos por tipo, rango de precio y
+estado de stock, junto a los filtros de home_tienda.
+
+Todas las facetas salen de UNA consulta agrupada por
+(tipo_producto, rango_precio, estado_stock) sobre los productos activos. El
+resultado no depende de los filtros elegidos, así que se guarda una sola
+vez en la caché (las señales de Producto lo invalidan) y las cantidades de
+cada combinación de filtros se calculan en Python sobre esas pocas filas:
+cada faceta cuenta aplicando los demás filtros, pero no el suyo propio.
+"""
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Q, Value, When
+
+from .models import Producto
+
+
+# Rangos en guaraníes: clave -> (etiqueta, mínimo incluido, máximo excluido)
+RANGOS_PRECIO = {
+    'hasta-50k': ('Hasta ₲50.000', None, 50000),
+    '50k-200k': ('₲50.000 a ₲200.000', 50000, 200000),
+    '200k-1m': ('₲200.000 a ₲1.000.000', 200000, 1000000),
+    'mas-1m': ('Más de ₲1.000.000', 1000000, None),
+}
+
+# Igual que el aviso "Pocas unidades" de las tarjetas (los digitales no tienen stock)
+LIMITE_POCAS_UNIDADES = 5
+ESTADOS_STOCK = {
+    'disponible': 'Con stock',
+    'pocas': 'Pocas unidades',
+}
+
+TIPOS = {
+    'FISICO': '📦 Físicos',
+    'DIGITAL': '💻 Digitales',
+}
+
+# Faceta -> (campo anotado en la consulta agrupada, opciones)
+FACETAS = {
+    'tipo': ('tipo_producto', TIPOS),
+    'precio': ('rango_precio', {clave: etiqueta for clave, (etiqueta, _, _) in RANGOS_PRECIO.items()}),
+    'stock': ('estado_stock', ESTADOS_STOCK),
+}
+
+CLAVE_FACETAS = 'catalogo:facetas'
+
+
+def _condicion_rango(minimo, maximo):
+    condicion = Q()
+    if minimo is not None:
+        condicion &= Q(precio__gte=minimo)
+    if maximo is not None:
+        condicion &= Q(precio__lt=maximo)
+    return condicion
+
+
+def _condicion_pocas():
+    return Q(tipo_producto='FISICO', stock__lte=LIMITE_POCAS_UNIDADES)
+
+
+# ============================================================================
+# 🔎 FILTROS
+# ============================================================================
+
+def leer_filtros(params):
+    """Filtros válidos de la query string ({'tipo': ..., 'precio': ..., 'stock': ...})"""
+    filtros = {}
+    for faceta, (_, opciones) in FACETAS.items():
+        valor = params.get(faceta, '')
+        if valor in opciones:
+            filtros[faceta] = valor
+    return filtros
+
+
+def filtrar(queryset, filtros):
+    """Aplica los filtros de facetas a un queryset de productos"""
+    if 'tipo' in filtros:
+        queryset = queryset.filter(tipo_producto=filtros['tipo'])
+    if 'precio' in filtros:
+        _, minimo, maximo = RANGOS_PRECIO[filtros['precio']]
+        queryset = queryset.filter(_condicion_rango(minimo, maximo))
+    if 'stock' in filtros:
+        if filtros['stock'] == 'pocas':
+            queryset = queryset.filter(_condicion_pocas())
+        else:
+            queryset = queryset.exclude(_condicion_pocas())
+    return queryset
+
+
+# ============================================================================
+# 📊 CONTEO
+# ============================================================================
+
+def _filas_agrupadas():
+    """[(tipo_producto, rango_precio, estado_stock, cantidad)] de los productos activos"""
+    filas = cache.get(CLAVE_FACETAS)
+    if filas is None:
+        rango_precio = Case(
+            *[When(_condicion_rango(minimo, maximo), then=Value(clave))
+              for clave, (_, minimo, maximo) in RANGOS_PRECIO.items()],
+            output_field=CharField(),
+        )
+        estado_stock = Case(
+            When(_condicion_pocas(), then=Value('pocas')),
+            default=Value('disponible'),
+            output_field=CharField(),
+        )
+        filas = list(
+            Producto.objects.filter(activo=True)
+            .annotate(rango_precio=rango_precio, estado_stock=estado_stock)
+            .values_list('tipo_producto', 'rango_precio', 'estado_stock')
+            .annotate(cantidad=Count('id'))
+            .order_by()
+        )
+        cache.set(CLAVE_FACETAS, filas, getattr(settings, 'CATALOGO_TOTALES_TTL', 300))
+    return filas
+
+
+def invalidar_facetas():
+    cache.delete(CLAVE_FACETAS)
+
+
+def calcular_facetas(filtros, orden=None):
+    """
+    Facetas para los filtros actuales. Devuelve
+    {faceta: [{'valor', 'etiqueta', 'cantidad', 'activo', 'url'}]} donde
+    `url` es la query string que activa (o quita) esa opción.
+    """
+    filas = _filas_agrupadas()
+    columnas = {faceta: i for i, faceta in enumerate(FACETAS)}
+
+    resultado = {}
+    for faceta, (_, opciones) in FACETAS.items():
+        otros = {f: v for f, v in filtros.items() if f != faceta}
+        cantidades = dict.fromkeys(opciones, 0)
+        for fila in filas:
+            if all(fila[columnas[f]] == v for f, v in otros.items()):
+                valor = fila[columnas[faceta]]
+                if valor in cantidades:
+                    cantidades[valor] += fila[-1]
+
+        resultado[faceta] = [
+            {
+                'valor': valor,
+                'etiqueta': etiqueta,
+                'cantidad': cantidades[valor],
+                'activo': filtros.get(faceta) == valor,
+                'url': query_string(
+                    {**otros, faceta: valor} if filtros.get(faceta) != valor else otros, orden
+                ),
+            }
+            for valor, etiqueta in opciones.items()
+        ]
+        resultado[faceta + '_total'] = sum(cantidades.values())
+        resultado[faceta + '_todos_url'] = query_string(otros, orden)
+    return resultado
+
+
+def query_string(filtros, orden=None):
+    """Query string de los filtros (en orden fijo) más el orden elegido"""
+    params = [(faceta, filtros[faceta]) for faceta in FACETAS if faceta in filtros]
+    if orden:
+        params.append(('orden', orden))
+    return urlencode(params)
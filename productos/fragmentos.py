@@ -0,0 +1,57 @@
+"""
+Caché de fragmentos para las tarjetas de producto.
+
+El HTML de cada tarjeta (imagen, nombre, descripción, precio, stock) se
+guarda en la caché con la clave tarjeta:<variante>:<id> junto con la
+fecha_actualizacion del producto como versión: si el producto cambió la
+entrada se descarta y se vuelve a renderizar. Además las señales de
+Producto borran las claves en cada alta, cambio o baja (ver signals.py).
+
+Lo que depende del usuario (botones de afiliación, links con ?ref=) no se
+guarda: la plantilla de la variante marca con {{ acciones }} dónde va y el
+template tag {% tarjeta_producto %} lo renderiza en cada request.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+VARIANTES = ('catalogo', 'afiliarme', 'mis_productos')
+
+MARCA_ACCIONES = '<!--tarjeta:acciones-->'
+
+
+def clave_tarjeta(producto_id, variante):
+    return f'tarjeta:{variante}:{producto_id}'
+
+
+def _version(producto):
+    return producto.fecha_actualizacion.isoformat() if producto.fecha_actualizacion else None
+
+
+def html_tarjeta(producto, variante):
+    """
+    HTML de la tarjeta con la marca MARCA_ACCIONES en lugar de la parte
+    por usuario. Sale de la caché si la versión guardada sigue vigente.
+    """
+    if variante not in VARIANTES:
+        raise ValueError(f'Variante de tarjeta desconocida: {variante}')
+
+    clave = clave_tarjeta(producto.pk, variante)
+    version = _version(producto)
+    guardado = cache.get(clave)
+    if guardado is not None and guardado[0] == version:
+        return guardado[1]
+
+    html = render_to_string(f'productos/tarjetas/{variante}.html', {
+        'producto': producto,
+        'acciones': mark_safe(MARCA_ACCIONES),
+    })
+    cache.set(clave, (version, html), getattr(settings, 'TARJETAS_CACHE_TTL', 60 * 60 * 24))
+    return html
+
+
+def invalidar_tarjetas(producto_id):
+    """Borra de la caché todas las variantes de la tarjeta de un producto"""
+    cache.delete_many([clave_tarjeta(producto_id, variante) for variante in VARIANTES])
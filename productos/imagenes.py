@@ -0,0 +1,208 @@
+"""
+Variantes redimensionadas de las imágenes de producto.
+
+Cada imagen subida se convierte a tamaños fijos en WebP y JPEG:
+
+- thumb:   96x96 recortada   (admin, carrito, pedidos)
+- card:    640x448 recortada (tarjetas del catálogo, h-56 con object-cover)
+- detalle: hasta 1200 de ancho, sin recortar (página de detalle)
+
+Los archivos se guardan en media/productos/variantes/ junto con un
+manifiesto JSON por imagen que lista las variantes generadas. Se generan
+al guardar el producto (ver signals.py) o, si faltan, la primera vez que
+una plantilla las pide; el manifiesto además se guarda en la caché para no
+leerlo del disco en cada request.
+
+Los comprobantes de pago se enderezan, achican y recomprimen al subirse, y
+se guarda una vista previa chica para el admin (ver procesar_comprobante).
+"""
+import hashlib
+import io
+import json
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+# variante -> (ancho, alto, recortar). Con recortar=False el alto es el máximo
+VARIANTES = {
+    'thumb': (96, 96, True),
+    'card': (640, 448, True),
+    'detalle': (1200, 1200, False),
+}
+
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+CARPETA_VARIANTES = 'productos/variantes'
+
+# Versión del formato de variantes: subirla regenera todo
+VERSION_PIPELINE = 1
+
+
+def _base(nombre_original):
+    """Prefijo de los archivos derivados de una imagen (único por ruta original)"""
+    raiz = posixpath.splitext(posixpath.basename(nombre_original))[0][:40]
+    huella = hashlib.sha1(nombre_original.encode()).hexdigest()[:10]
+    return f'{CARPETA_VARIANTES}/{raiz}-{huella}'
+
+
+def _clave_cache(nombre_original):
+    return f'imagenes:manifiesto:{hashlib.sha1(nombre_original.encode()).hexdigest()}'
+
+
+def _redimensionar(imagen, ancho, alto, recortar):
+    if recortar:
+        return ImageOps.fit(imagen, (ancho, alto), Image.LANCZOS)
+    copia = imagen.copy()
+    copia.thumbnail((ancho, alto), Image.LANCZOS)
+    return copia
+
+
+def _guardar(nombre, contenido):
+    if default_storage.exists(nombre):
+        default_storage.delete(nombre)
+    return default_storage.save(nombre, ContentFile(contenido))
+
+
+def generar_variantes(nombre_original):
+    """
+    Genera todas las variantes de una imagen y su manifiesto. Devuelve el
+    manifiesto o None si el archivo no existe o no es una imagen válida.
+    """
+    try:
+        with default_storage.open(nombre_original, 'rb') as archivo:
+            imagen = Image.open(archivo)
+            imagen = ImageOps.exif_transpose(imagen)
+            imagen = imagen.convert('RGB')
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        logger.warning('No se pudieron generar variantes de %s: %s', nombre_original, e)
+        return None
+
+    base = _base(nombre_original)
+    manifiesto = {'origen': nombre_original, 'version': VERSION_PIPELINE, 'variantes': {}}
+    for variante, (ancho, alto, recortar) in VARIANTES.items():
+        derivada = _redimensionar(imagen, ancho, alto, recortar)
+        datos = {'ancho': derivada.width, 'alto': derivada.height}
+        for extension, (formato, opciones) in FORMATOS.items():
+            buffer = io.BytesIO()
+            derivada.save(buffer, formato, **opciones)
+            datos[extension] = _guardar(f'{base}_{variante}.{extension}', buffer.getvalue())
+        manifiesto['variantes'][variante] = datos
+
+    _guardar(f'{base}.json', json.dumps(manifiesto).encode())
+    cache.set(_clave_cache(nombre_original), manifiesto, None)
+    return manifiesto
+
+
+def obtener_manifiesto(nombre_original):
+    """
+    Manifiesto de variantes de una imagen: de la caché, del disco o
+    generándolo en el momento. None si la imagen no se puede procesar.
+    """
+    if not nombre_original:
+        return None
+    clave = _clave_cache(nombre_original)
+    manifiesto = cache.get(clave)
+    if manifiesto is not None:
+        return manifiesto or None  # {} = la imagen falló hace poco
+
+    nombre_manifiesto = f'{_base(nombre_original)}.json'
+    try:
+        with default_storage.open(nombre_manifiesto, 'rb') as archivo:
+            manifiesto = json.load(archivo)
+    except (OSError, ValueError):
+        manifiesto = None
+
+    if not manifiesto or manifiesto.get('version') != VERSION_PIPELINE:
+        manifiesto = generar_variantes(nombre_original)
+    if manifiesto is None:
+        # Se recuerda el fallo un rato para no reintentarlo en cada request
+        cache.set(clave, {}, getattr(settings, 'IMAGENES_REINTENTO_FALLIDAS', 300))
+        return None
+    cache.set(clave, manifiesto, None)
+    return manifiesto
+
+
+def url_variante(campo_imagen, variante, formato='jpg'):
+    """URL de una variante, o la de la imagen original si no hay variantes"""
+    if not campo_imagen:
+        return ''
+    manifiesto = obtener_manifiesto(campo_imagen.name)
+    if manifiesto is None:
+        return campo_imagen.url
+    return default_storage.url(manifiesto['variantes'][variante][formato])
+
+
+def srcset(campo_imagen, variantes, formato):
+    """Valor de srcset ("url 640w, url 1200w") para las variantes indicadas"""
+    manifiesto = obtener_manifiesto(campo_imagen.name) if campo_imagen else None
+    if manifiesto is None:
+        return ''
+    return ', '.join(
+        f"{default_storage.url(manifiesto['variantes'][v][formato])} {manifiesto['variantes'][v]['ancho']}w"
+        for v in variantes
+    )
+
+
+
+# ============================================================================
+# 🧾 COMPROBANTES DE PAGO
+# ============================================================================
+
+def _jpeg(imagen, lado_maximo, calidad):
+    copia = imagen.copy()
+    copia.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+    buffer = io.BytesIO()
+    copia.save(buffer, 'JPEG', quality=calidad, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def comprimir_comprobante(archivo, nombre):
+    """
+    Endereza (EXIF), achica y recomprime un comprobante. Devuelve
+    (ContentFile del comprobante, ContentFile de la vista previa) o None si
+    el archivo no es una imagen que Pillow pueda leer.
+    """
+    try:
+        archivo.seek(0)
+        imagen = Image.open(archivo)
+        imagen = ImageOps.exif_transpose(imagen).convert('RGB')
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        logger.warning('No se pudo procesar el comprobante %s: %s', nombre, e)
+        archivo.seek(0)
+        return None
+
+    nombre_jpg = posixpath.splitext(posixpath.basename(nombre))[0] + '.jpg'
+    comprobante = _jpeg(
+        imagen,
+        getattr(settings, 'COMPROBANTE_LADO_MAXIMO', 1600),
+        getattr(settings, 'COMPROBANTE_CALIDAD', 80),
+    )
+    preview = _jpeg(imagen, getattr(settings, 'COMPROBANTE_LADO_PREVIEW', 320), 70)
+    return ContentFile(comprobante, name=nombre_jpg), ContentFile(preview, name=nombre_jpg)
+
+
+def procesar_comprobante(pedido):
+    """
+    Si el pedido trae un comprobante recién subido (todavía sin guardar), lo
+    reemplaza por la versión comprimida y le genera la vista previa.
+    """
+    archivo = pedido.comprobante_pago
+    if not archivo or archivo._committed or getattr(pedido, '_comprobante_procesado', False):
+        return
+    resultado = comprimir_comprobante(archivo.file, archivo.name)
+    if resultado is not None:
+        pedido.comprobante_pago, pedido.comprobante_preview = resultado
+    # Se puede llamar antes del save() (fuera de la transacción): la señal
+    # pre_save no lo vuelve a comprimir
+    pedido._comprobante_procesado = True
@@ -0,0 +1,118 @@
+"""
+Descuento de stock al confirmar pedidos.
+
+Antes confirmar_pedido leía el stock de cada producto y después hacía
+`producto.stock -= cantidad; producto.save()`: dos checkouts simultáneos
+del mismo producto leían el mismo stock y ambos vendían la última unidad.
+
+descontar() hace, por cada producto físico, un UPDATE condicional
+
+    UPDATE producto SET stock = stock - n WHERE id = ? AND stock >= n
+
+que la base resuelve de forma atómica (la fila queda bloqueada hasta el
+final de la transacción), así que la validación y el descuento son la
+misma sentencia. Si algún producto no alcanza se revierte todo y se lanza
+StockInsuficiente con el detalle de cada uno. Los UPDATE se hacen en orden
+de id para que dos pedidos con los mismos productos no se bloqueen entre sí.
+
+Las reservas vigentes de otros usuarios (ver reservas.py) cuentan como
+stock no disponible: el WHERE compara contra stock menos lo reservado.
+
+Los .update() no disparan las señales de Producto: las cachés que muestran
+el stock se invalidan acá al confirmar la transacción.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalogo import invalidar_totales
+from .cache_paginas import invalidar_paginas
+from .facetas import invalidar_facetas
+from .fragmentos import invalidar_tarjetas
+from .models import Producto, ReservaStock
+
+
+@dataclass
+class Faltante:
+    producto_id: int
+    nombre: str
+    solicitado: int
+    disponible: int
+
+
+class StockInsuficiente(Exception):
+    """Uno o más productos no tienen el stock pedido; `faltantes` dice cuáles"""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__(', '.join(
+            f'{f.nombre}: pedido {f.solicitado}, disponible {f.disponible}' for f in faltantes
+        ))
+
+
+def cantidades_fisicas(items):
+    """{producto_id: cantidad} de los items (ItemPedido o LineaCarrito) con productos físicos"""
+    cantidades = {}
+    for item in items:
+        if item.producto.tipo_producto == 'FISICO':
+            cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+    return cantidades
+
+
+def _invalidar(producto_ids):
+    def invalidar():
+        for producto_id in producto_ids:
+            invalidar_tarjetas(producto_id)
+        invalidar_totales()
+        invalidar_facetas()
+        invalidar_paginas()
+    transaction.on_commit(invalidar)
+
+
+def descontar(cantidades, usuario=None):
+    """
+    Descuenta {producto_id: cantidad} del stock de los productos físicos,
+    todo o nada. Lanza StockInsuficiente si alguno no alcanza. Las reservas
+    de `usuario` no se restan (son las que está usando).
+    """
+    cantidades = {pk: n for pk, n in cantidades.items() if n > 0}
+    if not cantidades:
+        return
+    ahora = timezone.now()
+    reservado = ReservaStock.objects.reservado(excluir_usuario=usuario)
+    with transaction.atomic():
+        fallidos = [
+            pk for pk in sorted(cantidades)
+            if not Producto.objects.filter(
+                pk=pk, tipo_producto='FISICO', stock__gte=reservado + cantidades[pk]
+            ).update(stock=F('stock') - cantidades[pk], fecha_actualizacion=ahora)
+        ]
+        if fallidos:
+            # Se sale del atomic con la excepción: los UPDATE que sí pasaron se revierten
+            actuales = {
+                pk: (nombre, max(stock - reservas, 0)) for pk, nombre, stock, reservas in
+                Producto.objects.filter(pk__in=fallidos).annotate(reservas=reservado)
+                .values_list('pk', 'nombre', 'stock', 'reservas')
+            }
+            faltantes = []
+            for pk in fallidos:
+                nombre, disponible = actuales.get(pk, ('', 0))  # un producto borrado no tiene stock
+                faltantes.append(Faltante(pk, nombre, cantidades[pk], disponible))
+            raise StockInsuficiente(faltantes)
+        _invalidar(list(cantidades))
+
+
+def devolver(cantidades):
+    """Vuelve a sumar {producto_id: cantidad} al stock de los productos físicos"""
+    cantidades = {pk: n for pk, n in cantidades.items() if n > 0}
+    if not cantidades:
+        return
+    ahora = timezone.now()
+    with transaction.atomic():
+        for pk in sorted(cantidades):
+            Producto.objects.filter(pk=pk, tipo_producto='FISICO').update(
+                stock=F('stock') + cantidades[pk], fecha_actualizacion=ahora
+            )
+        _invalidar(list(cantidades))
@@ -0,0 +1,105 @@
+"""
+Links cortos de afiliado: /r/<codigo>/ redirige a
+/productos/detalle/<producto_id>/?ref=<username>.
+
+Cada afiliación tiene su código de 7 caracteres base62 (62**7, unos 3.5
+billones de combinaciones), creado una sola vez al afiliarse (ver
+signals.py) y guardado en LinkCorto. La página de links los lee con una
+sola consulta en lugar de armar cada URL en cada visita.
+
+La redirección resuelve el código con una caché LRU en memoria del proceso
+(LINKS_CAPACIDAD entradas, LINKS_TTL segundos): con la entrada en caché no
+se consulta la base de datos. Renombrar al afiliado o borrar el link
+descarta las entradas afectadas.
+"""
+import secrets
+import string
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+
+from .lru import CacheLRU
+from .models import LinkCorto
+
+
+ALFABETO = string.digits + string.ascii_letters
+LONGITUD_CODIGO = 7
+
+# codigo -> (url de destino, afiliado_id), o _NO_EXISTE
+_destinos = CacheLRU(
+    getattr(settings, 'LINKS_CAPACIDAD', 10000),
+    getattr(settings, 'LINKS_TTL', 600),
+)
+_NO_EXISTE = (None, None)
+
+
+def generar_codigo():
+    return ''.join(secrets.choice(ALFABETO) for _ in range(LONGITUD_CODIGO))
+
+
+def crear_links(afiliado_ids, producto_ids):
+    """
+    Crea los links que falten para cada combinación afiliado/producto. Los
+    que ya existen no se tocan (el código de un link nunca cambia).
+    """
+    pares = {(a, p) for a in afiliado_ids for p in producto_ids}
+    for _ in range(3):
+        existentes = set(
+            LinkCorto.objects.filter(afiliado_id__in=afiliado_ids, producto_id__in=producto_ids)
+            .values_list('afiliado_id', 'producto_id')
+        )
+        faltan = pares - existentes
+        if not faltan:
+            return
+        try:
+            with transaction.atomic():
+                LinkCorto.objects.bulk_create([
+                    LinkCorto(codigo=generar_codigo(), afiliado_id=a, producto_id=p)
+                    for a, p in faltan
+                ])
+        except IntegrityError:
+            # Un código repetido o un link creado al mismo tiempo por otro
+            # proceso: se vuelve a mirar qué falta y se reintenta
+            continue
+
+
+def destino(codigo):
+    """URL del detalle con ?ref= a la que lleva el código, o None si no existe"""
+    datos = _destinos.get(codigo)
+    if datos is None:
+        fila = LinkCorto.objects.filter(codigo=codigo).values_list(
+            'producto_id', 'afiliado_id', 'afiliado__username'
+        ).first()
+        if fila is None:
+            datos = _NO_EXISTE
+        else:
+            producto_id, afiliado_id, username = fila
+            url = reverse('productos:detalle_producto', kwargs={'producto_id': producto_id})
+            datos = (f'{url}?{urlencode({"ref": username})}', afiliado_id)
+        _destinos.set(codigo, datos)
+    return datos[0]
+
+
+def links_de(afiliado):
+    """Links de los productos activos a los que el usuario sigue afiliado, en una consulta"""
+    return (
+        LinkCorto.objects
+        .filter(afiliado=afiliado, producto__activo=True, producto__afiliados=afiliado)
+        .select_related('producto')
+        .order_by('-producto__fecha_creacion')
+    )
+
+
+# ============================================================================
+# 🧹 INVALIDACIÓN
+# ============================================================================
+
+def invalidar_afiliado(afiliado_id):
+    """Descarta los destinos cacheados de un afiliado (p. ej. al cambiar su username)"""
+    _destinos.delete_si(lambda codigo, datos: datos[1] == afiliado_id)
+
+
+def invalidar_codigo(codigo):
+    _destinos.delete(codigo)
@@ -0,0 +1,63 @@
+"""
+Caché LRU en memoria del proceso, con capacidad fija y vencimiento
+opcional por entrada. Segura para usar desde varios hilos.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Diccionario acotado: al superar `capacidad` se descarta la entrada
+    usada hace más tiempo. Con `ttl` (segundos) las entradas además vencen,
+    lo que acota cuánto tarda en verse un cambio hecho en otro proceso.
+    """
+
+    _FALTA = object()
+
+    def __init__(self, capacidad=1000, ttl=None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave, self._FALTA)
+            if entrada is self._FALTA:
+                return default
+            valor, vence = entrada
+            if vence is not None and vence < time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        vence = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, vence)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def delete_si(self, condicion):
+        """Borra las entradas para las que condicion(clave, valor) es verdadera"""
+        with self._lock:
+            for clave in [c for c, (v, _) in self._datos.items() if condicion(c, v)]:
+                del self._datos[clave]
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return self.get(clave, self._FALTA) is not self._FALTA
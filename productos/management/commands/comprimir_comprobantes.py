@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from productos.imagenes import comprimir_comprobante
+from productos.models import Pedido
+
+
+class Command(BaseCommand):
+    help = 'Comprime los comprobantes de pago ya subidos y genera sus vistas previas'
+
+    def handle(self, *args, **options):
+        procesados = 0
+        pedidos = Pedido.objects.exclude(comprobante_pago='').exclude(comprobante_pago=None).filter(
+            comprobante_preview__in=['', None]
+        )
+        for pedido in pedidos.iterator():
+            original = pedido.comprobante_pago.name
+            try:
+                with pedido.comprobante_pago.open('rb') as archivo:
+                    resultado = comprimir_comprobante(archivo, original)
+            except OSError:
+                resultado = None
+            if resultado is None:
+                self.stdout.write(self.style.WARNING(f'⚠️ Pedido {pedido.numero_pedido}: no se pudo procesar {original}'))
+                continue
+
+            comprobante, preview = resultado
+            pedido.comprobante_pago.save(comprobante.name, comprobante, save=False)
+            pedido.comprobante_preview.save(preview.name, preview, save=False)
+            # update() en lugar de save(): no recalcula totales ni dispara señales
+            Pedido.objects.filter(pk=pedido.pk).update(
+                comprobante_pago=pedido.comprobante_pago.name,
+                comprobante_preview=pedido.comprobante_preview.name,
+            )
+            if original != pedido.comprobante_pago.name:
+                default_storage.delete(original)
+            procesados += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {procesados} comprobantes comprimidos'))
@@ -0,0 +1,50 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos.correos import enviar_pendientes
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía los emails de la cola de salida (confirmaciones de pedido...) de a '
+        'lotes, por una sola conexión SMTP por lote y con reintentos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help='Emails por conexión')
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='No terminar: volver a revisar la cola cada --intervalo segundos'
+        )
+        parser.add_argument('--intervalo', type=float, default=10, help='Segundos entre revisiones con --continuo')
+
+    def handle(self, *args, **options):
+        while True:
+            total_enviados, total_fallidos = 0, 0
+            try:
+                while True:
+                    enviados, fallidos = enviar_pendientes(lote=options['lote'])
+                    total_enviados += enviados
+                    total_fallidos += fallidos
+                    if enviados + fallidos < options['lote']:
+                        break
+            except Exception:
+                if not options['continuo']:
+                    raise
+                # Un ciclo con error (p. ej. la base no responde) no detiene el envío continuo
+                logger.exception('Error enviando la cola de emails')
+                time.sleep(options['intervalo'])
+                continue
+
+            if total_enviados or total_fallidos or not options['continuo']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ {total_enviados} emails enviados, {total_fallidos} con error'
+                ))
+            if not options['continuo']:
+                return
+            time.sleep(options['intervalo'])
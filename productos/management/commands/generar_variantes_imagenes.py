@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from productos.imagenes import generar_variantes
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera (o regenera) las variantes WebP/JPEG de las imágenes de producto'
+
+    def handle(self, *args, **options):
+        generadas, fallidas = 0, 0
+        nombres = Producto.objects.exclude(imagen='').values_list('imagen', flat=True).distinct()
+        for nombre in nombres.iterator():
+            if generar_variantes(nombre):
+                generadas += 1
+            else:
+                fallidas += 1
+                self.stdout.write(self.style.WARNING(f'⚠️ No se pudo procesar {nombre}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Variantes generadas para {generadas} imágenes ({fallidas} con error)'
+        ))
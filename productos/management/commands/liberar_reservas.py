@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from productos.reservas import liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes las reservas de stock vencidas. Las vencidas ya no '
+        'cuentan como reservadas: esto solo mantiene chica la tabla'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas borradas por DELETE')
+
+    def handle(self, *args, **options):
+        borradas = liberar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {borradas} reservas vencidas liberadas'))
@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+
+
+def _trabajar(hilos, intervalo, hasta_vaciar):
+    """Un proceso trabajador (también el del propio comando con --procesos 1)"""
+    import django
+
+    django.setup()  # en procesos nuevos (spawn); si ya estaba configurado no hace nada
+
+    from django.utils.module_loading import autodiscover_modules
+    from productos.tareas import Trabajador
+
+    autodiscover_modules('tareas')
+    trabajador = Trabajador(hilos=hilos, intervalo=intervalo)
+
+    def detener(*_):
+        trabajador.detener.set()
+
+    signal.signal(signal.SIGTERM, detener)
+    signal.signal(signal.SIGINT, detener)
+    trabajador.correr(hasta_vaciar=hasta_vaciar)
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las tareas en segundo plano de la cola (productos/tareas.py) con '
+        'un pool de hilos por proceso. Ctrl+C o SIGTERM terminan las que están en '
+        'curso y salen'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos trabajadores')
+        parser.add_argument('--hilos', type=int, default=None, help='Hilos por proceso (TAREAS_HILOS)')
+        parser.add_argument(
+            '--intervalo', type=float, default=None,
+            help='Segundos entre revisiones de la cola cuando está vacía (TAREAS_INTERVALO)'
+        )
+        parser.add_argument(
+            '--hasta-vaciar', action='store_true',
+            help='Terminar cuando no queden tareas listas (p. ej. desde cron)'
+        )
+
+    def handle(self, *args, **options):
+        argumentos = (options['hilos'], options['intervalo'], options['hasta_vaciar'])
+        if options['procesos'] <= 1:
+            self.stdout.write('🧰 Procesando tareas...')
+            _trabajar(*argumentos)
+            return
+
+        from django.db import connections
+
+        connections.close_all()  # los hijos abren sus propias conexiones
+        procesos = [
+            multiprocessing.Process(target=_trabajar, args=argumentos, name=f'tareas-{n}')
+            for n in range(options['procesos'])
+        ]
+        for proceso in procesos:
+            proceso.start()
+        self.stdout.write(f'🧰 Procesando tareas con {len(procesos)} procesos...')
+
+        def detener(*_):
+            for proceso in procesos:
+                if proceso.is_alive():
+                    proceso.terminate()  # SIGTERM: cada hijo termina lo que tiene en curso
+
+        signal.signal(signal.SIGTERM, detener)
+        signal.signal(signal.SIGINT, detener)
+        for proceso in procesos:
+            proceso.join()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from productos.models import Pedido
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula total y comisión de los pedidos sumando sus items. Solo para '
+        'reparar: los cambios de items ya actualizan el total con su diferencia'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pedidos', nargs='*', type=int, help='Ids de pedido (por defecto, todos)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra cuántos pedidos están descuadrados')
+
+    def handle(self, *args, **options):
+        pedidos = Pedido.objects.all()
+        if options['pedidos']:
+            pedidos = pedidos.filter(pk__in=options['pedidos'])
+
+        with transaction.atomic():
+            antes = dict(pedidos.values_list('pk', 'total'))
+            actualizados = pedidos.recalcular_totales()
+            descuadrados = sum(
+                1 for pk, total in pedidos.values_list('pk', 'total') if antes.get(pk) != total
+            )
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        accion = 'descuadrados (sin cambios, --dry-run)' if options['dry_run'] else 'corregidos'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {actualizados} pedidos revisados, {descuadrados} {accion}'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from productos.busqueda import get_backend
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos desde cero'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Índice reconstruido ({backend.__class__.__name__}): '
+            f'{Producto.objects.count()} productos'
+        ))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_add_comision_total_field'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'fecha_creacion', 'id'], name='producto_cat_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'precio', 'id'], name='producto_cat_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'nombre', 'id'], name='producto_cat_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+import unicodedata
+
+from django.db import migrations
+
+
+def _normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def crear_indice(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    vendor = schema_editor.connection.vendor
+    filas = [
+        (pk, _normalizar(nombre), _normalizar(descripcion), activo)
+        for pk, nombre, descripcion, activo
+        in Producto.objects.values_list('pk', 'nombre', 'descripcion', 'activo')
+    ]
+
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS productos_busqueda_fts USING fts5("
+                "nombre, descripcion, activo UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.executemany(
+                'INSERT INTO productos_busqueda_fts (rowid, nombre, descripcion, activo) '
+                'VALUES (%s, %s, %s, %s)',
+                [(pk, n, d, int(a)) for pk, n, d, a in filas]
+            )
+        elif vendor == 'postgresql':
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS productos_busqueda ('
+                'producto_id bigint PRIMARY KEY REFERENCES productos_producto (id) ON DELETE CASCADE, '
+                'documento tsvector NOT NULL, '
+                'activo boolean NOT NULL DEFAULT true)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS productos_busqueda_documento_gin '
+                'ON productos_busqueda USING GIN (documento)'
+            )
+            cursor.executemany(
+                'INSERT INTO productos_busqueda (producto_id, documento, activo) VALUES '
+                "(%s, setweight(to_tsvector('spanish', %s), 'A') || "
+                "setweight(to_tsvector('spanish', %s), 'B'), %s)",
+                filas
+            )
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute('DROP TABLE IF EXISTS productos_busqueda_fts')
+        elif vendor == 'postgresql':
+            cursor.execute('DROP TABLE IF EXISTS productos_busqueda')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_producto_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='comprobante_preview',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='comprobantes/previews/', verbose_name='Vista previa del comprobante'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_pedido_comprobante_preview'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickAfiliado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha')),
+                ('visitante', models.CharField(help_text='Hash de IP y navegador: distingue visitantes sin guardar sus datos', max_length=32, verbose_name='Visitante')),
+                ('afiliado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clicks_afiliado', to=settings.AUTH_USER_MODEL, verbose_name='Afiliado')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clicks_afiliado', to='productos.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Click de Afiliado',
+                'verbose_name_plural': 'Clicks de Afiliado',
+                'indexes': [models.Index(fields=['afiliado', 'producto', 'fecha'], name='click_afiliado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0008_click_afiliado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SketchVisitantes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Día')),
+                ('sketch', models.BinaryField(verbose_name='Sketch HyperLogLog')),
+                ('afiliado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sketches_visitantes', to=settings.AUTH_USER_MODEL, verbose_name='Afiliado')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sketches_visitantes', to='productos.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Sketch de Visitantes',
+                'verbose_name_plural': 'Sketches de Visitantes',
+                'unique_together': {('afiliado', 'producto', 'dia')},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:47
+
+import secrets
+import string
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def crear_links_existentes(apps, schema_editor):
+    """Un link corto por cada afiliación que ya existía"""
+    Producto = apps.get_model('productos', 'Producto')
+    LinkCorto = apps.get_model('productos', 'LinkCorto')
+    campo = Producto._meta.get_field('afiliados')
+    columna_usuario = campo.m2m_reverse_field_name() + '_id'
+    alfabeto = string.digits + string.ascii_letters
+    usados = set()
+    links = []
+    for afiliacion in Producto.afiliados.through.objects.all().iterator():
+        codigo = ''.join(secrets.choice(alfabeto) for _ in range(7))
+        while codigo in usados:
+            codigo = ''.join(secrets.choice(alfabeto) for _ in range(7))
+        usados.add(codigo)
+        links.append(LinkCorto(
+            codigo=codigo, producto_id=afiliacion.producto_id, afiliado_id=getattr(afiliacion, columna_usuario),
+        ))
+    LinkCorto.objects.bulk_create(links, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_sketch_visitantes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkCorto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=12, unique=True, verbose_name='Código')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('afiliado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links_cortos', to=settings.AUTH_USER_MODEL, verbose_name='Afiliado')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links_cortos', to='productos.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Link Corto',
+                'verbose_name_plural': 'Links Cortos',
+                'unique_together': {('afiliado', 'producto')},
+            },
+        ),
+        migrations.RunPython(crear_links_existentes, migrations.RunPython.noop),
+    ]
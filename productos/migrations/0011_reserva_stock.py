@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_link_corto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('vence', models.DateTimeField(verbose_name='Vence')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_stock', to='productos.producto', verbose_name='Producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_stock', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+                'indexes': [models.Index(fields=['producto', 'vence'], name='reserva_producto_vence_idx'), models.Index(fields=['vence'], name='reserva_vence_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:58
+
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def importar_numeros_existentes(apps, schema_editor):
+    """Arranca el contador de cada día en el número más alto ya usado ese día"""
+    Pedido = apps.get_model('productos', 'Pedido')
+    SecuenciaPedido = apps.get_model('productos', 'SecuenciaPedido')
+    ultimos = {}
+    numeros = Pedido.objects.exclude(numero_pedido='').values_list('numero_pedido', flat=True)
+    for numero in numeros.iterator():
+        try:
+            dia = datetime.strptime(numero[:8], '%Y%m%d').date()
+            ultimo = int(numero[8:])
+        except ValueError:
+            continue  # números cargados a mano con otro formato
+        ultimos[dia] = max(ultimos.get(dia, 0), ultimo)
+    SecuenciaPedido.objects.bulk_create(
+        [SecuenciaPedido(dia=dia, ultimo=ultimo) for dia, ultimo in ultimos.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_reserva_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaPedido',
+            fields=[
+                ('dia', models.DateField(primary_key=True, serialize=False, verbose_name='Día')),
+                ('ultimo', models.PositiveBigIntegerField(default=0, verbose_name='Último número')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Pedidos',
+                'verbose_name_plural': 'Secuencias de Pedidos',
+            },
+        ),
+        migrations.RunPython(importar_numeros_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_secuencia_pedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remitente', models.CharField(max_length=254, verbose_name='Remitente')),
+                ('destinatarios', models.TextField(help_text='Separados por coma', verbose_name='Destinatarios')),
+                ('asunto', models.CharField(max_length=255, verbose_name='Asunto')),
+                ('cuerpo', models.TextField(verbose_name='Cuerpo')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('proximo_intento', models.DateTimeField(blank=True, null=True, verbose_name='Próximo intento')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('enviado', models.DateTimeField(blank=True, null=True, verbose_name='Enviado')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='correos', to='productos.pedido', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Correo Pendiente',
+                'verbose_name_plural': 'Correos Pendientes',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(condition=models.Q(('enviado__isnull', True)), fields=['proximo_intento'], name='correo_pendiente_idx')],
+            },
+        ),
+    ]
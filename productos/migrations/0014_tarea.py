@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_correo_pendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=200, verbose_name='Nombre')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('prioridad', models.SmallIntegerField(default=0, help_text='Mayor = antes', verbose_name='Prioridad')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('HECHA', 'Hecha'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=10, verbose_name='Estado')),
+                ('ejecutar_desde', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ejecutar desde')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3, verbose_name='Máximo de intentos')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('trabajador', models.CharField(blank=True, max_length=100, verbose_name='Trabajador')),
+                ('reservada_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Reservada hasta')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Terminada')),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(models.OrderBy(models.F('prioridad'), descending=True), models.F('ejecutar_desde'), condition=models.Q(('estado', 'PENDIENTE')), name='tarea_pendiente_idx'), models.Index(condition=models.Q(('estado', 'EN_CURSO')), fields=['reservada_hasta'], name='tarea_en_curso_idx')],
+            },
+        ),
+    ]
@@ -2,10 +2,32 @@ from django.db import models
 from django.conf import settings
 from django.utils.text import slugify
 from django.utils import timezone
+from django.urls import reverse
+from django.db import transaction
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 
+from .campos_modificados import CamposModificadosMixin
 
-class Producto(models.Model):
+
+class ProductoQuerySet(models.QuerySet):
+    def con_afiliacion(self, usuario):
+        """
+        Anota `es_afiliado` (si el usuario está afiliado a cada producto)
+        con un EXISTS correlacionado, en la misma consulta del listado.
+        """
+        if usuario is None or not usuario.is_authenticated:
+            return self.annotate(es_afiliado=models.Value(False, output_field=models.BooleanField()))
+
+        relacion = self.model.afiliados.field
+        afiliaciones = self.model.afiliados.through.objects.filter(**{
+            relacion.m2m_field_name(): models.OuterRef('pk'),
+            f'{relacion.m2m_reverse_field_name()}_id': usuario.pk,
+        })
+        return self.annotate(es_afiliado=models.Exists(afiliaciones))
+
+
+class Producto(CamposModificadosMixin, models.Model):
     TIPO_PRODUCTO_CHOICES = (
         ('FISICO', 'Físico'),
         ('DIGITAL', 'Digital'),
@@ -55,9 +77,17 @@ class Producto(models.Model):
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
     activo = models.BooleanField(default=True, verbose_name="Producto Activo")
 
+    objects = ProductoQuerySet.as_manager()
+
     def __str__(self):
         return self.nombre
 
+    def tiene_afiliado(self, usuario):
+        """Verifica la afiliación con un EXISTS en vez de cargar todos los afiliados"""
+        if usuario is None or not usuario.is_authenticated:
+            return False
+        return self.afiliados.filter(pk=usuario.pk).exists()
+
     def tiene_stock(self, cantidad=1):
         """Verifica si hay stock suficiente"""
         if self.tipo_producto == 'DIGITAL':
@@ -65,24 +95,73 @@ class Producto(models.Model):
         return self.stock >= cantidad
 
     def reducir_stock(self, cantidad):
-        """Reduce el stock después de una venta"""
-        if self.tipo_producto == 'FISICO' and self.stock >= cantidad:
-            self.stock -= cantidad
-            self.save()
-            return True
-        return False
+        """Reduce el stock después de una venta con un UPDATE condicional (ver inventario.py)"""
+        from .inventario import StockInsuficiente, descontar
+
+        if self.tipo_producto != 'FISICO':
+            return False
+        try:
+            descontar({self.pk: cantidad})
+        except StockInsuficiente:
+            return False
+        self.refresh_from_db(fields=['stock', 'fecha_actualizacion'])
+        self._recordar_estado(['stock', 'fecha_actualizacion'])
+        return True
 
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Índices para la paginación por cursor del catálogo (ver catalogo.py)
+            models.Index(fields=['activo', 'fecha_creacion', 'id'], name='producto_cat_fecha_idx'),
+            models.Index(fields=['activo', 'precio', 'id'], name='producto_cat_precio_idx'),
+            models.Index(fields=['activo', 'nombre', 'id'], name='producto_cat_nombre_idx'),
+        ]
 
 
 # ============================================================================
 # 🛒 MODELOS PARA SISTEMA DE CARRITO Y PEDIDOS CON STOCK
 # ============================================================================
 
-class Pedido(models.Model):
+def _comision_sobre(monto):
+    """Expresión SQL de la comisión del pedido sobre `monto` (0 si no hay afiliado)"""
+    return models.Case(
+        models.When(afiliado_referido__isnull=True, then=models.Value(Decimal('0'))),
+        # * 0.01 y no / 100: SQLite guarda los decimales enteros como INTEGER
+        # y dividiría entre enteros
+        default=monto * models.F('porcentaje_comision') * models.Value(Decimal('0.01')),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class PedidoQuerySet(models.QuerySet):
+    def sumar_al_total(self, delta):
+        """UPDATE total = total + delta (y la comisión proporcional), sin leer los items"""
+        return self.update(
+            total=models.F('total') + delta,
+            comision_total_field=models.F('comision_total_field') + _comision_sobre(models.Value(delta)),
+        )
+
+    def recalcular_totales(self):
+        """
+        Reparación: recalcula total y comisión de todos los pedidos del
+        queryset sumando sus items, con dos UPDATE (sin recorrerlos en Python).
+        """
+        subtotales = (
+            ItemPedido.objects.filter(pedido=models.OuterRef('pk'))
+            .order_by().values('pedido')
+            .annotate(suma=models.Sum('subtotal')).values('suma')
+        )
+        actualizados = self.update(total=Coalesce(
+            models.Subquery(subtotales), models.Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ))
+        self.update(comision_total_field=_comision_sobre(models.F('total')))
+        return actualizados
+
+
+class Pedido(CamposModificadosMixin, models.Model):
     """
     Modelo para pedidos que puede contener múltiples productos (carrito)
     """
@@ -146,6 +225,13 @@ class Pedido(models.Model):
         verbose_name='Comprobante de Pago',
         help_text='Imagen del comprobante de transferencia'
     )
+    comprobante_preview = models.ImageField(
+        upload_to='comprobantes/previews/',
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Vista previa del comprobante'
+    )
 
     # Sistema de referidos - SIMPLIFICADO
     afiliado_referido = models.ForeignKey(
@@ -185,6 +271,8 @@ class Pedido(models.Model):
     # Notas
     notas = models.TextField(blank=True, verbose_name='Notas del cliente')
 
+    objects = PedidoQuerySet.as_manager()
+
     # ✅ PROPERTY para mantener compatibilidad con el código existente
     @property
     def comision_total(self):
@@ -230,164 +318,43 @@ class Pedido(models.Model):
     def save(self, *args, **kwargs):
         # Generar número de pedido solo cuando se confirma (no para carrito)
         if not self.numero_pedido and self.estado != 'PENDIENTE':
-            fecha = timezone.now()
-            prefijo = fecha.strftime('%Y%m%d')
-            ultimo_pedido = Pedido.objects.filter(
-                numero_pedido__startswith=prefijo,
-                numero_pedido__isnull=False  # Agregado: excluir nulos
-            ).exclude(numero_pedido='').order_by('-numero_pedido').first()
-
-            if ultimo_pedido:
-                try:
-                    ultimo_numero = int(ultimo_pedido.numero_pedido[-3:])
-                    nuevo_numero = ultimo_numero + 1
-                except:
-                    nuevo_numero = 1
-            else:
-                nuevo_numero = 1
-
-            self.numero_pedido = f"{prefijo}{nuevo_numero:03d}"
+            from .secuencias import numero_pedido
 
+            self.numero_pedido = numero_pedido()
+
+        # El total lo mantienen los items; aquí solo hace falta recalcular la
+        # comisión si cambió el afiliado o el porcentaje
+        recalcular_comision = not self._state.adding and bool(
+            {'afiliado_referido', 'porcentaje_comision'} & self.campos_modificados()
+        )
         super().save(*args, **kwargs)
 
-        # CAMBIO CRÍTICO: Solo actualizar total si ya existe en BD
-        if self.pk:
-            self.actualizar_total()
-
-    def actualizar_total(self):
-        """Recalcula el total del pedido y la comisión"""
-        total = sum(item.subtotal for item in self.items.all())
-
-        # Calcular comisión si hay afiliado
-        if self.afiliado_referido:
-            porcentaje = Decimal(str(self.porcentaje_comision))
-            comision = (total * porcentaje) / Decimal('100')
-        else:
-            comision = Decimal('0')
-
-        if self.total != total or self.comision_total_field != comision:
-            self.total = total
-            # ✅ CAMBIO CRÍTICO: Usar el campo normal, no la property
-            self.comision_total_field = comision
-            Pedido.objects.filter(pk=self.pk).update(
-                total=total,
-                comision_total_field=comision  # ✅ Usar el campo correcto
-            )
-
-            # productos/models.py - AGREGAR ESTOS CAMPOS AL MODELO PRODUCTO
-
-            # ================ CAMPOS PARA COMISIONES (AGREGAR AL MODELO PRODUCTO) ================
-
-            # Sistema de comisiones por producto
-            comision_afiliado = models.DecimalField(
-                max_digits=5,
-                decimal_places=2,
-                default=15.00,  # 15% por defecto
-                verbose_name="Comisión para Afiliados (%)",
-                help_text="Porcentaje de comisión que recibirán los afiliados por vender este producto"
-            )
-
-            comision_minima = models.DecimalField(
-                max_digits=5,
-                decimal_places=2,
-                default=5.00,
-                verbose_name="Comisión Mínima (%)"
-            )
-
-            comision_maxima = models.DecimalField(
-                max_digits=5,
-                decimal_places=2,
-                default=50.00,
-                verbose_name="Comisión Máxima (%)"
-            )
-
-            # Control de comisiones
-            permite_modificar_comision = models.BooleanField(
-                default=True,
-                verbose_name="Permite Modificar Comisión",
-                help_text="Permite que los administradores modifiquen la comisión de este producto"
-            )
-
-            comision_especial_activa = models.BooleanField(
-                default=False,
-                verbose_name="Comisión Especial Activa",
-                help_text="Indica si hay una comisión especial temporal para este producto"
-            )
-
-            fecha_inicio_comision_especial = models.DateTimeField(
-                null=True,
-                blank=True,
-                verbose_name="Inicio Comisión Especial"
-            )
-
-            fecha_fin_comision_especial = models.DateTimeField(
-                null=True,
-                blank=True,
-                verbose_name="Fin Comisión Especial"
-            )
-
-            comision_especial = models.DecimalField(
-                max_digits=5,
-                decimal_places=2,
-                default=0.00,
-                verbose_name="Comisión Especial (%)",
-                help_text="Comisión temporal especial para promociones"
-            )
-
-            # MÉTODOS ADICIONALES PARA AGREGAR AL MODELO PRODUCTO
-            def get_comision_actual(self):
-                """
-                Retorna la comisión actual del producto, considerando promociones especiales
-                """
-                from django.utils import timezone
-
-                # Verificar si hay comisión especial activa
-                if (self.comision_especial_activa and
-                        self.fecha_inicio_comision_especial and
-                        self.fecha_fin_comision_especial and
-                        self.fecha_inicio_comision_especial <= timezone.now() <= self.fecha_fin_comision_especial):
-                    return self.comision_especial
-
-                return self.comision_afiliado
-
-            def calcular_comision_monto(self, precio_venta=None):
-                """
-                Calcula el monto de comisión en guaraníes para un precio de venta
-                """
-                precio = precio_venta or self.precio
-                comision_porcentaje = self.get_comision_actual()
-                return (precio * comision_porcentaje) / 100
-
-            def is_comision_especial_vigente(self):
-                """
-                Verifica si la comisión especial está vigente
-                """
-                from django.utils import timezone
-
-                if not self.comision_especial_activa:
-                    return False
-
-                if not self.fecha_inicio_comision_especial or not self.fecha_fin_comision_especial:
-                    return False
-
-                now = timezone.now()
-                return self.fecha_inicio_comision_especial <= now <= self.fecha_fin_comision_especial
-
-            def get_comision_display(self):
-                """
-                Retorna el display formateado de la comisión
-                """
-                if self.is_comision_especial_vigente():
-                    return f"{self.comision_especial}% (ESPECIAL)"
-                return f"{self.comision_afiliado}%"
-
-            class Meta:
-                verbose_name = "Producto"
-                verbose_name_plural = "Productos"
-                ordering = ['-fecha_creacion']
-
-
-class ItemPedido(models.Model):
+        if recalcular_comision:
+            Pedido.objects.filter(pk=self.pk).update(comision_total_field=_comision_sobre(models.F('total')))
+            self.comision_total_field = Pedido.objects.filter(pk=self.pk).values_list(
+                'comision_total_field', flat=True
+            ).get()
+            self._recordar_estado(['comision_total_field'])
+
+    def campos_a_guardar(self, modificados):
+        # La señal pre_save reemplaza el comprobante nuevo y genera su vista previa
+        if 'comprobante_pago' in modificados:
+            modificados = modificados | {'comprobante_preview'}
+        return modificados
+
+    def aplicar_delta(self, delta):
+        """Suma `delta` al total (y su parte a la comisión) sin leer los items"""
+        if not delta:
+            return
+        Pedido.objects.filter(pk=self.pk).sumar_al_total(delta)
+        self.total += delta
+        if self.afiliado_referido_id:
+            self.comision_total_field += delta * Decimal(str(self.porcentaje_comision)) / Decimal('100')
+        # Ya están en la base: un save() posterior no debe volver a escribirlos
+        self._recordar_estado(['total', 'comision_total_field'])
+
+
+class ItemPedido(CamposModificadosMixin, models.Model):
     """
     Cada producto dentro de un pedido
     """
@@ -427,15 +394,35 @@ class ItemPedido(models.Model):
         verbose_name_plural = 'Items de Pedido'
         unique_together = ('pedido', 'producto')
 
+    def _sumar_al_pedido(self, delta):
+        # Con el pedido ya cargado se actualiza también en memoria
+        if ItemPedido.pedido.is_cached(self):
+            self.pedido.aplicar_delta(delta)
+        elif delta:
+            Pedido.objects.filter(pk=self.pedido_id).sumar_al_total(delta)
+
     def save(self, *args, **kwargs):
+        """Guarda el item y suma al pedido solo la diferencia del subtotal"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'subtotal' not in update_fields:
+            # El subtotal guardado no cambia: tampoco el total del pedido
+            super().save(*args, **kwargs)
+            return
+
         self.subtotal = self.precio_unitario * self.cantidad
-        super().save(*args, **kwargs)
-        self.pedido.actualizar_total()
+        anterior = Decimal('0') if self._state.adding else (self.valor_guardado('subtotal') or Decimal('0'))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._sumar_al_pedido(self.subtotal - anterior)
 
     def delete(self, *args, **kwargs):
-        pedido = self.pedido
-        super().delete(*args, **kwargs)
-        pedido.actualizar_total()
+        anterior = self.valor_guardado('subtotal')
+        if anterior is None:
+            anterior = self.subtotal
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            self._sumar_al_pedido(-anterior)
+        return resultado
 
     def __str__(self):
         return f"{self.cantidad}x {self.producto.nombre}"
@@ -482,4 +469,289 @@ class ConfiguracionPagos(models.Model):
         verbose_name_plural = 'Configuración de Pagos'
 
     def __str__(self):
-        return 'Configuración de Pagos'
\ No newline at end of file
+        return 'Configuración de Pagos'
+
+# ============================================================================
+# 📈 SEGUIMIENTO DE LINKS DE AFILIADO
+# ============================================================================
+
+class ClickAfiliado(models.Model):
+    """
+    Un click en un link de afiliado (visita a un producto con ?ref=).
+    Solo se insertan filas, en lotes, desde el buffer de clics.py.
+    """
+    afiliado = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='clicks_afiliado',
+        verbose_name='Afiliado'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='clicks_afiliado',
+        verbose_name='Producto'
+    )
+    fecha = models.DateTimeField(verbose_name='Fecha')
+    visitante = models.CharField(
+        max_length=32,
+        verbose_name='Visitante',
+        help_text='Hash de IP y navegador: distingue visitantes sin guardar sus datos'
+    )
+
+    class Meta:
+        verbose_name = 'Click de Afiliado'
+        verbose_name_plural = 'Clicks de Afiliado'
+        indexes = [
+            models.Index(fields=['afiliado', 'producto', 'fecha'], name='click_afiliado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Click de {self.afiliado_id} en {self.producto_id} ({self.fecha:%d/%m/%Y %H:%M})"
+
+
+class SketchVisitantes(models.Model):
+    """
+    Visitantes únicos aproximados de un link de afiliado en un día: un
+    sketch HyperLogLog serializado (ver hll.py y visitantes.py).
+    """
+    afiliado = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sketches_visitantes',
+        verbose_name='Afiliado'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='sketches_visitantes',
+        verbose_name='Producto'
+    )
+    dia = models.DateField(verbose_name='Día')
+    sketch = models.BinaryField(verbose_name='Sketch HyperLogLog')
+
+    class Meta:
+        verbose_name = 'Sketch de Visitantes'
+        verbose_name_plural = 'Sketches de Visitantes'
+        unique_together = ('afiliado', 'producto', 'dia')
+
+    def __str__(self):
+        return f"Visitantes de {self.afiliado_id} en {self.producto_id} ({self.dia:%d/%m/%Y})"
+
+
+class LinkCorto(models.Model):
+    """
+    Link corto de un afiliado para un producto (/r/<codigo>/). Se crea al
+    afiliarse y redirige al detalle del producto con ?ref= (ver links.py).
+    """
+    codigo = models.CharField(max_length=12, unique=True, verbose_name='Código')
+    afiliado = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='links_cortos',
+        verbose_name='Afiliado'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='links_cortos',
+        verbose_name='Producto'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+
+    class Meta:
+        verbose_name = 'Link Corto'
+        verbose_name_plural = 'Links Cortos'
+        unique_together = ('afiliado', 'producto')
+
+    def __str__(self):
+        return self.codigo
+
+    def get_absolute_url(self):
+        return reverse('link_corto', kwargs={'codigo': self.codigo})
+
+
+# ============================================================================
+# ⏳ RESERVAS DE STOCK
+# ============================================================================
+
+class ReservaStockQuerySet(models.QuerySet):
+    def activas(self):
+        return self.filter(vence__gt=timezone.now())
+
+    def reservado(self, excluir_usuario=None):
+        """
+        Subconsulta con las unidades reservadas (y vigentes) del producto de
+        la consulta exterior, sin contar las de `excluir_usuario`. Usa el
+        índice (producto, vence).
+        """
+        reservas = self.activas().filter(producto=models.OuterRef('pk'))
+        if excluir_usuario is not None:
+            reservas = reservas.exclude(usuario=excluir_usuario)
+        return Coalesce(
+            models.Subquery(
+                reservas.order_by().values('producto')
+                .annotate(suma=models.Sum('cantidad')).values('suma')
+            ),
+            models.Value(0),
+            output_field=models.IntegerField(),
+        )
+
+
+class ReservaStock(models.Model):
+    """
+    Unidades de un producto apartadas para un usuario mientras completa el
+    checkout. Vencen solas: las vencidas no cuentan y el comando
+    liberar_reservas las borra (ver reservas.py).
+    """
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='reservas_stock',
+        verbose_name='Usuario'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='reservas_stock',
+        verbose_name='Producto'
+    )
+    cantidad = models.PositiveIntegerField(verbose_name='Cantidad')
+    vence = models.DateTimeField(verbose_name='Vence')
+
+    objects = ReservaStockQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        indexes = [
+            # Reservado por producto (solo las vigentes) y barrido de vencidas
+            models.Index(fields=['producto', 'vence'], name='reserva_producto_vence_idx'),
+            models.Index(fields=['vence'], name='reserva_vence_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} para {self.usuario_id} (vence {self.vence:%H:%M})"
+
+
+# ============================================================================
+# 🔢 NUMERACIÓN DE PEDIDOS
+# ============================================================================
+
+class SecuenciaPedido(models.Model):
+    """
+    Último número de pedido entregado en un día (ver secuencias.py).
+    Una fila por día, que solo se actualiza con UPDATE ultimo = ultimo + n.
+    """
+    dia = models.DateField(primary_key=True, verbose_name='Día')
+    ultimo = models.PositiveBigIntegerField(default=0, verbose_name='Último número')
+
+    class Meta:
+        verbose_name = 'Secuencia de Pedidos'
+        verbose_name_plural = 'Secuencias de Pedidos'
+
+    def __str__(self):
+        return f"{self.dia:%Y%m%d}: {self.ultimo}"
+
+
+# ============================================================================
+# ✉️ CORREOS PENDIENTES
+# ============================================================================
+
+class CorreoPendiente(models.Model):
+    """
+    Email en la cola de salida. Se crea en la misma transacción que lo
+    origina (p. ej. el pedido) y lo envía el comando enviar_correos (ver
+    correos.py). proximo_intento vacío y sin enviar = se abandonó.
+    """
+    pedido = models.ForeignKey(
+        Pedido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='correos',
+        verbose_name='Pedido'
+    )
+    remitente = models.CharField(max_length=254, verbose_name='Remitente')
+    destinatarios = models.TextField(verbose_name='Destinatarios', help_text='Separados por coma')
+    asunto = models.CharField(max_length=255, verbose_name='Asunto')
+    cuerpo = models.TextField(verbose_name='Cuerpo')
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    proximo_intento = models.DateTimeField(null=True, blank=True, verbose_name='Próximo intento')
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    ultimo_error = models.TextField(blank=True, verbose_name='Último error')
+    enviado = models.DateTimeField(null=True, blank=True, verbose_name='Enviado')
+
+    class Meta:
+        verbose_name = 'Correo Pendiente'
+        verbose_name_plural = 'Correos Pendientes'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # Solo los que faltan enviar, en el orden en que se toman
+            models.Index(
+                fields=['proximo_intento'],
+                condition=models.Q(enviado__isnull=True),
+                name='correo_pendiente_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} → {self.destinatarios}"
+
+    def lista_destinatarios(self):
+        return [email.strip() for email in self.destinatarios.split(',') if email.strip()]
+
+
+# ============================================================================
+# 🧰 TAREAS EN SEGUNDO PLANO
+# ============================================================================
+
+class Tarea(models.Model):
+    """
+    Trabajo para hacer fuera de la request (ver tareas.py). Lo ejecuta el
+    comando procesar_tareas.
+    """
+    ESTADO_CHOICES = (
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_CURSO', 'En curso'),
+        ('HECHA', 'Hecha'),
+        ('FALLIDA', 'Fallida'),
+    )
+
+    nombre = models.CharField(max_length=200, verbose_name='Nombre')
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name='Argumentos')
+    prioridad = models.SmallIntegerField(default=0, verbose_name='Prioridad', help_text='Mayor = antes')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='PENDIENTE', verbose_name='Estado')
+
+    ejecutar_desde = models.DateTimeField(default=timezone.now, verbose_name='Ejecutar desde')
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    max_intentos = models.PositiveSmallIntegerField(default=3, verbose_name='Máximo de intentos')
+    ultimo_error = models.TextField(blank=True, verbose_name='Último error')
+
+    trabajador = models.CharField(max_length=100, blank=True, verbose_name='Trabajador')
+    reservada_hasta = models.DateTimeField(null=True, blank=True, verbose_name='Reservada hasta')
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name='Terminada')
+
+    class Meta:
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # La cola: solo las pendientes, en el orden en que se toman
+            models.Index(
+                models.F('prioridad').desc(), 'ejecutar_desde',
+                condition=models.Q(estado='PENDIENTE'),
+                name='tarea_pendiente_idx',
+            ),
+            # Tareas de trabajadores caídos (reserva vencida)
+            models.Index(
+                fields=['reservada_hasta'],
+                condition=models.Q(estado='EN_CURSO'),
+                name='tarea_en_curso_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.get_estado_display()})"
@@ -0,0 +1,115 @@
+"""
+Códigos QR de los links de afiliado (para flyers, estados de WhatsApp...).
+
+Cada QR se genera una sola vez y se guarda en media/qr/ con el nombre
+sacado del hash de su contenido y formato: el mismo link siempre da el
+mismo archivo y un link distinto nunca lo pisa. Como el contenido está en
+el nombre, las URLs de descarga llevan ?v=<huella> y se sirven con
+Cache-Control immutable.
+
+Usa la librería qrcode (pip install qrcode); si no está instalada las
+vistas de QR responden 404 y la página de links no muestra los botones.
+
+descargar_zip() arma el .zip con todos los QR de un afiliado mientras lo
+envía, sin juntar el archivo entero en memoria.
+"""
+import hashlib
+import io
+import zipfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    import qrcode
+    import qrcode.image.svg
+except ImportError:  # dependencia opcional
+    qrcode = None
+
+
+DISPONIBLE = qrcode is not None
+
+FORMATOS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+CARPETA_QR = 'qr'
+
+
+def huella(contenido):
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _nombre(contenido, formato):
+    h = huella(contenido)
+    return f'{CARPETA_QR}/{h[:2]}/{h}.{formato}'
+
+
+def _generar(contenido, formato):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+    qr.add_data(contenido)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    if formato == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image().save(buffer)
+    return buffer.getvalue()
+
+
+def obtener_qr(contenido, formato):
+    """Nombre en el storage del QR de `contenido`, generándolo si todavía no existe"""
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato de QR desconocido: {formato}')
+    if not DISPONIBLE:
+        raise RuntimeError('La librería qrcode no está instalada')
+    nombre = _nombre(contenido, formato)
+    if not default_storage.exists(nombre):
+        guardado = default_storage.save(nombre, ContentFile(_generar(contenido, formato)))
+        if guardado != nombre:
+            # Otro proceso lo generó al mismo tiempo: el contenido es idéntico
+            default_storage.delete(guardado)
+    return nombre
+
+
+# ============================================================================
+# 📦 DESCARGA EN ZIP
+# ============================================================================
+
+class _Tubo:
+    """Archivo de solo escritura que acumula lo escrito hasta que se lo retira"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def descargar_zip(archivos, formato='png', tamano_bloque=64 * 1024):
+    """
+    Genera el .zip por partes. `archivos` es un iterable de (nombre dentro
+    del zip, contenido del QR). Los PNG ya vienen comprimidos, así que se
+    guardan sin volver a comprimir (ZIP_STORED).
+    """
+    tubo = _Tubo()
+    # Sin tell() en el tubo, zipfile escribe en modo "no buscable"
+    with zipfile.ZipFile(tubo, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for nombre_zip, contenido in archivos:
+            with default_storage.open(obtener_qr(contenido, formato), 'rb') as origen, \
+                    zf.open(f'{nombre_zip}.{formato}', 'w') as destino:
+                while bloque := origen.read(tamano_bloque):
+                    destino.write(bloque)
+                    yield tubo.retirar()
+            yield tubo.retirar()
+    yield tubo.retirar()
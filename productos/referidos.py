@@ -0,0 +1,100 @@
+"""
+Resolución de códigos de referido (?ref=) de los links de afiliado.
+
+El código es el username del afiliado o, en links viejos, su id. Antes cada
+visita hacía hasta dos User.objects.get() y cargaba todos los afiliados del
+producto para comprobar la afiliación; ahora:
+
+- el código se traduce a (id, username) una sola vez y queda en una caché
+  LRU (también los códigos inexistentes, para que un ref inventado no
+  consulte la base en cada visita),
+- la afiliación se comprueba con un EXISTS sobre la tabla intermedia
+  (índice único producto/usuario) y el resultado también se cachea.
+
+Las señales de usuario y de afiliaciones (ver signals.py) invalidan las
+entradas afectadas; REFERIDOS_TTL acota lo que tarda en verse un cambio
+hecho desde otro proceso.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .lru import CacheLRU
+from .models import Producto
+
+
+Referido = namedtuple('Referido', ['id', 'username'])
+
+_NO_EXISTE = Referido(None, None)
+
+_capacidad = getattr(settings, 'REFERIDOS_CAPACIDAD', 5000)
+_ttl = getattr(settings, 'REFERIDOS_TTL', 300)
+_codigos = CacheLRU(_capacidad, _ttl)        # ref -> Referido
+_afiliaciones = CacheLRU(_capacidad, _ttl)   # (producto_id, usuario_id) -> bool
+
+
+def resolver_codigo(ref_code):
+    """Referido(id, username) del código, o None si no corresponde a ningún usuario"""
+    ref_code = (ref_code or '').strip()[:150]
+    if not ref_code:
+        return None
+
+    referido = _codigos.get(ref_code)
+    if referido is None:
+        User = get_user_model()
+        fila = User.objects.filter(username=ref_code).values_list('id', 'username').first()
+        if fila is None and ref_code.isdigit():
+            fila = User.objects.filter(id=int(ref_code)).values_list('id', 'username').first()
+        referido = Referido(*fila) if fila else _NO_EXISTE
+        _codigos.set(ref_code, referido)
+
+    return None if referido is _NO_EXISTE else referido
+
+
+def esta_afiliado(producto_id, usuario_id):
+    """EXISTS sobre la tabla intermedia producto/afiliado, cacheado"""
+    clave = (producto_id, usuario_id)
+    afiliado = _afiliaciones.get(clave)
+    if afiliado is None:
+        through = Producto.afiliados.through
+        afiliado = through.objects.filter(**{
+            Producto.afiliados.field.m2m_field_name(): producto_id,
+            Producto.afiliados.field.m2m_reverse_field_name(): usuario_id,
+        }).exists()
+        _afiliaciones.set(clave, afiliado)
+    return afiliado
+
+
+def afiliado_referido(producto, ref_code):
+    """
+    El Referido que trae el link si está afiliado al producto, o None.
+    Es lo que detalle_producto y agregar_al_carrito usan para atribuir la venta.
+    """
+    referido = resolver_codigo(ref_code)
+    if referido is None or not esta_afiliado(producto.pk, referido.id):
+        return None
+    return referido
+
+
+# ============================================================================
+# 🧹 INVALIDACIÓN
+# ============================================================================
+
+def invalidar_usuario(usuario_id, username=None):
+    """Descarta los códigos que apuntan al usuario (o que ahora sí existen)"""
+    _codigos.delete_si(lambda codigo, referido: referido.id == usuario_id)
+    _codigos.delete(str(usuario_id))
+    if username:
+        _codigos.delete(username)
+    _afiliaciones.delete_si(lambda clave, _: clave[1] == usuario_id)
+
+
+def invalidar_afiliaciones(producto_ids=None, usuario_ids=None):
+    """Descarta afiliaciones cacheadas de esos productos y/o usuarios (todas si no se indica)"""
+    if producto_ids is None and usuario_ids is None:
+        _afiliaciones.clear()
+        return
+    producto_ids = set(producto_ids or ())
+    usuario_ids = set(usuario_ids or ())
+    _afiliaciones.delete_si(lambda clave, _: clave[0] in producto_ids or clave[1] in usuario_ids)
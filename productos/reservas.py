@@ -0,0 +1,86 @@
+"""
+Reservas de stock durante el checkout.
+
+Sin reservas, en una venta con mucha demanda varios carritos llegaban al
+final de confirmar_pedido (datos, comprobante...) por las mismas últimas
+unidades y la mayoría fallaba recién al descontar el stock. Ahora, al abrir
+el formulario de confirmación, reservar() aparta por RESERVAS_TTL segundos
+las unidades de cada producto físico del carrito: si no alcanzan, el usuario
+se entera en ese momento y vuelve al carrito.
+
+Lo disponible para reservar (y para descontar, ver inventario.py) es el
+stock menos las reservas vigentes de los demás usuarios, calculado con una
+subconsulta sobre el índice (producto, vence). Cada usuario tiene a lo
+sumo un juego de reservas: reservar otra vez reemplaza las anteriores y
+confirmar el pedido las libera.
+
+Las reservas vencidas dejan de contar solas; el comando liberar_reservas
+las borra por lotes (correrlo periódicamente, p. ej. con cron).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inventario import Faltante
+from .models import Producto, ReservaStock
+
+
+def _ttl():
+    return getattr(settings, 'RESERVAS_TTL', 60 * 10)
+
+
+def reservar(usuario, cantidades):
+    """
+    Reemplaza las reservas del usuario por {producto_id: cantidad}. Devuelve
+    la lista de Faltante de los productos que no alcanzan (vacía si reservó
+    todo); en ese caso no queda ninguna reserva.
+    """
+    with transaction.atomic():
+        # Es una escritura: en SQLite toma el bloqueo de escritura de la base
+        # antes de leer, así dos reservas no ven el mismo stock libre
+        liberar(usuario)
+        if not cantidades:
+            return []
+
+        filas = (
+            Producto.objects.select_for_update()
+            .filter(pk__in=cantidades, tipo_producto='FISICO')
+            .annotate(reservas=ReservaStock.objects.reservado(excluir_usuario=usuario))
+            .order_by('pk')
+            .values_list('pk', 'nombre', 'stock', 'reservas')
+        )
+        faltantes = [
+            Faltante(pk, nombre, cantidades[pk], max(stock - reservas, 0))
+            for pk, nombre, stock, reservas in filas
+            if stock - reservas < cantidades[pk]
+        ]
+        if faltantes:
+            return faltantes
+
+        vence = timezone.now() + timedelta(seconds=_ttl())
+        ReservaStock.objects.bulk_create([
+            ReservaStock(usuario=usuario, producto_id=pk, cantidad=cantidad, vence=vence)
+            for pk, cantidad in cantidades.items() if cantidad > 0
+        ])
+    return []
+
+
+def liberar(usuario):
+    """Borra las reservas del usuario (al confirmar el pedido o reservar de nuevo)"""
+    ReservaStock.objects.filter(usuario=usuario).delete()
+
+
+def liberar_vencidas(lote=1000):
+    """Borra las reservas vencidas de a `lote` filas; devuelve cuántas borró"""
+    borradas = 0
+    ahora = timezone.now()
+    while True:
+        ids = list(
+            ReservaStock.objects.filter(vence__lte=ahora)
+            .order_by('vence').values_list('pk', flat=True)[:lote]
+        )
+        if not ids:
+            return borradas
+        borradas += ReservaStock.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,103 @@
+"""
+Números de pedido: AAAAMMDD seguido del número del pedido en el día
+(con al menos 3 cifras: 20250101001, ..., 20250101999, 202501011000...).
+
+Antes Pedido.save() buscaba el último número del día con un
+startswith + order_by y le sumaba 1: una consulta por prefijo en cada
+confirmación y, con dos checkouts al mismo tiempo, el mismo número para los
+dos (el segundo fallaba por el unique). Ahora cada día tiene un contador
+en SecuenciaPedido que se incrementa con UPDATE ultimo = ultimo + n: la
+base serializa los incrementos, así que dos procesos nunca reciben el
+mismo número.
+
+El UPDATE bloquea la fila del día hasta el final de la transacción en la
+que corre: por eso el checkout toma el número antes de abrir la suya
+(Carrito.nuevo_pedido), en una transacción propia de una sola sentencia.
+Pedido.save() solo lo toma si el pedido llega sin número.
+
+Con PEDIDOS_BLOQUE_NUMEROS > 1 (10 por defecto) cada proceso toma un bloque
+de números de una vez y los va entregando desde memoria: la fila del
+contador se toca una vez cada tantos pedidos y los checkouts simultáneos
+casi nunca se esperan entre sí. A cambio los números dejan de ser
+correlativos entre procesos y un bloque a medio usar queda como hueco al
+reiniciar (con 1 son correlativos). El resto de un bloque solo se usa
+después de que la transacción que lo tomó se confirma: si se revierte, el
+contador vuelve atrás y esos números se descartan.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SecuenciaPedido
+
+
+_lock = threading.Lock()
+_pid = None
+_bloques = {}  # dia -> [siguiente, ultimo] ya confirmados en la base
+
+
+def _tamano_bloque():
+    return max(getattr(settings, 'PEDIDOS_BLOQUE_NUMEROS', 10), 1)
+
+
+def reservar_numeros(dia, cantidad=1):
+    """Incrementa el contador del día en `cantidad`; devuelve (primero, último) reservados"""
+    with transaction.atomic():
+        if not SecuenciaPedido.objects.filter(dia=dia).update(ultimo=F('ultimo') + cantidad):
+            try:
+                with transaction.atomic():
+                    SecuenciaPedido.objects.create(dia=dia, ultimo=cantidad)
+                return 1, cantidad
+            except IntegrityError:
+                # Otro proceso creó la fila del día al mismo tiempo
+                SecuenciaPedido.objects.filter(dia=dia).update(ultimo=F('ultimo') + cantidad)
+        # La fila queda bloqueada por el UPDATE hasta el final de la transacción
+        ultimo = SecuenciaPedido.objects.filter(dia=dia).values_list('ultimo', flat=True).get()
+    return ultimo - cantidad + 1, ultimo
+
+
+def _guardar_bloque(pid, dia, siguiente, ultimo):
+    with _lock:
+        if pid != os.getpid():
+            return
+        _bloques.clear()  # los de días anteriores ya no sirven
+        _bloques[dia] = [siguiente, ultimo]
+
+
+def _del_bloque(dia):
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            # Proceso hijo (fork): los bloques del padre no son suyos
+            _bloques.clear()
+            _pid = os.getpid()
+        bloque = _bloques.get(dia)
+        if bloque and bloque[0] <= bloque[1]:
+            numero = bloque[0]
+            bloque[0] += 1
+            return numero
+    return None
+
+
+def siguiente_numero(dia):
+    """Próximo número del día, tomando un bloque nuevo cuando se acaba el del proceso"""
+    numero = _del_bloque(dia)
+    if numero is not None:
+        return numero
+
+    tamano = _tamano_bloque()
+    primero, ultimo = reservar_numeros(dia, tamano)
+    if primero < ultimo:
+        pid = os.getpid()
+        # Fuera de una transacción on_commit lo ejecuta enseguida
+        transaction.on_commit(lambda: _guardar_bloque(pid, dia, primero + 1, ultimo))
+    return primero
+
+
+def numero_pedido():
+    fecha = timezone.now()
+    return f"{fecha:%Y%m%d}{siguiente_numero(fecha.date()):03d}"
@@ -0,0 +1,129 @@
+"""
+Señales de Producto: mantienen sincronizados los índices derivados
+(búsqueda de texto completo, autocompletado, cachés y variantes de
+imagen) con cada alta, cambio o baja.
+
+Señales de Pedido: comprimen el comprobante de pago recién subido.
+
+Señales de usuarios y afiliaciones: invalidan la caché de códigos de
+referido (ver referidos.py) y crean los links cortos (ver links.py).
+"""
+from functools import partial
+
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Producto, Pedido, LinkCorto
+from .busqueda import get_backend
+from .autocompletar import indice as indice_autocompletar
+from .fragmentos import invalidar_tarjetas
+from .catalogo import invalidar_totales
+from .facetas import invalidar_facetas
+from .imagenes import procesar_comprobante
+from . import links, referidos, tareas
+from .cache_paginas import invalidar_paginas
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, **kwargs):
+    """Actualiza el producto en el índice de búsqueda"""
+    if raw:  # loaddata: el índice se reconstruye con reindexar_busqueda
+        return
+    get_backend().indexar(instance)
+    # El índice en memoria no se revierte con la transacción: se toca al confirmar
+    transaction.on_commit(partial(indice_autocompletar.actualizar, instance))
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    """Quita el producto del índice de búsqueda"""
+    get_backend().eliminar(instance.pk)
+    transaction.on_commit(partial(indice_autocompletar.eliminar, instance.pk))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_tarjetas_producto(sender, instance, **kwargs):
+    """Descarta el HTML cacheado de las tarjetas del producto"""
+    invalidar_tarjetas(instance.pk)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_totales_catalogo(sender, instance, **kwargs):
+    """
+    Descarta los totales y facetas del catálogo al confirmar la transacción
+    (antes, otra request podría volver a cachear los valores viejos)
+    """
+    transaction.on_commit(invalidar_totales)
+    transaction.on_commit(invalidar_facetas)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(m2m_changed, sender=Producto.afiliados.through)
+def invalidar_paginas_tienda(sender, **kwargs):
+    """
+    Las páginas públicas muestran productos y, con ?ref=, si el afiliado
+    sigue afiliado: cualquier cambio deja obsoletas las páginas cacheadas
+    """
+    transaction.on_commit(invalidar_paginas)
+
+
+@receiver(post_save, sender=Producto)
+def generar_variantes_imagen(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Encola la generación de las variantes de la imagen nueva. Si todavía no
+    se generaron cuando una plantilla las pide, se generan en ese momento.
+    """
+    if raw or not instance.imagen:
+        return
+    if update_fields is not None and 'imagen' not in update_fields:
+        return
+    tareas.generar_variantes_imagen.encolar(instance.imagen.name)
+
+
+@receiver(pre_save, sender=Pedido)
+def comprimir_comprobante_pedido(sender, instance, raw=False, **kwargs):
+    """Comprime el comprobante subido antes de que se escriba en disco"""
+    if not raw:
+        procesar_comprobante(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidar_referidos_usuario(sender, instance, update_fields=None, **kwargs):
+    """Un usuario nuevo, renombrado o borrado cambia a quién apunta un ?ref="""
+    if update_fields is not None and 'username' not in update_fields:
+        return  # p. ej. el last_login de cada inicio de sesión
+    referidos.invalidar_usuario(instance.pk, instance.username)
+    links.invalidar_afiliado(instance.pk)
+
+
+@receiver(m2m_changed, sender=Producto.afiliados.through)
+def invalidar_referidos_afiliaciones(sender, instance, action, reverse, pk_set, **kwargs):
+    """Descarta las afiliaciones cacheadas que cambiaron"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:  # usuario.productos_afiliados.add(...)
+        referidos.invalidar_afiliaciones(producto_ids=pk_set or None, usuario_ids=[instance.pk])
+    else:        # producto.afiliados.add(...)
+        referidos.invalidar_afiliaciones(producto_ids=[instance.pk], usuario_ids=pk_set or None)
+
+
+@receiver(m2m_changed, sender=Producto.afiliados.through)
+def crear_links_cortos(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cada afiliación nueva recibe su link corto"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        links.crear_links([instance.pk], pk_set)
+    else:
+        links.crear_links(pk_set, [instance.pk])
+
+
+@receiver(post_delete, sender=LinkCorto)
+def invalidar_link_corto(sender, instance, **kwargs):
+    links.invalidar_codigo(instance.codigo)
@@ -0,0 +1,259 @@
+"""
+Cola de tareas en segundo plano sobre la base de datos (sin broker).
+
+Una tarea es una función registrada con @tarea. encolar() guarda una fila
+Tarea (dentro de la transacción actual: si se revierte, la tarea también)
+y el comando procesar_tareas las ejecuta en un pool de hilos, y
+opcionalmente de procesos:
+
+    @tarea(prioridad=5, max_intentos=5)
+    def avisar(pedido_id): ...
+
+    avisar.encolar(pedido.pk)                            # lo antes posible
+    avisar.encolar(pedido.pk, cuando=manana)             # programada
+    avisar.encolar(pedido.pk, prioridad=10)              # antes que el resto
+
+(`cuando` y `prioridad` quedan reservados: no se pasan a la función.)
+
+- Se toman primero las de mayor prioridad y, entre iguales, las más
+  antiguas; las programadas recién cuando llega su ejecutar_desde.
+- Para tomar tareas se usa SELECT ... FOR UPDATE SKIP LOCKED donde la base
+  lo soporta (PostgreSQL, MySQL 8): varios trabajadores se reparten la cola
+  sin esperarse. En SQLite cada tarea se toma con un UPDATE condicional
+  (WHERE estado = 'PENDIENTE'); como SQLite serializa las escrituras, solo
+  un trabajador lo gana.
+- Si la función lanza una excepción, se reintenta con espera exponencial
+  (espera, 2x, 4x...) hasta max_intentos; después queda FALLIDA con el
+  traceback en ultimo_error.
+- Una tarea tomada queda reservada TAREAS_RESERVA segundos: si el
+  trabajador muere, al vencer la reserva vuelve a la cola (o falla si ya
+  agotó sus intentos).
+
+Los trabajadores importan el módulo `tareas` de cada app instalada para
+registrar sus funciones. Las tareas de la tienda están al final.
+"""
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+
+
+logger = logging.getLogger(__name__)
+
+_registro = {}
+
+
+def _reserva():
+    return timedelta(seconds=getattr(settings, 'TAREAS_RESERVA', 60 * 10))
+
+
+class DefinicionTarea:
+    """Función registrada como tarea; se la sigue pudiendo llamar directamente"""
+
+    def __init__(self, funcion, nombre, prioridad, max_intentos, espera, unica):
+        functools.update_wrapper(self, funcion)
+        self.funcion = funcion
+        self.nombre = nombre
+        self.prioridad = prioridad
+        self.max_intentos = max_intentos
+        self.espera = espera
+        self.unica = unica
+
+    def __call__(self, *args, **kwargs):
+        return self.funcion(*args, **kwargs)
+
+    def encolar(self, *args, cuando=None, prioridad=None, **kwargs):
+        """Guarda la tarea para que la ejecute un trabajador; devuelve la Tarea (o None si ya había una)"""
+        cuando = cuando or timezone.now()
+        if self.unica and Tarea.objects.filter(
+            nombre=self.nombre, estado='PENDIENTE', ejecutar_desde__lte=cuando
+        ).exists():
+            return None
+        return Tarea.objects.create(
+            nombre=self.nombre,
+            argumentos={'args': list(args), 'kwargs': kwargs},
+            prioridad=self.prioridad if prioridad is None else prioridad,
+            ejecutar_desde=cuando,
+            max_intentos=self.max_intentos,
+        )
+
+    def espera_reintento(self, intentos):
+        return timedelta(seconds=self.espera * 2 ** max(intentos - 1, 0))
+
+
+def tarea(funcion=None, *, nombre=None, prioridad=0, max_intentos=None, espera=None, unica=False):
+    """
+    Registra una función como tarea. `unica`: no encola otra si ya hay una
+    pendiente con el mismo nombre que corre antes (para tareas que procesan
+    todo lo que haya).
+    """
+    def registrar(funcion):
+        definicion = DefinicionTarea(
+            funcion,
+            nombre or f'{funcion.__module__}.{funcion.__qualname__}',
+            prioridad,
+            max_intentos or getattr(settings, 'TAREAS_MAX_INTENTOS', 3),
+            getattr(settings, 'TAREAS_ESPERA_REINTENTO', 30) if espera is None else espera,
+            unica,
+        )
+        _registro[definicion.nombre] = definicion
+        return definicion
+
+    return registrar(funcion) if funcion is not None else registrar
+
+
+# ============================================================================
+# ⚙️ EJECUCIÓN
+# ============================================================================
+
+def tomar(cantidad, trabajador):
+    """Reserva hasta `cantidad` tareas listas para `trabajador` y las devuelve"""
+    ahora = timezone.now()
+    cola = (
+        Tarea.objects.filter(estado='PENDIENTE', ejecutar_desde__lte=ahora)
+        .order_by('-prioridad', 'ejecutar_desde', 'pk')
+    )
+    reserva = {
+        'estado': 'EN_CURSO',
+        'trabajador': trabajador,
+        'reservada_hasta': ahora + _reserva(),
+        'intentos': F('intentos') + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            tareas = list(cola.select_for_update(skip_locked=True)[:cantidad])
+            Tarea.objects.filter(pk__in=[t.pk for t in tareas]).update(**reserva)
+    else:
+        # Sin SKIP LOCKED: se queda con las que su UPDATE condicional haya marcado
+        tareas = [
+            t for t in cola[:cantidad]
+            if Tarea.objects.filter(pk=t.pk, estado='PENDIENTE').update(**reserva)
+        ]
+
+    for t in tareas:
+        t.estado, t.trabajador, t.intentos = 'EN_CURSO', trabajador, t.intentos + 1
+    return tareas
+
+
+def ejecutar(t):
+    """Ejecuta una tarea tomada y guarda el resultado; devuelve True si terminó bien"""
+    definicion = _registro.get(t.nombre)
+    mia = Tarea.objects.filter(pk=t.pk, estado='EN_CURSO', trabajador=t.trabajador)
+    try:
+        if definicion is None:
+            raise LookupError(f'Tarea no registrada: {t.nombre}')
+        definicion.funcion(*t.argumentos.get('args', []), **t.argumentos.get('kwargs', {}))
+    except Exception:
+        logger.exception('Falló la tarea %s (%s, intento %s)', t.pk, t.nombre, t.intentos)
+        error = traceback.format_exc()[-4000:]
+        if definicion is not None and t.intentos < t.max_intentos:
+            mia.update(
+                estado='PENDIENTE', ultimo_error=error, trabajador='', reservada_hasta=None,
+                ejecutar_desde=timezone.now() + definicion.espera_reintento(t.intentos),
+            )
+        else:
+            mia.update(estado='FALLIDA', ultimo_error=error, reservada_hasta=None, fecha_fin=timezone.now())
+        return False
+    mia.update(estado='HECHA', ultimo_error='', reservada_hasta=None, fecha_fin=timezone.now())
+    return True
+
+
+def recuperar_vencidas():
+    """Devuelve a la cola las tareas de trabajadores que murieron (reserva vencida)"""
+    vencidas = Tarea.objects.filter(estado='EN_CURSO', reservada_hasta__lt=timezone.now())
+    recuperadas = vencidas.filter(intentos__lt=F('max_intentos')).update(
+        estado='PENDIENTE', trabajador='', reservada_hasta=None,
+    )
+    vencidas.update(
+        estado='FALLIDA', reservada_hasta=None, fecha_fin=timezone.now(),
+        ultimo_error='El trabajador no terminó la tarea antes de que venciera su reserva',
+    )
+    return recuperadas
+
+
+class Trabajador:
+    """Toma tareas de la cola y las ejecuta en un pool de `hilos` hilos"""
+
+    def __init__(self, hilos=None, intervalo=None):
+        self.hilos = hilos or getattr(settings, 'TAREAS_HILOS', 4)
+        self.intervalo = getattr(settings, 'TAREAS_INTERVALO', 1) if intervalo is None else intervalo
+        self.nombre = f'{socket.gethostname()}:{os.getpid()}'[:100]
+        self.detener = threading.Event()
+
+    def _ejecutar(self, t):
+        try:
+            ejecutar(t)
+        finally:
+            connection.close()  # cada hilo tiene su propia conexión
+
+    def correr(self, hasta_vaciar=False):
+        """
+        Procesa tareas hasta que se llame a detener.set() (o, con
+        `hasta_vaciar`, hasta que no queden tareas listas). Las que están en
+        curso siempre se terminan antes de salir.
+        """
+        en_curso = set()
+        proxima_recuperacion = 0
+        with ThreadPoolExecutor(self.hilos, thread_name_prefix='tarea') as pool:
+            while not self.detener.is_set():
+                if time.monotonic() >= proxima_recuperacion:
+                    recuperar_vencidas()
+                    proxima_recuperacion = time.monotonic() + 60
+
+                en_curso = {f for f in en_curso if not f.done()}
+                libres = self.hilos - len(en_curso)
+                tomadas = tomar(libres, self.nombre) if libres else []
+                for t in tomadas:
+                    en_curso.add(pool.submit(self._ejecutar, t))
+
+                if tomadas and len(tomadas) == libres:
+                    continue  # probablemente hay más: seguir apenas se libere un hilo
+                if en_curso:
+                    wait(en_curso, timeout=self.intervalo, return_when=FIRST_COMPLETED)
+                elif hasta_vaciar:
+                    break
+                else:
+                    self.detener.wait(self.intervalo)
+        connection.close()
+
+
+# ============================================================================
+# 🛒 TAREAS DE LA TIENDA
+# ============================================================================
+
+@tarea(prioridad=10, unica=True)
+def enviar_correos():
+    """Vacía la cola de salida de emails (ver correos.py)"""
+    from .correos import enviar_pendientes, proximo_envio
+
+    lote = 100
+    try:
+        while sum(enviar_pendientes(lote=lote)) == lote:
+            pass
+    finally:
+        # Los que fallaron (o quedaron sin enviar por un error) se reintentan
+        # más tarde: queda programada para entonces aunque esta vuelta falle
+        proximo = proximo_envio()
+        if proximo is not None:
+            enviar_correos.encolar(cuando=proximo)
+
+
+@tarea(prioridad=-5)
+def generar_variantes_imagen(nombre_original):
+    """Variantes WebP/JPEG de una imagen de producto recién subida (ver imagenes.py)"""
+    from .imagenes import obtener_manifiesto
+
+    obtener_manifiesto(nombre_original)
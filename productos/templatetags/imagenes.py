@@ -0,0 +1,64 @@
+from urllib.parse import quote
+
+from django import template
+from django.utils.html import format_html
+
+from .. import imagenes
+
+register = template.Library()
+
+# Ancho con el que se muestra cada variante, para el atributo sizes
+SIZES = {
+    'card': '(min-width: 1280px) 300px, (min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw',
+    'detalle': '(min-width: 1024px) 50vw, 100vw',
+    'thumb': '96px',
+}
+
+# Tamaño de la imagen de relleno (placehold.co) si la imagen no carga
+RELLENOS = {
+    'card': '600x400',
+    'detalle': '800x800',
+    'thumb': '100x100',
+}
+
+# Variantes que se ofrecen en el srcset de cada una
+CANDIDATAS = {
+    'card': ('card', 'detalle'),
+    'detalle': ('card', 'detalle'),
+    'thumb': ('thumb',),
+}
+
+
+@register.filter
+def variante(campo_imagen, nombre):
+    """URL JPEG de una variante: {{ producto.imagen|variante:'thumb' }}"""
+    return imagenes.url_variante(campo_imagen, nombre)
+
+
+@register.simple_tag
+def imagen_producto(campo_imagen, nombre, alt='', clases='', relleno='667eea'):
+    """
+    <picture> con la variante en WebP y JPEG, srcset/sizes y carga diferida.
+    `relleno` es el color de la imagen de placehold.co que se muestra si
+    la imagen no carga.
+
+        {% imagen_producto producto.imagen 'card' alt=producto.nombre clases='w-full h-56 object-cover' %}
+    """
+    candidatas = CANDIDATAS[nombre]
+    onerror = f"this.src='https://placehold.co/{RELLENOS[nombre]}/{relleno}/fff?text={quote(str(alt)[:3])}'"
+    srcset_webp = imagenes.srcset(campo_imagen, candidatas, 'webp')
+    if not srcset_webp:
+        # Sin variantes (imagen rota o inexistente): la imagen original tal cual
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async" onerror="{}">',
+            campo_imagen.url if campo_imagen else '', alt, clases, onerror,
+        )
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async" onerror="{}">'
+        '</picture>',
+        srcset_webp, SIZES[nombre],
+        imagenes.url_variante(campo_imagen, nombre), imagenes.srcset(campo_imagen, candidatas, 'jpg'),
+        SIZES[nombre], alt, clases, onerror,
+    )
@@ -0,0 +1,38 @@
+from django import template
+
+from ..fragmentos import html_tarjeta, MARCA_ACCIONES
+
+register = template.Library()
+
+
+class TarjetaProductoNode(template.Node):
+    def __init__(self, producto, variante, nodelist):
+        self.producto = producto
+        self.variante = variante
+        self.nodelist = nodelist
+
+    def render(self, context):
+        producto = self.producto.resolve(context)
+        html = html_tarjeta(producto, self.variante.resolve(context))
+        antes, _, despues = html.partition(MARCA_ACCIONES)
+        # Las acciones dependen del usuario: se renderizan siempre, fuera de la caché
+        return antes + self.nodelist.render(context) + despues
+
+
+@register.tag
+def tarjeta_producto(parser, token):
+    """
+    Tarjeta de producto cacheada (ver productos/fragmentos.py).
+
+        {% tarjeta_producto producto 'catalogo' %}
+            ...botones que dependen del usuario...
+        {% endtarjeta_producto %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' necesita dos argumentos: el producto y la variante"
+        )
+    nodelist = parser.parse(('endtarjeta_producto',))
+    parser.delete_first_token()
+    return TarjetaProductoNode(parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), nodelist)
@@ -1,3 +1,1365 @@
-from django.test import TestCase
+import base64
+import gzip
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import DatabaseError, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import facetas, links, qr, referidos, secuencias, tareas, visitantes
+from .admin import CorreoPendienteAdmin, ProductoAdmin
+from .atribucion import afiliado_para, leer_atribucion
+from .autocompletar import indice as indice_autocompletar
+from .busqueda import BackendSinIndice, buscar_productos, get_backend
+from .cache_paginas import cachear_pagina_anonima
+from .carrito import Carrito
+from .catalogo import (
+    ORDENES, codificar_cursor, contar_productos_por_tipo, decodificar_cursor, paginar_catalogo,
+    productos_catalogo,
+)
+from .clics import BufferClicks
+from .condicional import etag_catalogo, last_modified_catalogo
+from .correos import encolar, enviar_pendientes
+from .fragmentos import MARCA_ACCIONES, VARIANTES, clave_tarjeta, html_tarjeta
+from .imagenes import comprimir_comprobante, generar_variantes, obtener_manifiesto, srcset, url_variante
+from .inventario import StockInsuficiente, descontar
+from .lru import CacheLRU
+from .models import (
+    ClickAfiliado, CorreoPendiente, ItemPedido, LinkCorto, Pedido, Producto, ReservaStock, SecuenciaPedido, Tarea,
+)
+from .reservas import liberar, liberar_vencidas, reservar
+
+
+def crear_usuario(username='comprador'):
+    return get_user_model().objects.create_user(
+        username=username, email=f'{username}@example.com', password='x', nombre=username.title()
+    )
+
+
+def imagen_subida(nombre='comprobante.png', tamano=(800, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', tamano, 'white').save(buffer, 'PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+def crear_producto(**campos):
+    campos = {'nombre': 'Café tostado', 'precio': 100, 'descripcion': 'x', 'stock': 10, **campos}
+    return Producto.objects.create(**campos)
+
+
+class BackendSinConexion(BaseEmailBackend):
+    """Backend de email que simula un servidor SMTP caído"""
+
+    def open(self):
+        raise ConnectionRefusedError('smtp caído')
+
+    def send_messages(self, mensajes):
+        raise AssertionError('No debería enviar sin conexión')
+
+
+# ============================================================================
+# ✉️ COLA DE SALIDA DE EMAILS
+# ============================================================================
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class CorreosTests(TestCase):
+
+    def test_envia_los_pendientes(self):
+        encolar('Hola', 'Cuerpo', ['a@ejemplo.com'])
+        self.assertEqual(enviar_pendientes(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(CorreoPendiente.objects.get().enviado)
+
+    @override_settings(EMAIL_BACKEND='productos.tests.BackendSinConexion', CORREOS_MAX_INTENTOS=5)
+    def test_sin_conexion_registra_el_error_en_todo_el_lote(self):
+        encolar('Uno', 'Cuerpo', ['a@ejemplo.com'])
+        encolar('Dos', 'Cuerpo', ['b@ejemplo.com'])
+
+        self.assertEqual(enviar_pendientes(), (0, 2))
+
+        for correo in CorreoPendiente.objects.all():
+            self.assertIsNone(correo.enviado)
+            self.assertEqual(correo.intentos, 1)
+            self.assertIn('smtp caído', correo.ultimo_error)
+            self.assertIsNotNone(correo.proximo_intento)  # se reintenta más tarde
+
+    def test_envio_continuo_sigue_despues_de_un_error(self):
+        class Fin(Exception):
+            pass
+
+        comando = 'productos.management.commands.enviar_correos'
+        with mock.patch(f'{comando}.enviar_pendientes', side_effect=[RuntimeError('sin base'), (1, 0)]) as enviar, \
+                mock.patch(f'{comando}.time.sleep', side_effect=[None, Fin]), \
+                self.assertLogs(comando, 'ERROR'):
+            with self.assertRaises(Fin):
+                call_command('enviar_correos', '--continuo', stdout=StringIO())
+        self.assertEqual(enviar.call_count, 2)
+
+    def test_reintentar_desde_el_admin_encola_el_envio(self):
+        encolar('Hola', 'Cuerpo', ['a@ejemplo.com'])
+        CorreoPendiente.objects.update(proximo_intento=None, intentos=5)  # abandonado
+        modelo_admin = CorreoPendienteAdmin(CorreoPendiente, admin.site)
+        with mock.patch.object(modelo_admin, 'message_user'), \
+                self.captureOnCommitCallbacks(execute=True):
+            modelo_admin.reintentar(RequestFactory().post('/'), CorreoPendiente.objects.all())
+        self.assertEqual(CorreoPendiente.objects.get().intentos, 0)
+        self.assertTrue(Tarea.objects.filter(nombre=tareas.enviar_correos.nombre, estado='PENDIENTE').exists())
+
+
+# ============================================================================
+# 🧰 TAREAS EN SEGUNDO PLANO
+# ============================================================================
+
+class TareaEnviarCorreosTests(TestCase):
+
+    def test_queda_programada_aunque_el_envio_falle(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            encolar('Hola', 'Cuerpo', ['a@ejemplo.com'])
+        tarea = Tarea.objects.get(nombre=tareas.enviar_correos.nombre)
+        Tarea.objects.filter(pk=tarea.pk).update(max_intentos=1)  # este intento es el último
+
+        with mock.patch('productos.correos.enviar_pendientes', side_effect=RuntimeError('sin base')):
+            (tomada,) = tareas.tomar(1, 'test')
+            self.assertFalse(tareas.ejecutar(tomada))
+
+        self.assertEqual(Tarea.objects.get(pk=tarea.pk).estado, 'FALLIDA')
+        siguiente = Tarea.objects.get(nombre=tareas.enviar_correos.nombre, estado='PENDIENTE')
+        self.assertEqual(siguiente.ejecutar_desde, CorreoPendiente.objects.get().proximo_intento)
+
+
+# ============================================================================
+# 🔁 GET CONDICIONAL
+# ============================================================================
+
+class CondicionalCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.producto = crear_producto()
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def validadores(self):
+        return etag_catalogo(self.request), last_modified_catalogo(self.request)
+
+    def test_cambian_al_desactivar_un_producto(self):
+        etag, fecha = self.validadores()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.activo = False
+            self.producto.save()
+        nuevo_etag, nueva_fecha = self.validadores()
+        self.assertNotEqual(nuevo_etag, etag)
+        self.assertGreater(nueva_fecha, fecha)
+
+    def test_cambian_al_borrar_un_producto(self):
+        etag, fecha = self.validadores()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.delete()
+        nuevo_etag, nueva_fecha = self.validadores()
+        self.assertNotEqual(nuevo_etag, etag)
+        self.assertGreater(nueva_fecha, fecha)
+
+    def test_sin_validadores_para_usuarios_logueados(self):
+        self.request.user = crear_usuario()
+        self.assertEqual(self.validadores(), (None, None))
+
+    def test_el_catalogo_responde_304_con_el_mismo_etag(self):
+        response = self.client.get(reverse('productos:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        repetida = self.client.get(reverse('productos:home'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida.content, b'')
+
+    def test_el_etag_depende_de_la_url(self):
+        response = self.client.get(reverse('productos:home'))
+        filtrada = self.client.get(reverse('productos:home') + '?tipo=DIGITAL', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(filtrada.status_code, 200)
+
+    def test_el_detalle_responde_304_hasta_que_cambia_el_producto(self):
+        url = reverse('productos:detalle_producto', args=[self.producto.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.precio = 120
+            self.producto.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sin_etag_para_usuarios_logueados(self):
+        self.client.force_login(crear_usuario())
+        response = self.client.get(reverse('productos:home'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('private', response['Cache-Control'])
+
+
+# ============================================================================
+# 🧾 TOTALES DE PEDIDOS
+# ============================================================================
+
+class TotalesPedidoTests(TestCase):
+
+    def setUp(self):
+        self.pedido = Pedido.objects.create(usuario=crear_usuario())
+        self.producto = crear_producto(precio=Decimal('25.00'))
+
+    def total_guardado(self):
+        return Pedido.objects.values_list('total', flat=True).get(pk=self.pedido.pk)
+
+    def test_los_items_suman_su_diferencia_al_total(self):
+        item = ItemPedido.objects.create(
+            pedido=self.pedido, producto=self.producto, cantidad=2, precio_unitario=self.producto.precio
+        )
+        item.cantidad = 3
+        item.save()
+        self.assertEqual(self.total_guardado(), Decimal('75.00'))
+        self.assertEqual(self.pedido.total, Decimal('75.00'))
+
+    def test_save_despues_de_aplicar_delta_no_reescribe_el_total(self):
+        self.pedido.aplicar_delta(Decimal('40.00'))
+        self.assertNotIn('total', self.pedido.campos_modificados())
+        # Otro proceso suma al mismo pedido mientras tanto
+        Pedido.objects.filter(pk=self.pedido.pk).sumar_al_total(Decimal('10.00'))
+        self.pedido.notas = 'Sin cebolla'
+        self.pedido.save()
+        self.assertEqual(self.total_guardado(), Decimal('50.00'))
+
+    def test_update_fields_sin_subtotal_no_cambia_el_total(self):
+        item = ItemPedido.objects.create(
+            pedido=self.pedido, producto=self.producto, cantidad=2, precio_unitario=self.producto.precio
+        )
+        item.cantidad = 5
+        item.save(update_fields=['cantidad'])
+        self.assertEqual(self.total_guardado(), Decimal('50.00'))
+        self.assertEqual(ItemPedido.objects.get(pk=item.pk).subtotal, Decimal('50.00'))
+
+    def descuadrar(self, cantidad=2, **campos):
+        ItemPedido.objects.create(
+            pedido=self.pedido, producto=self.producto, cantidad=cantidad, precio_unitario=self.producto.precio
+        )
+        Pedido.objects.filter(pk=self.pedido.pk).update(total=Decimal('999.00'), **campos)
+
+    def test_recalcular_totales_suma_los_items(self):
+        self.descuadrar(afiliado_referido=crear_usuario('ana'), porcentaje_comision=10)
+        vacio = Pedido.objects.create(usuario=self.pedido.usuario, numero_pedido='VACIO', total=Decimal('5.00'))
+        with self.assertNumQueries(2):
+            self.assertEqual(Pedido.objects.recalcular_totales(), 2)
+        total, comision = Pedido.objects.values_list('total', 'comision_total_field').get(pk=self.pedido.pk)
+        self.assertEqual((total, comision), (Decimal('50.00'), Decimal('5.00')))
+        self.assertEqual(Pedido.objects.values_list('total', flat=True).get(pk=vacio.pk), Decimal('0'))
+
+    def test_comando_recalcular_totales(self):
+        self.descuadrar()
+        salida = StringIO()
+        call_command('recalcular_totales', '--dry-run', stdout=salida)
+        self.assertIn('1 descuadrados', salida.getvalue())
+        self.assertEqual(self.total_guardado(), Decimal('999.00'))
+
+        call_command('recalcular_totales', str(self.pedido.pk), stdout=salida)
+        self.assertIn('1 corregidos', salida.getvalue())
+        self.assertEqual(self.total_guardado(), Decimal('50.00'))
+
+
+# ============================================================================
+# 📦 INVENTARIO
+# ============================================================================
+
+class DescontarStockTests(TestCase):
+
+    def setUp(self):
+        self.comprador = crear_usuario()
+        self.cafe = crear_producto(stock=5)
+        self.te = crear_producto(nombre='Té verde', stock=2)
+
+    def stock(self, producto):
+        return Producto.objects.values_list('stock', flat=True).get(pk=producto.pk)
+
+    def test_descuenta_el_stock(self):
+        descontar({self.cafe.pk: 3, self.te.pk: 2})
+        self.assertEqual(self.stock(self.cafe), 2)
+        self.assertEqual(self.stock(self.te), 0)
+
+    def test_sin_stock_suficiente_no_descuenta_nada(self):
+        with self.assertRaises(StockInsuficiente) as error:
+            descontar({self.cafe.pk: 3, self.te.pk: 4})
+        [faltante] = error.exception.faltantes
+        self.assertEqual(
+            (faltante.producto_id, faltante.solicitado, faltante.disponible), (self.te.pk, 4, 2)
+        )
+        # Todo o nada: el café tampoco se descontó
+        self.assertEqual(self.stock(self.cafe), 5)
+        self.assertEqual(self.stock(self.te), 2)
+
+    def test_las_reservas_de_otros_no_estan_disponibles(self):
+        otro = crear_usuario('otro')
+        ReservaStock.objects.create(
+            usuario=otro, producto=self.cafe, cantidad=4, vence=timezone.now() + timedelta(minutes=5)
+        )
+        with self.assertRaises(StockInsuficiente) as error:
+            descontar({self.cafe.pk: 2}, usuario=self.comprador)
+        self.assertEqual(error.exception.faltantes[0].disponible, 1)
+        self.assertEqual(self.stock(self.cafe), 5)
+
+        # Las propias sí se pueden usar
+        descontar({self.cafe.pk: 5}, usuario=otro)
+        self.assertEqual(self.stock(self.cafe), 0)
+
+
+# ============================================================================
+# ⏳ RESERVAS DE STOCK
+# ============================================================================
+
+class ReservasTests(TestCase):
+
+    def setUp(self):
+        self.comprador = crear_usuario()
+        self.otro = crear_usuario('otro')
+        self.cafe = crear_producto(stock=5)
+
+    def reservado(self, usuario=None):
+        return Producto.objects.annotate(
+            reservas=ReservaStock.objects.reservado(excluir_usuario=usuario)
+        ).values_list('reservas', flat=True).get(pk=self.cafe.pk)
+
+    def reservar_vencida(self, usuario, cantidad):
+        return ReservaStock.objects.create(
+            usuario=usuario, producto=self.cafe, cantidad=cantidad,
+            vence=timezone.now() - timedelta(seconds=1),
+        )
+
+    def test_reserva_el_stock_del_carrito(self):
+        self.assertEqual(reservar(self.comprador, {self.cafe.pk: 3}), [])
+        reserva = ReservaStock.objects.get(usuario=self.comprador)
+        self.assertEqual((reserva.producto_id, reserva.cantidad), (self.cafe.pk, 3))
+        self.assertGreater(reserva.vence, timezone.now())
+
+    def test_reservar_de_nuevo_reemplaza_las_anteriores(self):
+        reservar(self.comprador, {self.cafe.pk: 3})
+        reservar(self.comprador, {self.cafe.pk: 5})
+        self.assertEqual(
+            list(ReservaStock.objects.filter(usuario=self.comprador).values_list('cantidad', flat=True)), [5]
+        )
+
+    def test_sin_stock_libre_no_reserva(self):
+        reservar(self.otro, {self.cafe.pk: 4})
+        [faltante] = reservar(self.comprador, {self.cafe.pk: 2})
+        self.assertEqual((faltante.solicitado, faltante.disponible), (2, 1))
+        self.assertFalse(ReservaStock.objects.filter(usuario=self.comprador).exists())
+
+    def test_reservado_suma_solo_las_vigentes_de_los_demas(self):
+        reservar(self.comprador, {self.cafe.pk: 2})
+        reservar(self.otro, {self.cafe.pk: 1})
+        self.reservar_vencida(crear_usuario('tercero'), 2)
+        self.assertEqual(self.reservado(), 3)
+        self.assertEqual(self.reservado(usuario=self.comprador), 1)
+
+    def test_las_vencidas_no_cuentan_y_se_liberan(self):
+        self.reservar_vencida(self.otro, 5)
+        self.assertEqual(reservar(self.comprador, {self.cafe.pk: 5}), [])
+        self.assertEqual(liberar_vencidas(), 1)
+        self.assertEqual(ReservaStock.objects.filter(usuario=self.otro).count(), 0)
+
+    def test_liberar_borra_las_del_usuario(self):
+        reservar(self.comprador, {self.cafe.pk: 2})
+        reservar(self.otro, {self.cafe.pk: 2})
+        liberar(self.comprador)
+        self.assertEqual(list(ReservaStock.objects.values_list('usuario', flat=True)), [self.otro.pk])
+
+    def test_comando_liberar_reservas(self):
+        for _ in range(3):
+            self.reservar_vencida(self.otro, 1)
+        reservar(self.comprador, {self.cafe.pk: 1})
+        salida = StringIO()
+        call_command('liberar_reservas', lote=2, stdout=salida)
+        self.assertIn('3 reservas vencidas liberadas', salida.getvalue())
+        self.assertEqual(list(ReservaStock.objects.values_list('usuario', flat=True)), [self.comprador.pk])
+
+
+# ============================================================================
+# 🔢 NÚMEROS DE PEDIDO
+# ============================================================================
+
+class NumerosPedidoTests(TestCase):
+
+    def setUp(self):
+        secuencias._bloques.clear()
+        self.addCleanup(secuencias._bloques.clear)
+
+    def numero(self, dia=date(2025, 1, 1)):
+        # Como en un checkout: el resto del bloque se guarda al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            return secuencias.siguiente_numero(dia)
+
+    def test_se_reinicia_cada_dia(self):
+        momentos = [
+            datetime(2025, 1, 1, 23, 59, 59, tzinfo=dt_timezone.utc),
+            datetime(2025, 1, 1, 23, 59, 59, tzinfo=dt_timezone.utc),
+            datetime(2025, 1, 2, 0, 0, 0, tzinfo=dt_timezone.utc),
+        ]
+        numeros = []
+        with mock.patch('productos.secuencias.timezone.now', side_effect=momentos):
+            for _ in momentos:
+                with self.captureOnCommitCallbacks(execute=True):
+                    numeros.append(secuencias.numero_pedido())
+        self.assertEqual(numeros, ['20250101001', '20250101002', '20250102001'])
+
+    @override_settings(PEDIDOS_BLOQUE_NUMEROS=3)
+    def test_bloques_entregan_numeros_unicos_y_crecientes(self):
+        numeros = [self.numero() for _ in range(7)]
+        self.assertEqual(numeros, list(range(1, 8)))
+        # Tres bloques de 3: el contador quedó al final del tercero
+        self.assertEqual(SecuenciaPedido.objects.get(dia=date(2025, 1, 1)).ultimo, 9)
+
+    @override_settings(PEDIDOS_BLOQUE_NUMEROS=3)
+    def test_un_bloque_sin_usar_queda_como_hueco(self):
+        self.assertEqual(self.numero(), 1)
+        secuencias._bloques.clear()  # el proceso se reinicia con 2 y 3 sin usar
+        self.assertEqual(self.numero(), 4)
+
+    def test_el_checkout_toma_el_numero_antes_de_guardar(self):
+        pedido = Carrito().nuevo_pedido(crear_usuario())
+        self.assertRegex(pedido.numero_pedido, r'^\d{11}$')
+        self.assertTrue(SecuenciaPedido.objects.exists())
+
+    @override_settings(PEDIDOS_BLOQUE_NUMEROS=3)
+    def test_un_bloque_revertido_se_descarta(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.assertEqual(secuencias.siguiente_numero(date(2025, 1, 1)), 1)
+                    raise RuntimeError('checkout fallido')
+            except RuntimeError:
+                pass
+        # El contador volvió atrás y el resto del bloque no quedó en memoria
+        self.assertEqual(secuencias._bloques, {})
+        self.assertEqual(self.numero(), 1)
+
+
+# ============================================================================
+# ✅ CONFIRMAR PEDIDO
+# ============================================================================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ConfirmarPedidoTests(TestCase):
+
+    def setUp(self):
+        self.comprador = crear_usuario()
+        self.client.force_login(self.comprador)
+        self.cafe = crear_producto(stock=5)
+
+    def poner_en_el_carrito(self, producto, cantidad):
+        carrito = Carrito()
+        carrito.agregar(producto, cantidad)
+        respuesta = HttpResponse()
+        carrito.guardar(respuesta)
+        self.client.cookies.update(respuesta.cookies)
+
+    def confirmar(self, **datos):
+        datos = {
+            'metodo_pago': 'CONTRA_ENTREGA', 'nombre_completo': 'Ana', 'email': 'ana@example.com',
+            'telefono': '0981', 'direccion_envio': 'Calle 1', 'ciudad': 'Asunción', **datos,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('productos:confirmar_pedido'), datos)
+
+    def test_crea_el_pedido_y_descuenta_el_stock(self):
+        self.poner_en_el_carrito(self.cafe, 2)
+        respuesta = self.confirmar()
+        pedido = Pedido.objects.get(usuario=self.comprador)
+        self.assertRedirects(
+            respuesta, reverse('productos:detalle_pedido', args=[pedido.pk]), fetch_redirect_response=False
+        )
+        self.assertEqual(pedido.total, Decimal('200.00'))
+        self.assertEqual(Producto.objects.get(pk=self.cafe.pk).stock, 3)
+        self.assertEqual(CorreoPendiente.objects.filter(pedido=pedido).count(), 1)
+
+    def test_sin_stock_no_crea_el_pedido(self):
+        self.poner_en_el_carrito(self.cafe, 2)
+        Producto.objects.filter(pk=self.cafe.pk).update(stock=1)
+        respuesta = self.confirmar()
+        self.assertRedirects(respuesta, reverse('productos:ver_carrito'), fetch_redirect_response=False)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(CorreoPendiente.objects.exists())
+        self.assertEqual(Producto.objects.get(pk=self.cafe.pk).stock, 1)
+
+    def test_el_comprobante_se_comprime_una_sola_vez(self):
+        self.poner_en_el_carrito(self.cafe, 1)
+        with mock.patch('productos.imagenes.comprimir_comprobante', wraps=comprimir_comprobante) as comprimir:
+            self.confirmar(metodo_pago='TRANSFERENCIA', comprobante_pago=imagen_subida())
+        self.assertEqual(comprimir.call_count, 1)
+        pedido = Pedido.objects.get(usuario=self.comprador)
+        self.assertTrue(pedido.comprobante_pago.name.endswith('.jpg'))
+        self.assertTrue(pedido.comprobante_preview)
+
+
+# ============================================================================
+# 📊 ESTADÍSTICAS DEL AFILIADO
+# ============================================================================
+
+class EstadisticasVendedorTests(TestCase):
+
+    def test_muestra_los_visitantes_unicos_de_los_links(self):
+        afiliado = crear_usuario('afiliado')
+        get_user_model().objects.filter(pk=afiliado.pk).update(
+            tipo_usuario='VENDEDOR', datos_afiliacion_completos=True
+        )
+        cafe = crear_producto()
+        cafe.afiliados.add(afiliado)
+        ahora = timezone.now()
+        visitantes.acumular([(afiliado.pk, cafe.pk, ahora, f'visitante-{n % 3}') for n in range(10)])
+
+        self.client.force_login(afiliado)
+        respuesta = self.client.get(reverse('productos:estadisticas_vendedor'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['visitantes_totales'], 3)
+        self.assertEqual(respuesta.context['productos_visitados'], [{'producto': cafe, 'visitantes': 3}])
+        self.assertContains(respuesta, 'Visitantes Únicos')
+
+
+# ============================================================================
+# 🛒 CARRITO EN COOKIE
+# ============================================================================
+
+class CarritoCookieTests(TestCase):
+
+    def setUp(self):
+        self.cafe = crear_producto(stock=5)
+
+    def carrito(self):
+        return Carrito._leer(self.client.cookies['carrito'].value)
+
+    def test_un_anonimo_agrega_sin_escribir_en_la_base(self):
+        with self.assertNumQueries(1):  # solo lee el producto
+            respuesta = self.client.post(reverse('productos:agregar_al_carrito', args=[self.cafe.pk]), {'cantidad': 2})
+        self.assertRedirects(respuesta, reverse('productos:ver_carrito'), fetch_redirect_response=False)
+        self.assertEqual(self.carrito().items, {self.cafe.pk: (2, Decimal('100.00'))})
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_cantidad_invalida_no_rompe(self):
+        url = reverse('productos:agregar_al_carrito', args=[self.cafe.pk])
+        for cantidad in ('dos', '', '0'):
+            respuesta = self.client.post(url, {'cantidad': cantidad})
+            self.assertRedirects(
+                respuesta, reverse('productos:detalle_producto', args=[self.cafe.pk]), fetch_redirect_response=False
+            )
+
+        self.client.post(url, {'cantidad': 1})
+        respuesta = self.client.post(
+            reverse('productos:actualizar_cantidad_carrito', args=[self.cafe.pk]), {'cantidad': 'muchos'}
+        )
+        self.assertRedirects(respuesta, reverse('productos:ver_carrito'), fetch_redirect_response=False)
+        self.assertEqual(self.carrito().cantidad(self.cafe.pk), 1)
+
+    def test_una_cookie_modificada_es_un_carrito_vacio(self):
+        self.client.post(reverse('productos:agregar_al_carrito', args=[self.cafe.pk]), {'cantidad': 1})
+        valor = self.client.cookies['carrito'].value
+        self.assertEqual(len(Carrito._leer(valor[:-2] + 'xx')), 0)
+        self.assertEqual(len(Carrito._leer('basura')), 0)
+
+    def test_el_carrito_pendiente_de_la_base_pasa_a_la_cookie(self):
+        comprador = crear_usuario()
+        pendiente = Pedido.objects.create(usuario=comprador)
+        ItemPedido.objects.create(pedido=pendiente, producto=self.cafe, cantidad=3, precio_unitario=Decimal('90'))
+
+        self.client.force_login(comprador)
+        self.client.get(reverse('productos:ver_carrito'))
+        self.assertFalse(Pedido.objects.filter(pk=pendiente.pk).exists())
+        self.assertEqual(self.carrito().items, {self.cafe.pk: (3, Decimal('90'))})
+
+
+# ============================================================================
+# 🔎 BÚSQUEDA
+# ============================================================================
+
+class BusquedaTests(TestCase):
+
+    def setUp(self):
+        self.cafe = crear_producto(nombre='Café tostado', descripcion='Granos de Jamaica')
+        self.te = crear_producto(nombre='Té verde', descripcion='Hojas sueltas con aroma a café')
+
+    def test_busca_sin_tildes_y_por_prefijo_con_el_nombre_primero(self):
+        productos, total = buscar_productos('cafe')
+        self.assertEqual(productos, [self.cafe, self.te])
+        self.assertEqual(total, 2)
+        self.assertEqual(buscar_productos('jama')[0], [self.cafe])
+
+    def test_el_indice_sigue_los_cambios_de_los_productos(self):
+        self.te.nombre = 'Mate cocido'
+        self.te.descripcion = 'Yerba'
+        self.te.save()
+        self.assertEqual(buscar_productos('mate')[0], [self.te])
+        self.assertEqual(buscar_productos('verde'), ([], 0))
+
+        self.cafe.activo = False
+        self.cafe.save()
+        self.assertEqual(buscar_productos('cafe'), ([], 0))
+
+        pk = self.te.pk
+        self.te.delete()
+        self.assertNotIn(pk, get_backend().buscar_ids('mate', solo_activos=False))
+
+    def test_paginas_y_total(self):
+        for n in range(5):
+            crear_producto(nombre=f'Café molido {n}')
+        productos, total = buscar_productos('cafe', limite=3, desplazamiento=3)
+        self.assertEqual(len(productos), 3)
+        self.assertEqual(total, 7)
+
+    def test_la_busqueda_del_admin_no_tiene_limite(self):
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Yerba {n}', precio=10, descripcion='x', activo=n % 2 == 0) for n in range(1010)
+        ])
+        call_command('reindexar_busqueda', stdout=StringIO())
+        modelo_admin = ProductoAdmin(Producto, admin.site)
+        resultados, duplicados = modelo_admin.get_search_results(None, Producto.objects.all(), 'yerba')
+        self.assertEqual(resultados.count(), 1010)
+        self.assertFalse(duplicados)
+
+    def test_sin_backend_para_el_motor_busca_sin_indice(self):
+        with mock.patch('productos.busqueda._backend', None), \
+                mock.patch('productos.busqueda.connection', mock.Mock(vendor='oracle')), \
+                self.assertLogs('productos.busqueda', 'WARNING'):
+            backend = get_backend()
+            self.assertIsInstance(backend, BackendSinIndice)
+            with mock.patch('productos.busqueda.get_backend', return_value=backend), \
+                    mock.patch('productos.signals.get_backend', return_value=backend):
+                yerba = crear_producto(nombre='Yerba mate')  # guardar no falla
+                self.assertEqual(buscar_productos('yerba'), ([yerba], 1))
+                self.assertEqual(
+                    list(backend.filtrar(Producto.objects.all(), 'café')), [self.te, self.cafe]
+                )
+
+
+# ============================================================================
+# ⌨️ AUTOCOMPLETADO
+# ============================================================================
+
+class AutocompletarTests(TestCase):
+
+    def setUp(self):
+        self.cafe = crear_producto(nombre='Café tostado')
+        self.tostadora = crear_producto(nombre='Tostadora eléctrica')
+        crear_producto(nombre='Café viejo', activo=False)
+        indice_autocompletar.construir()
+        self.addCleanup(setattr, indice_autocompletar, '_construido_en', None)
+
+    def nombres(self, prefijo):
+        return [s['nombre'] for s in indice_autocompletar.sugerir(prefijo)]
+
+    def test_sugiere_por_prefijo_con_los_inicios_de_nombre_primero(self):
+        self.assertEqual(self.nombres('cafe'), ['Café tostado'])
+        self.assertEqual(self.nombres('TOST'), ['Tostadora eléctrica', 'Café tostado'])
+        self.assertEqual(self.nombres('cafe tos'), ['Café tostado'])
+        self.assertEqual(self.nombres('!!'), [])
+
+    def test_se_actualiza_al_confirmar_la_transaccion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_producto(nombre='Cafetera italiana')
+            self.cafe.delete()
+        self.assertEqual(self.nombres('cafe'), ['Cafetera italiana'])
+
+    def test_un_cambio_revertido_no_llega_al_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    crear_producto(nombre='Cafetera italiana')
+                    self.cafe.delete()
+                    raise RuntimeError('revertir')
+            except RuntimeError:
+                pass
+        self.assertEqual(self.nombres('cafe'), ['Café tostado'])
+
+    def test_la_vista_responde_sin_consultar_la_base(self):
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(reverse('productos:autocompletar'), {'q': 'caf'})
+        self.assertEqual(respuesta.json()['sugerencias'], [{
+            'id': self.cafe.pk, 'nombre': 'Café tostado',
+            'url': reverse('productos:detalle_producto', args=[self.cafe.pk]),
+        }])
+
+
+# ============================================================================
+# 👆 CLICKS DE AFILIADO
+# ============================================================================
+
+class BufferClicksTests(TestCase):
+
+    def setUp(self):
+        self.afiliado = crear_usuario('afiliado')
+        self.cafe = crear_producto()
+        # Sin hilo de fondo: el test vacía la cola a mano
+        arrancar = mock.patch.object(BufferClicks, '_arrancar')
+        arrancar.start()
+        self.addCleanup(arrancar.stop)
+        self.buffer = BufferClicks()
+
+    def test_agregar_no_escribe_y_vaciar_guarda_por_lotes(self):
+        with self.assertNumQueries(0):
+            for n in range(5):
+                self.buffer.agregar(self.afiliado.pk, self.cafe.pk, f'visitante-{n % 2}')
+        self.assertEqual(self.buffer.vaciar(), 5)
+        self.assertEqual(ClickAfiliado.objects.filter(afiliado=self.afiliado).count(), 5)
+        self.assertEqual(visitantes.visitantes_por_producto(self.afiliado), ({self.cafe.pk: 2}, 2))
+        self.assertEqual(self.buffer.pendientes(), 0)
+
+    @override_settings(CLICKS_MAXIMO=3)
+    def test_la_cola_descarta_los_mas_viejos(self):
+        buffer = BufferClicks()
+        for n in range(5):
+            buffer.agregar(self.afiliado.pk, self.cafe.pk, f'visitante-{n}')
+        self.assertEqual((buffer.pendientes(), buffer.descartados), (3, 2))
+        buffer.vaciar()
+        self.assertEqual(
+            sorted(ClickAfiliado.objects.values_list('visitante', flat=True)),
+            ['visitante-2', 'visitante-3', 'visitante-4'],
+        )
+
+    def test_si_fallan_los_sketches_los_clicks_quedan_guardados(self):
+        self.buffer.agregar(self.afiliado.pk, self.cafe.pk, 'visitante')
+        with mock.patch('productos.visitantes.acumular', side_effect=DatabaseError('bloqueada')), \
+                self.assertLogs('productos.clics', 'WARNING') as logs:
+            self.assertEqual(self.buffer.vaciar(), 1)
+        self.assertIn('no se sumaron sus visitantes', logs.output[0])
+        self.assertEqual(ClickAfiliado.objects.count(), 1)
+
+    def test_un_lote_que_no_se_puede_guardar_se_descarta(self):
+        self.buffer.agregar(self.afiliado.pk, self.cafe.pk, 'visitante')
+        with mock.patch.object(ClickAfiliado.objects, 'bulk_create', side_effect=DatabaseError('caída')), \
+                mock.patch('productos.visitantes.acumular') as acumular, \
+                self.assertLogs('productos.clics', 'WARNING') as logs:
+            self.assertEqual(self.buffer.vaciar(), 0)
+        acumular.assert_not_called()
+        self.assertIn('No se pudieron guardar 1 clicks', logs.output[0])
+        self.assertEqual(self.buffer.pendientes(), 0)
+
+
+# ============================================================================
+# 📄 CATÁLOGO CON CURSOR
+# ============================================================================
+
+class PaginacionCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        precios = [30, 10, 20, 10, 30, 20, 10]
+        for n, precio in enumerate(precios):
+            crear_producto(nombre=f'Producto {n % 4}', precio=precio)
+        crear_producto(nombre='Inactivo', activo=False)
+
+    def esperado(self, orden):
+        campo, descendente = ORDENES[orden]
+        productos = list(productos_catalogo())
+        return sorted(productos, key=lambda p: (getattr(p, campo), p.pk), reverse=descendente)
+
+    def recorrer(self, orden, tamano=3):
+        """Todas las páginas hacia adelante y, desde la última, de vuelta hacia atrás"""
+        adelante, cursor = [], None
+        while True:
+            pagina = paginar_catalogo(productos_catalogo(), orden, cursor, tamano)
+            adelante.append(list(pagina))
+            if not pagina.tiene_siguiente:
+                break
+            cursor = pagina.cursor_siguiente
+        atras = [list(pagina)]
+        while pagina.tiene_anterior:
+            pagina = paginar_catalogo(productos_catalogo(), orden, pagina.cursor_anterior, tamano)
+            atras.insert(0, list(pagina))
+        return adelante, atras
+
+    def test_los_cuatro_ordenes_recorren_todo_sin_repetir(self):
+        for orden in ORDENES:
+            with self.subTest(orden=orden):
+                adelante, atras = self.recorrer(orden)
+                self.assertEqual([p for pagina in adelante for p in pagina], self.esperado(orden))
+                self.assertEqual([len(pagina) for pagina in adelante], [3, 3, 1])
+                self.assertEqual(atras, adelante)
+
+    def test_la_primera_pagina_no_tiene_anterior(self):
+        pagina = paginar_catalogo(productos_catalogo(), 'precio-menor', None, 3)
+        self.assertFalse(pagina.tiene_anterior)
+        self.assertTrue(pagina.tiene_siguiente)
+
+    def test_cursor_codificado_y_decodificado(self):
+        producto = Producto.objects.filter(activo=True).first()
+        for orden, (campo, _) in ORDENES.items():
+            with self.subTest(orden=orden):
+                cursor = codificar_cursor(producto, orden, 'sig')
+                self.assertEqual(decodificar_cursor(cursor, orden), ('sig', getattr(producto, campo), producto.pk))
+
+    def test_un_cursor_manipulado_lleva_a_la_primera_pagina(self):
+        primera = list(paginar_catalogo(productos_catalogo(), 'recientes', None, 3))
+        otra_direccion = base64.urlsafe_b64encode(b'["otra","2025-01-01T00:00:00",1]').decode()
+        for cursor in ('basura', otra_direccion, codificar_cursor(primera[0], 'recientes', 'sig')[:-4]):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decodificar_cursor(cursor, 'recientes'))
+                self.assertEqual(list(paginar_catalogo(productos_catalogo(), 'recientes', cursor, 3)), primera)
+        # Un cursor de otro orden (precio en lugar de fecha) tampoco sirve
+        cursor = codificar_cursor(primera[0], 'precio-menor', 'sig')
+        self.assertIsNone(decodificar_cursor(cursor, 'recientes'))
+
+    @override_settings(CATALOGO_TAMANO_PAGINA=3)
+    def test_la_vista_pagina_con_el_cursor(self):
+        respuesta = self.client.get(reverse('productos:home'), {'orden': 'precio-menor'})
+        self.assertEqual(respuesta.status_code, 200)
+        pagina = respuesta.context['pagina']
+        respuesta = self.client.get(reverse('productos:home'), {'orden': 'precio-menor', 'cursor': pagina.cursor_siguiente})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(set(respuesta.context['productos']).isdisjoint(pagina.productos))
+
+
+# ============================================================================
+# 🧩 TARJETAS CACHEADAS
+# ============================================================================
+
+class TarjetasCacheadasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cafe = crear_producto()
+
+    def test_la_segunda_vez_sale_de_la_cache(self):
+        with mock.patch('productos.fragmentos.render_to_string', wraps=render_to_string) as renderizar:
+            primera = html_tarjeta(self.cafe, 'catalogo')
+            segunda = html_tarjeta(self.cafe, 'catalogo')
+        self.assertEqual(renderizar.call_count, 1)
+        self.assertEqual(primera, segunda)
+        self.assertIn('Café tostado', primera)
+        self.assertIn(MARCA_ACCIONES, primera)
+
+    def test_un_producto_modificado_se_vuelve_a_renderizar(self):
+        html_tarjeta(self.cafe, 'catalogo')
+        # Otra copia del producto con la fecha nueva (la clave sigue en la caché)
+        Producto.objects.filter(pk=self.cafe.pk).update(nombre='Café molido', fecha_actualizacion=timezone.now())
+        self.assertIn('Café molido', html_tarjeta(Producto.objects.get(pk=self.cafe.pk), 'catalogo'))
+
+    def test_las_senales_borran_todas_las_variantes(self):
+        for variante in VARIANTES:
+            html_tarjeta(self.cafe, variante)
+        self.cafe.nombre = 'Café molido'
+        self.cafe.save()
+        self.assertEqual(cache.get_many([clave_tarjeta(self.cafe.pk, v) for v in VARIANTES]), {})
+
+    def test_las_acciones_del_usuario_no_se_cachean(self):
+        plantilla = Template(
+            "{% load tarjetas %}{% tarjeta_producto producto 'catalogo' %}"
+            "<b>{{ usuario }}</b>{% endtarjeta_producto %}"
+        )
+        ana = plantilla.render(Context({'producto': self.cafe, 'usuario': 'ana'}))
+        beto = plantilla.render(Context({'producto': self.cafe, 'usuario': 'beto'}))
+        self.assertIn('<b>ana</b>', ana)
+        self.assertIn('<b>beto</b>', beto)
+        self.assertNotIn(MARCA_ACCIONES, beto)
+        self.assertNotIn('ana', cache.get(clave_tarjeta(self.cafe.pk, 'catalogo'))[1])
+
+    def test_variante_desconocida(self):
+        with self.assertRaises(ValueError):
+            html_tarjeta(self.cafe, 'otra')
+
+
+# ============================================================================
+# 🧮 TOTALES DEL CATÁLOGO
+# ============================================================================
+
+class TotalesCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        crear_producto()
+        crear_producto(nombre='Curso de barismo', tipo_producto='DIGITAL')
+
+    def test_una_consulta_y_despues_sale_de_la_cache(self):
+        with self.assertNumQueries(1):
+            totales = contar_productos_por_tipo()
+        with self.assertNumQueries(0):
+            self.assertEqual(contar_productos_por_tipo(), totales)
+        self.assertEqual((totales['total'], totales['fisicos'], totales['digitales']), (2, 1, 1))
+
+    def test_se_invalidan_al_confirmar_un_cambio(self):
+        contar_productos_por_tipo()
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_producto(nombre='Té verde')
+        self.assertEqual(contar_productos_por_tipo()['fisicos'], 2)
+
+    def test_landing_anonima_sale_de_la_cache(self):
+        self.client.get(reverse('landing_page'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('landing_page'))
+        self.assertContains(response, '2 productos disponibles para afiliación')
+
+
+# ============================================================================
+# 📄 CACHÉ DE PÁGINAS ANÓNIMAS
+# ============================================================================
+
+class CachePaginasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.llamadas = 0
+        self.cookie = False
+
+        @cachear_pagina_anonima('prueba')
+        def vista(request):
+            self.llamadas += 1
+            response = HttpResponse(f'<p>pagina {self.llamadas}</p>')
+            if self.cookie:
+                response.set_cookie('visto', '1')
+            return response
+        self.vista = vista
+
+    def pedir(self, usuario=None, **extra):
+        request = RequestFactory().get('/prueba/?ref=abc', **extra)
+        request.user = usuario or AnonymousUser()
+        return self.vista(request)
+
+    def test_los_anonimos_reciben_la_copia_guardada(self):
+        primera = self.pedir()
+        with self.assertNumQueries(0):
+            segunda = self.pedir()
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(segunda.content, primera.content)
+
+    def test_no_cachea_para_usuarios_logueados(self):
+        usuario = crear_usuario()
+        self.pedir(usuario)
+        self.pedir(usuario)
+        self.assertEqual(self.llamadas, 2)
+
+    def test_no_cachea_con_mensajes_pendientes(self):
+        request = RequestFactory().get('/prueba/')
+        request.user = AnonymousUser()
+        request._messages = ['Producto agregado']
+        self.vista(request)
+        self.vista(request)
+        self.assertEqual(self.llamadas, 2)
+
+    def test_no_guarda_respuestas_que_dejan_cookies(self):
+        self.cookie = True
+        self.pedir()
+        self.pedir()
+        self.assertEqual(self.llamadas, 2)
+
+    def test_un_cambio_de_producto_invalida_las_paginas(self):
+        self.pedir()
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_producto()
+        self.assertContains(self.pedir(), 'pagina 2')
+
+    @override_settings(PAGINAS_CACHE_GZIP=True)
+    def test_entrega_gzip_a_quien_lo_acepta(self):
+        self.pedir()
+        comprimida = self.pedir(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(comprimida['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(comprimida.content), b'<p>pagina 1</p>')
+        self.assertIn('Accept-Encoding', comprimida['Vary'])
+
+        plana = self.pedir()
+        self.assertFalse(plana.has_header('Content-Encoding'))
+        self.assertEqual(plana.content, b'<p>pagina 1</p>')
+
+
+# ============================================================================
+# 🧭 FACETAS DEL CATÁLOGO
+# ============================================================================
+
+class FacetasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cafe = crear_producto(precio=30000, stock=10)
+        self.yerba = crear_producto(nombre='Yerba mate', precio=100000, stock=3)
+        self.curso = crear_producto(nombre='Curso de barismo', precio=500000, stock=0, tipo_producto='DIGITAL')
+        crear_producto(nombre='Té viejo', precio=30000, activo=False)
+
+    def cantidades(self, resultado, faceta):
+        return {opcion['valor']: opcion['cantidad'] for opcion in resultado[faceta]}
+
+    def test_leer_filtros_descarta_valores_desconocidos(self):
+        filtros = facetas.leer_filtros({'tipo': 'FISICO', 'precio': 'gratis', 'stock': 'pocas', 'otro': '1'})
+        self.assertEqual(filtros, {'tipo': 'FISICO', 'stock': 'pocas'})
+
+    def test_filtrar(self):
+        qs = productos_catalogo()
+        self.assertEqual(list(facetas.filtrar(qs, {'precio': 'hasta-50k'})), [self.cafe])
+        self.assertEqual(list(facetas.filtrar(qs, {'stock': 'pocas'})), [self.yerba])
+        # Los digitales no tienen stock: siempre cuentan como disponibles
+        self.assertCountEqual(facetas.filtrar(qs, {'stock': 'disponible'}), [self.cafe, self.curso])
+
+    def test_cada_faceta_ignora_su_propio_filtro(self):
+        resultado = facetas.calcular_facetas({'tipo': 'FISICO'})
+        self.assertEqual(self.cantidades(resultado, 'tipo'), {'FISICO': 2, 'DIGITAL': 1})
+        self.assertEqual(
+            self.cantidades(resultado, 'precio'),
+            {'hasta-50k': 1, '50k-200k': 1, '200k-1m': 0, 'mas-1m': 0},
+        )
+        self.assertEqual(resultado['stock_total'], 2)
+        activo = next(o for o in resultado['tipo'] if o['valor'] == 'FISICO')
+        self.assertTrue(activo['activo'])
+        self.assertEqual(activo['url'], '')
+
+    def test_una_consulta_para_cualquier_combinacion_de_filtros(self):
+        with self.assertNumQueries(1):
+            facetas.calcular_facetas({})
+            facetas.calcular_facetas({'tipo': 'DIGITAL', 'stock': 'disponible'})
+
+    def test_se_invalidan_al_confirmar_un_cambio(self):
+        facetas.calcular_facetas({})
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_producto(nombre='Termo', precio=2000000)
+        self.assertEqual(self.cantidades(facetas.calcular_facetas({}), 'precio')['mas-1m'], 1)
+
+    def test_query_string_en_orden_fijo(self):
+        self.assertEqual(
+            facetas.query_string({'stock': 'pocas', 'tipo': 'FISICO'}, 'precio'),
+            'tipo=FISICO&stock=pocas&orden=precio',
+        )
+
+
+# ============================================================================
+# 🖼️ VARIANTES DE IMAGEN
+# ============================================================================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class VariantesImagenTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.producto = crear_producto(imagen=imagen_subida('cafe.png', (1600, 1200)))
+        self.nombre = self.producto.imagen.name
+
+    def test_genera_cada_variante_en_webp_y_jpeg(self):
+        manifiesto = generar_variantes(self.nombre)
+        self.assertEqual(set(manifiesto['variantes']), {'thumb', 'card', 'detalle'})
+        card = manifiesto['variantes']['card']
+        self.assertEqual((card['ancho'], card['alto']), (640, 448))
+        detalle = manifiesto['variantes']['detalle']
+        self.assertEqual((detalle['ancho'], detalle['alto']), (1200, 900))
+        with default_storage.open(card['webp']) as archivo:
+            self.assertEqual(Image.open(archivo).format, 'WEBP')
+
+    def test_guardar_el_producto_encola_la_tarea(self):
+        self.assertTrue(Tarea.objects.filter(nombre=tareas.generar_variantes_imagen.nombre).exists())
+        Tarea.objects.all().delete()
+        self.producto.save(update_fields=['precio'])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_el_manifiesto_sale_de_la_cache(self):
+        generar_variantes(self.nombre)
+        with mock.patch('productos.imagenes.generar_variantes') as generar:
+            with mock.patch('productos.imagenes.default_storage.open') as abrir:
+                obtener_manifiesto(self.nombre)
+        generar.assert_not_called()
+        abrir.assert_not_called()
+
+    def test_sin_cache_lee_el_manifiesto_del_disco(self):
+        generar_variantes(self.nombre)
+        cache.clear()
+        with mock.patch('productos.imagenes.generar_variantes') as generar:
+            self.assertIsNotNone(obtener_manifiesto(self.nombre))
+        generar.assert_not_called()
+
+    def test_urls_y_srcset(self):
+        url = url_variante(self.producto.imagen, 'card', 'webp')
+        self.assertTrue(url.endswith('_card.webp'))
+        self.assertRegex(
+            srcset(self.producto.imagen, ['card', 'detalle'], 'jpg'),
+            r'^\S+_card\.jpg 640w, \S+_detalle\.jpg 1200w$',
+        )
+
+    def test_una_imagen_rota_usa_la_original(self):
+        nombre = default_storage.save('productos/rota.png', ContentFile(b'no es una imagen'))
+        self.producto.imagen.name = nombre
+        self.assertEqual(url_variante(self.producto.imagen, 'card'), self.producto.imagen.url)
+        self.assertEqual(srcset(self.producto.imagen, ['card'], 'jpg'), '')
+        # El fallo se recuerda: no se vuelve a intentar en cada request
+        with mock.patch('productos.imagenes.generar_variantes') as generar:
+            url_variante(self.producto.imagen, 'card')
+        generar.assert_not_called()
+
+
+# ============================================================================
+# 🧾 COMPROBANTES DE PAGO
+# ============================================================================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), COMPROBANTE_LADO_MAXIMO=1000, COMPROBANTE_LADO_PREVIEW=200)
+class ComprobantesTests(TestCase):
+
+    def test_achica_y_pasa_a_jpeg_con_vista_previa(self):
+        comprobante, preview = comprimir_comprobante(imagen_subida(tamano=(3000, 1500)), 'comprobantes/foto.png')
+        self.assertEqual(comprobante.name, 'foto.jpg')
+        for archivo, tamano in ((comprobante, (1000, 500)), (preview, (200, 100))):
+            imagen = Image.open(archivo)
+            self.assertEqual((imagen.format, imagen.size), ('JPEG', tamano))
+
+    def test_un_archivo_que_no_es_imagen_se_deja_como_esta(self):
+        archivo = BytesIO(b'%PDF-1.4 no soy una imagen')
+        archivo.read(4)
+        self.assertIsNone(comprimir_comprobante(archivo, 'comprobante.pdf'))
+        self.assertEqual(archivo.tell(), 0)
+
+    def test_el_pedido_guarda_el_comprobante_comprimido(self):
+        pedido = Pedido.objects.create(usuario=crear_usuario(), comprobante_pago=imagen_subida(tamano=(2000, 2000)))
+        self.assertTrue(pedido.comprobante_pago.name.endswith('.jpg'))
+        self.assertEqual(Image.open(pedido.comprobante_pago).size, (1000, 1000))
+        self.assertTrue(pedido.comprobante_preview)
+
+    def test_comando_comprime_los_comprobantes_viejos(self):
+        pedido = Pedido.objects.create(usuario=crear_usuario())
+        viejo = default_storage.save('comprobantes/viejo.png', imagen_subida(tamano=(2000, 1000)))
+        Pedido.objects.filter(pk=pedido.pk).update(comprobante_pago=viejo)
+
+        salida = StringIO()
+        call_command('comprimir_comprobantes', stdout=salida)
+
+        pedido.refresh_from_db()
+        self.assertIn('1 comprobantes comprimidos', salida.getvalue())
+        self.assertTrue(pedido.comprobante_pago.name.endswith('.jpg'))
+        self.assertTrue(pedido.comprobante_preview)
+        self.assertFalse(default_storage.exists(viejo))
+
+
+# ============================================================================
+# 🔗 CÓDIGOS DE REFERIDO
+# ============================================================================
+
+class CacheLRUTests(TestCase):
+
+    def test_descarta_la_usada_hace_mas_tiempo(self):
+        lru = CacheLRU(capacidad=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        self.assertEqual(len(lru), 2)
+
+    def test_las_entradas_vencen(self):
+        lru = CacheLRU(ttl=10)
+        with mock.patch('productos.lru.time.monotonic', return_value=100):
+            lru.set('a', 1)
+        with mock.patch('productos.lru.time.monotonic', return_value=105):
+            self.assertIn('a', lru)
+        with mock.patch('productos.lru.time.monotonic', return_value=111):
+            self.assertNotIn('a', lru)
+
+    def test_delete_si(self):
+        lru = CacheLRU()
+        for i in range(5):
+            lru.set(i, i * 10)
+        lru.delete_si(lambda clave, valor: valor >= 30)
+        self.assertEqual(len(lru), 3)
+
+
+class ReferidosTests(TestCase):
+
+    def setUp(self):
+        referidos._codigos.clear()
+        referidos.invalidar_afiliaciones()
+        self.afiliado = crear_usuario('ana')
+        self.producto = crear_producto()
+        self.producto.afiliados.add(self.afiliado)
+
+    def test_resuelve_por_username_o_por_id(self):
+        esperado = (self.afiliado.pk, 'ana')
+        self.assertEqual(referidos.resolver_codigo('ana'), esperado)
+        self.assertEqual(referidos.resolver_codigo(str(self.afiliado.pk)), esperado)
+        self.assertIsNone(referidos.resolver_codigo(''))
+
+    def test_la_segunda_visita_no_consulta_la_base(self):
+        referidos.afiliado_referido(self.producto, 'ana')
+        referidos.afiliado_referido(self.producto, 'inventado')
+        with self.assertNumQueries(0):
+            self.assertEqual(referidos.afiliado_referido(self.producto, 'ana').id, self.afiliado.pk)
+            self.assertIsNone(referidos.afiliado_referido(self.producto, 'inventado'))
+
+    def test_desafiliarse_invalida_la_cache(self):
+        self.assertIsNotNone(referidos.afiliado_referido(self.producto, 'ana'))
+        self.producto.afiliados.remove(self.afiliado)
+        self.assertIsNone(referidos.afiliado_referido(self.producto, 'ana'))
+        self.afiliado.productos_afiliados.add(self.producto)
+        self.assertIsNotNone(referidos.afiliado_referido(self.producto, 'ana'))
+
+    def test_un_usuario_nuevo_o_renombrado_invalida_sus_codigos(self):
+        self.assertIsNone(referidos.resolver_codigo('beto'))
+        beto = crear_usuario('beto')
+        self.assertEqual(referidos.resolver_codigo('beto').id, beto.pk)
+
+        self.afiliado.username = 'ana_maria'
+        self.afiliado.save()
+        self.assertIsNone(referidos.resolver_codigo('ana'))
+        self.assertEqual(referidos.resolver_codigo(str(self.afiliado.pk)).username, 'ana_maria')
+
+
+# ============================================================================
+# 🍪 COOKIE DE ATRIBUCIÓN
+# ============================================================================
+
+class AtribucionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        referidos._codigos.clear()
+        referidos.invalidar_afiliaciones()
+        self.afiliado = crear_usuario('ana')
+        self.producto = crear_producto()
+        self.producto.afiliados.add(self.afiliado)
+        self.url = reverse('productos:detalle_producto', args=[self.producto.pk])
+
+    def request_con_cookie(self):
+        request = RequestFactory().get('/')
+        request.COOKIES = {nombre: cookie.value for nombre, cookie in self.client.cookies.items()}
+        return request
+
+    def test_el_link_del_afiliado_deja_la_cookie(self):
+        response = self.client.get(self.url, {'ref': 'ana'})
+        self.assertIn('atribucion_afiliado', response.cookies)
+        self.assertTrue(response.cookies['atribucion_afiliado']['httponly'])
+        request = self.request_con_cookie()
+        self.assertEqual(afiliado_para(request, self.producto.pk), self.afiliado.pk)
+        self.assertIsNone(afiliado_para(request, self.producto.pk + 1))
+
+    def test_tambien_con_la_pagina_cacheada(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, {'ref': 'ana'})
+        self.assertIn('atribucion_afiliado', response.cookies)
+
+    def test_ref_de_alguien_no_afiliado(self):
+        crear_usuario('beto')
+        response = self.client.get(self.url, {'ref': 'beto'})
+        self.assertNotIn('atribucion_afiliado', response.cookies)
+
+    def test_una_cookie_modificada_se_ignora(self):
+        self.client.get(self.url, {'ref': 'ana'})
+        valor = self.client.cookies['atribucion_afiliado'].value
+        self.client.cookies['atribucion_afiliado'] = valor.replace(f'{self.afiliado.pk}:', '999:', 1)
+        self.assertIsNone(leer_atribucion(self.request_con_cookie()))
+
+    @override_settings(ATRIBUCION_TTL=60)
+    def test_la_cookie_vence(self):
+        self.client.get(self.url, {'ref': 'ana'})
+        request = self.request_con_cookie()
+        self.assertIsNotNone(leer_atribucion(request))
+        with mock.patch('django.core.signing.time.time', return_value=datetime.now().timestamp() + 120):
+            self.assertIsNone(leer_atribucion(request))
+
+
+# ============================================================================
+# ✂️ LINKS CORTOS
+# ============================================================================
+
+class LinksCortosTests(TestCase):
+
+    def setUp(self):
+        links._destinos.clear()
+        self.afiliado = crear_usuario('ana')
+        self.producto = crear_producto()
+        self.producto.afiliados.add(self.afiliado)
+        self.link = LinkCorto.objects.get(afiliado=self.afiliado, producto=self.producto)
+        self.url = reverse('link_corto', args=[self.link.codigo])
+
+    def test_afiliarse_crea_el_link_una_sola_vez(self):
+        self.assertRegex(self.link.codigo, r'^[0-9A-Za-z]{7}$')
+        links.crear_links([self.afiliado.pk], [self.producto.pk])
+        self.assertEqual(LinkCorto.objects.get().codigo, self.link.codigo)
+
+    def test_reintenta_si_el_codigo_ya_existe(self):
+        otro = crear_producto(nombre='Yerba mate')
+        codigos = iter([self.link.codigo, 'Yerba01'])
+        with mock.patch('productos.links.generar_codigo', side_effect=lambda: next(codigos)):
+            otro.afiliados.add(self.afiliado)
+        self.assertEqual(LinkCorto.objects.get(producto=otro).codigo, 'Yerba01')
+
+    def test_redirige_al_detalle_con_ref(self):
+        response = self.client.get(self.url)
+        destino = reverse('productos:detalle_producto', args=[self.producto.pk]) + '?ref=ana'
+        self.assertRedirects(response, destino, fetch_redirect_response=False)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_codigo_inexistente(self):
+        self.assertEqual(self.client.get(reverse('link_corto', args=['nada123'])).status_code, 404)
+
+    def test_renombrar_al_afiliado_actualiza_el_destino(self):
+        self.client.get(self.url)
+        self.afiliado.username = 'ana_maria'
+        self.afiliado.save()
+        self.assertTrue(self.client.get(self.url)['Location'].endswith('?ref=ana_maria'))
+
+    def test_borrar_el_link_lo_invalida(self):
+        self.client.get(self.url)
+        self.link.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_links_de_solo_afiliaciones_vigentes(self):
+        self.assertEqual(list(links.links_de(self.afiliado)), [self.link])
+        self.producto.afiliados.remove(self.afiliado)
+        self.assertEqual(list(links.links_de(self.afiliado)), [])
+
+
+# ============================================================================
+# 🔳 CÓDIGOS QR
+# ============================================================================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QRLinksTests(TestCase):
+
+    def setUp(self):
+        self.afiliado = crear_usuario('ana')
+        for nombre in ('Café tostado', 'Yerba mate'):
+            crear_producto(nombre=nombre).afiliados.add(self.afiliado)
+        self.link = LinkCorto.objects.filter(afiliado=self.afiliado).first()
+        self.client.force_login(self.afiliado)
+
+    def test_el_mismo_contenido_da_el_mismo_archivo(self):
+        nombre = qr.obtener_qr('http://testserver/r/abc1234/', 'png')
+        with mock.patch('productos.qr._generar') as generar:
+            self.assertEqual(qr.obtener_qr('http://testserver/r/abc1234/', 'png'), nombre)
+        generar.assert_not_called()
+        self.assertNotEqual(qr.obtener_qr('http://testserver/r/xyz9876/', 'png'), nombre)
+
+    def test_descarga_png_inmutable(self):
+        response = self.client.get(reverse('productos:qr_link_afiliado', args=[self.link.codigo, 'png']))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(b''.join(response.streaming_content))).format, 'PNG')
+
+    def test_solo_los_links_propios(self):
+        self.client.force_login(crear_usuario('beto'))
+        response = self.client.get(reverse('productos:qr_link_afiliado', args=[self.link.codigo, 'png']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_sin_la_libreria_responde_404(self):
+        with mock.patch.object(qr, 'DISPONIBLE', False):
+            response = self.client.get(reverse('productos:qr_links_zip'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_el_zip_se_envia_por_partes(self):
+        response = self.client.get(reverse('productos:qr_links_zip'), {'formato': 'svg'})
+        self.assertTrue(response.streaming)
+        partes = list(response.streaming_content)
+        self.assertGreater(len(partes), 2)
+        with zipfile.ZipFile(BytesIO(b''.join(partes))) as zf:
+            nombres = zf.namelist()
+            self.assertEqual(len(nombres), 2)
+            self.assertTrue(all(n.endswith('.svg') for n in nombres))
+            self.assertIn(b'<svg', zf.read(nombres[0]))
@@ -7,6 +7,12 @@ urlpatterns = [
     # Página principal de productos
     path('', views.home_tienda, name='home'),
 
+    # Búsqueda de productos (índice de texto completo)
+    path('buscar/', views.buscar, name='buscar'),
+
+    # Autocompletado de nombres (JSON, índice en memoria)
+    path('autocompletar/', views.autocompletar, name='autocompletar'),
+
     # Página de afiliación
     path('afiliarme/', views.afiliarme, name='afiliarme'),
 
@@ -29,6 +35,10 @@ urlpatterns = [
     # Mis links de afiliado
     path('mis-links/', views.mis_links_afiliado, name='mis_links_afiliado'),
 
+    # QR de los links (uno por link o todos en un .zip)
+    path('mis-links/qr/<str:codigo>.<str:formato>', views.qr_link_afiliado, name='qr_link_afiliado'),
+    path('mis-links/qr.zip', views.qr_links_zip, name='qr_links_zip'),
+
     # Editar perfil de vendedor/afiliado
     path('editar-perfil/', views.editar_perfil_vendedor, name='editar_perfil_vendedor'),
 
@@ -45,10 +55,10 @@ urlpatterns = [
     path('carrito/agregar/<int:producto_id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
 
     # Actualizar cantidad en el carrito
-    path('carrito/actualizar/<int:item_id>/', views.actualizar_cantidad_carrito, name='actualizar_cantidad_carrito'),
+    path('carrito/actualizar/<int:producto_id>/', views.actualizar_cantidad_carrito, name='actualizar_cantidad_carrito'),
 
     # Eliminar del carrito
-    path('carrito/eliminar/<int:item_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
+    path('carrito/eliminar/<int:producto_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
 
     # Confirmar pedido
     path('carrito/confirmar/', views.confirmar_pedido, name='confirmar_pedido'),
@@ -1,34 +1,116 @@
+import logging
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.urls import reverse
-from django.http import HttpResponse
-from django.core.mail import send_mail
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.conf import settings
 from django.db import transaction
-from django.utils import timezone
-from .models import Producto, Pedido, ItemPedido, ConfiguracionPagos
+from django.db.models import Count
+from django.utils.cache import patch_cache_control
+from django.utils.text import slugify
+from django.core.files.storage import default_storage
+from .models import Producto, Pedido, ConfiguracionPagos, ClickAfiliado, LinkCorto
 from .forms import ProductoForm
+from .catalogo import (
+    ORDENES, ORDEN_DEFAULT,
+    paginar_catalogo, productos_catalogo, contar_productos_por_tipo, get_tamano_pagina,
+)
+from . import busqueda, correos, facetas, inventario, links, qr, referidos, reservas, visitantes
+from .atribucion import registrar_atribucion, afiliado_para
+from .carrito import Carrito, maximo_items as maximo_items_carrito
+from .imagenes import procesar_comprobante
+from .cache_paginas import asegurar_cookie_csrf, cachear_pagina_anonima
+from .condicional import condicional_catalogo, condicional_detalle
+from .autocompletar import indice as indice_autocompletar
 from usuarios.decorators import datos_afiliacion_requeridos  # ← NUEVA IMPORTACIÓN
 
 
+logger = logging.getLogger(__name__)
+
+
+@condicional_catalogo
+@cachear_pagina_anonima('catalogo')
 def home_tienda(request):
     """
-    Vista para la página principal de la tienda,
-    separando productos físicos y digitales.
+    Vista para la página principal de la tienda.
+    El filtrado (tipo, rango de precio, stock), el orden y la paginación se
+    hacen en SQL (paginación por cursor), así cada página cuesta lo mismo sin
+    importar el tamaño del catálogo. Las facetas salen de una sola consulta
+    agrupada y cacheada (ver facetas.py).
     """
-    productos_fisicos = Producto.objects.filter(tipo_producto='FISICO', activo=True)
-    productos_digitales = Producto.objects.filter(tipo_producto='DIGITAL', activo=True)
+    filtros = facetas.leer_filtros(request.GET)
+    orden = request.GET.get('orden', ORDEN_DEFAULT)
+    if orden not in ORDENES:
+        orden = ORDEN_DEFAULT
+
+    pagina = paginar_catalogo(
+        facetas.filtrar(productos_catalogo(), filtros).con_afiliacion(request.user),
+        orden=orden,
+        cursor=request.GET.get('cursor'),
+    )
 
     context = {
-        'productos_fisicos': productos_fisicos,
-        'productos_digitales': productos_digitales
+        'pagina': pagina,
+        'productos': pagina.productos,
+        'tipo': filtros.get('tipo', ''),
+        'filtros': filtros,
+        'filtros_qs': facetas.query_string(filtros, orden),
+        'facetas': facetas.calcular_facetas(filtros, orden),
+        'orden': orden,
+        'totales': contar_productos_por_tipo(),
     }
 
     return render(request, 'productos/home.html', context)
 
 
+def buscar(request):
+    """
+    Búsqueda de productos por texto usando el índice de texto completo
+    (resultados ordenados por relevancia).
+    """
+    q = request.GET.get('q', '').strip()[:100]
+    try:
+        numero_pagina = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        numero_pagina = 1
+
+    tamano = get_tamano_pagina()
+    productos, total = [], 0
+    if q:
+        productos, total = busqueda.buscar_productos(
+            q,
+            limite=tamano,
+            desplazamiento=(numero_pagina - 1) * tamano,
+            queryset=Producto.objects.con_afiliacion(request.user),
+        )
+
+    context = {
+        'q': q,
+        'productos': productos,
+        'total': total,
+        'numero_pagina': numero_pagina,
+        'pagina_anterior': numero_pagina - 1 if numero_pagina > 1 else None,
+        'pagina_siguiente': numero_pagina + 1 if numero_pagina * tamano < total else None,
+    }
+
+    return render(request, 'productos/buscar.html', context)
+
+
+def autocompletar(request):
+    """
+    Sugerencias de nombres para el buscador mientras se escribe.
+    Se responden desde el índice en memoria, sin consultar la base de datos.
+    """
+    q = request.GET.get('q', '').strip()[:100]
+    sugerencias = indice_autocompletar.sugerir(q, limite=getattr(settings, 'AUTOCOMPLETAR_LIMITE', 8))
+    for sugerencia in sugerencias:
+        sugerencia['url'] = reverse('productos:detalle_producto', args=[sugerencia['id']])
+    return JsonResponse({'q': q, 'sugerencias': sugerencias})
+
+
 @login_required
 @datos_afiliacion_requeridos  # ← DECORADOR AGREGADO
 def afiliarme(request):
@@ -36,8 +118,12 @@ def afiliarme(request):
     Vista de la página de afiliación.
     REQUIERE: datos de afiliación completos.
     """
-    productos_fisicos = Producto.objects.filter(tipo_producto='FISICO', activo=True)
-    productos_digitales = Producto.objects.filter(tipo_producto='DIGITAL', activo=True)
+    productos_fisicos = Producto.objects.filter(
+        tipo_producto='FISICO', activo=True
+    ).con_afiliacion(request.user)
+    productos_digitales = Producto.objects.filter(
+        tipo_producto='DIGITAL', activo=True
+    ).con_afiliacion(request.user)
 
     context = {
         'productos_fisicos': productos_fisicos,
@@ -54,8 +140,8 @@ def mis_productos(request):
     y también los productos que creó como vendedor.
     NO requiere datos completos (solo muestra estado).
     """
-    productos_afiliados = request.user.productos_afiliados.all()
-    productos_creados = request.user.productos_creados.all()
+    productos_afiliados = request.user.productos_afiliados.con_afiliacion(request.user)
+    productos_creados = request.user.productos_creados.con_afiliacion(request.user)
 
     # Agregar información sobre estado de afiliación
     puede_afiliarse = (request.user.es_vendedor() and
@@ -82,7 +168,7 @@ def afiliar_producto(request, producto_id):
         producto = get_object_or_404(Producto, id=producto_id)
 
         # Verificar si ya está afiliado
-        if request.user in producto.afiliados.all():
+        if producto.tiene_afiliado(request.user):
             messages.warning(request, f'Ya estás afiliado a {producto.nombre}.')
         else:
             producto.afiliados.add(request.user)
@@ -103,7 +189,7 @@ def desafiliar_producto(request, producto_id):
     if request.method == 'POST':
         producto = get_object_or_404(Producto, id=producto_id)
 
-        if request.user in producto.afiliados.all():
+        if producto.tiene_afiliado(request.user):
             producto.afiliados.remove(request.user)
             messages.success(request, f'Te has desafiliado exitosamente de {producto.nombre}.')
         else:
@@ -133,6 +219,10 @@ def crear_producto(request):
     return render(request, "productos/crear_producto.html", {"form": form})
 
 
+@registrar_atribucion
+@asegurar_cookie_csrf
+@condicional_detalle
+@cachear_pagina_anonima('detalle')
 def detalle_producto(request, producto_id):
     """
     Vista de detalle de un producto con sistema de referencia simplificado
@@ -141,32 +231,12 @@ def detalle_producto(request, producto_id):
 
     # Obtener el parámetro 'ref' de la URL (username o user_id del afiliado)
     ref_code = request.GET.get('ref', None)
-    afiliado_referido = None
 
-    # Si hay código de referencia, buscar el usuario afiliado
-    if ref_code:
-        try:
-            # Intentar buscar por username
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            afiliado_referido = User.objects.get(username=ref_code)
-
-            # Verificar que el usuario esté afiliado al producto
-            if afiliado_referido not in producto.afiliados.all():
-                afiliado_referido = None
-        except User.DoesNotExist:
-            # Intentar buscar por ID
-            try:
-                afiliado_referido = User.objects.get(id=ref_code)
-                if afiliado_referido not in producto.afiliados.all():
-                    afiliado_referido = None
-            except (User.DoesNotExist, ValueError):
-                afiliado_referido = None
+    # Afiliado que trae el link (solo si está afiliado a este producto)
+    afiliado_referido = referidos.afiliado_referido(producto, ref_code)
 
     # Verificar si el usuario actual está afiliado
-    afiliado = False
-    if request.user.is_authenticated:
-        afiliado = request.user in producto.afiliados.all()
+    afiliado = producto.tiene_afiliado(request.user)
 
     # Verificar disponibilidad de stock
     stock_disponible = producto.tiene_stock()
@@ -177,12 +247,25 @@ def detalle_producto(request, producto_id):
         'afiliado_referido': afiliado_referido,
         'ref_code': ref_code,
         'stock_disponible': stock_disponible,
-        'cantidad_stock': producto.stock if producto.tipo_producto == 'FISICO' else None
+        'cantidad_stock': producto.stock if producto.tipo_producto == 'FISICO' else None,
+        'csrf_cookie_name': settings.CSRF_COOKIE_NAME,
     }
 
     return render(request, "productos/detalle_producto.html", context)
 
 
+def redirigir_link_corto(request, codigo):
+    """
+    /r/<codigo>/: redirige el link corto de un afiliado al detalle del
+    producto con su ?ref=. Con el código en la caché de links.py no consulta
+    la base de datos.
+    """
+    url = links.destino(codigo)
+    if url is None:
+        raise Http404('Link no encontrado')
+    return HttpResponseRedirect(url)
+
+
 @login_required
 @datos_afiliacion_requeridos  # ← DECORADOR AGREGADO
 def mis_links_afiliado(request):
@@ -190,27 +273,79 @@ def mis_links_afiliado(request):
     Vista para mostrar los links de afiliado del usuario.
     REQUIERE: datos de afiliación completos.
     """
-    productos_afiliados = request.user.productos_afiliados.filter(activo=True)
+    links_cortos = links.links_de(request.user)
+
+    # Clicks por producto en una sola consulta agrupada
+    clicks = dict(
+        ClickAfiliado.objects.filter(afiliado=request.user)
+        .values_list('producto_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    visitantes_producto, visitantes_totales = visitantes.visitantes_por_producto(request.user)
 
-    # Generar links para cada producto usando el username como ref
+    # Links cortos ya guardados (se crean al afiliarse, ver links.py)
+    raiz = request.build_absolute_uri('/').rstrip('/')
     productos_con_link = []
-    for producto in productos_afiliados:
-        link = request.build_absolute_uri(
-            reverse('productos:detalle_producto', kwargs={'producto_id': producto.id})
-        ) + f'?ref={request.user.username}'
-
+    for link in links_cortos:
+        url = raiz + link.get_absolute_url()
         productos_con_link.append({
-            'producto': producto,
-            'link': link,
+            'producto': link.producto,
+            'codigo': link.codigo,
+            'link': url,
+            'qr_version': qr.huella(url)[:12],
+            'clicks': clicks.get(link.producto_id, 0),
+            'visitantes': visitantes_producto.get(link.producto_id, 0),
         })
 
     context = {
         'productos_con_link': productos_con_link,
+        'clicks_totales': sum(item['clicks'] for item in productos_con_link),
+        'visitantes_totales': visitantes_totales,
+        'visitantes_dias': getattr(settings, 'VISITANTES_DIAS', 30),
+        'qr_disponible': qr.DISPONIBLE,
     }
 
     return render(request, 'productos/mis_links_afiliado.html', context)
 
 
+@login_required
+def qr_link_afiliado(request, codigo, formato):
+    """
+    QR (PNG o SVG) de un link corto del usuario. La URL lleva ?v=<huella
+    del link>, así que la respuesta puede guardarse como inmutable.
+    """
+    if not qr.DISPONIBLE or formato not in qr.FORMATOS:
+        raise Http404('QR no disponible')
+    link = get_object_or_404(LinkCorto, codigo=codigo, afiliado=request.user)
+    url = request.build_absolute_uri('/').rstrip('/') + link.get_absolute_url()
+
+    response = FileResponse(
+        default_storage.open(qr.obtener_qr(url, formato), 'rb'),
+        content_type=qr.FORMATOS[formato],
+        as_attachment='descargar' in request.GET,
+        filename=f'qr-{slugify(link.producto.nombre)}-{link.codigo}.{formato}',
+    )
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+
+@login_required
+def qr_links_zip(request):
+    """Todos los QR de los links del usuario en un .zip que se envía a medida que se arma"""
+    formato = request.GET.get('formato', 'png')
+    if not qr.DISPONIBLE or formato not in qr.FORMATOS:
+        raise Http404('QR no disponible')
+    raiz = request.build_absolute_uri('/').rstrip('/')
+    archivos = (
+        (f'{slugify(link.producto.nombre)}-{link.codigo}', raiz + link.get_absolute_url())
+        for link in links.links_de(request.user).iterator()
+    )
+    response = StreamingHttpResponse(qr.descargar_zip(archivos, formato), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="qr-{request.user.username}.zip"'
+    return response
+
+
 @login_required
 def editar_perfil_vendedor(request):
     """
@@ -254,14 +389,27 @@ def estadisticas_vendedor(request):
     comision_pendiente = sum(v.comision_total for v in ventas.filter(comision_pagada=False))
     comision_pagada = sum(v.comision_total for v in ventas.filter(comision_pagada=True))
 
+    # Visitantes únicos estimados de los links (sketches HyperLogLog, ver visitantes.py)
+    visitantes_producto, visitantes_totales = visitantes.visitantes_por_producto(request.user)
+    productos_visitados = sorted(
+        (
+            {'producto': producto, 'visitantes': visitantes_producto.get(producto.pk, 0)}
+            for producto in productos_afiliados.filter(activo=True)
+        ),
+        key=lambda item: -item['visitantes'],
+    )
+
     context = {
         'total_productos': productos_afiliados.count(),
-        'productos_activos': productos_afiliados.filter(activo=True).count(),
+        'productos_activos': len(productos_visitados),
         'total_ventas': total_ventas,
         'comision_total': comision_total,
         'comision_pendiente': comision_pendiente,
         'comision_pagada': comision_pagada,
         'ventas_recientes': ventas.order_by('-fecha_creacion')[:10],
+        'productos_visitados': productos_visitados,
+        'visitantes_totales': visitantes_totales,
+        'visitantes_dias': getattr(settings, 'VISITANTES_DIAS', 30),
     }
 
     return render(request, 'productos/estadisticas_vendedor.html', context)
@@ -271,29 +419,33 @@ def estadisticas_vendedor(request):
 # 🛒 SISTEMA DE CARRITO CON STOCK
 # ============================================================================
 
-@login_required
+def _cantidad_pedida(request):
+    """Cantidad del formulario, o None si no es un número entero de al menos 1"""
+    try:
+        cantidad = int(request.POST.get('cantidad', 1))
+    except (TypeError, ValueError):
+        return None
+    return cantidad if cantidad >= 1 else None
+
+
 def agregar_al_carrito(request, producto_id):
-    """Agregar producto al carrito con validación de stock"""
+    """
+    Agregar producto al carrito con validación de stock. El carrito vive en
+    una cookie firmada (ver carrito.py): no escribe en la base de datos.
+    """
     if request.method == 'POST':
         producto = get_object_or_404(Producto, id=producto_id, activo=True)
-        cantidad = int(request.POST.get('cantidad', 1))
-
-        # Obtener el afiliado referido si existe
-        ref_code = request.POST.get('ref_code', None)
-        afiliado_referido = None
+        cantidad = _cantidad_pedida(request)
 
-        if ref_code:
-            try:
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                afiliado_referido = User.objects.get(username=ref_code)
-                if afiliado_referido not in producto.afiliados.all():
-                    afiliado_referido = None
-            except User.DoesNotExist:
-                pass
+        # Afiliado que trajo al cliente: de la cookie de atribución (sin
+        # consultas) o, si no hay, del ref_code que envía el formulario
+        afiliado_referido_id = afiliado_para(request, producto.pk)
+        if afiliado_referido_id is None:
+            referido = referidos.afiliado_referido(producto, request.POST.get('ref_code'))
+            afiliado_referido_id = referido.id if referido else None
 
         # Validar cantidad
-        if cantidad < 1:
+        if cantidad is None:
             messages.error(request, 'La cantidad debe ser al menos 1.')
             return redirect('productos:detalle_producto', producto_id=producto_id)
 
@@ -305,299 +457,295 @@ def agregar_al_carrito(request, producto_id):
             )
             return redirect('productos:detalle_producto', producto_id=producto_id)
 
-        # Obtener o crear carrito (pedido pendiente)
-        carrito, created = Pedido.objects.get_or_create(
-            usuario=request.user,
-            estado='PENDIENTE',
-            defaults={'total': 0}
-        )
-
-        # Asignar afiliado al carrito si no tiene uno y viene con referencia
-        if not carrito.afiliado_referido and afiliado_referido:
-            carrito.afiliado_referido = afiliado_referido
-            carrito.save()
-
-        # Verificar si el producto ya está en el carrito
-        item_existente = ItemPedido.objects.filter(
-            pedido=carrito,
-            producto=producto
-        ).first()
-
-        if item_existente:
-            nueva_cantidad = item_existente.cantidad + cantidad
+        carrito = Carrito.desde_request(request)
+        en_carrito = carrito.cantidad(producto.pk)
 
+        if en_carrito:
             # Validar stock para la nueva cantidad total
-            if not producto.tiene_stock(nueva_cantidad):
+            if not producto.tiene_stock(en_carrito + cantidad):
                 messages.error(
                     request,
-                    f'No puedes agregar {cantidad} unidades más. Solo hay {producto.stock} disponibles y ya tienes {item_existente.cantidad} en el carrito.'
+                    f'No puedes agregar {cantidad} unidades más. Solo hay {producto.stock} disponibles y ya tienes {en_carrito} en el carrito.'
                 )
                 return redirect('productos:detalle_producto', producto_id=producto_id)
-
-            item_existente.cantidad = nueva_cantidad
-            item_existente.save()
             messages.success(request, f'Cantidad actualizada en el carrito.')
         else:
-            # Crear nuevo item en el carrito
-            ItemPedido.objects.create(
-                pedido=carrito,
-                producto=producto,
-                cantidad=cantidad,
-                precio_unitario=producto.precio
-            )
+            if len(carrito) >= maximo_items_carrito():
+                messages.error(request, 'Tu carrito está lleno. Confirma tu pedido o quita algún producto.')
+                return redirect('productos:ver_carrito')
             messages.success(request, f'{producto.nombre} agregado al carrito.')
 
+        carrito.agregar(producto, cantidad, afiliado_referido_id)
+
         # Redirigir al carrito después de agregar
-        return redirect('productos:ver_carrito')
+        response = redirect('productos:ver_carrito')
+        carrito.guardar(response)
+        return response
 
     return redirect('productos:detalle_producto', producto_id=producto_id)
 
-@login_required
+
 def ver_carrito(request):
     """Ver contenido del carrito"""
-    try:
-        carrito = Pedido.objects.get(usuario=request.user, estado='PENDIENTE')
-        items = carrito.items.all()
-
-        # Verificar stock de cada item
-        items_con_stock = []
-        for item in items:
-            item.stock_suficiente = item.producto.tiene_stock(item.cantidad)
-            items_con_stock.append(item)
+    carrito = Carrito.desde_request(request)
+    if request.user.is_authenticated:
+        # Carrito PENDIENTE guardado en la base antes del carrito en cookie
+        carrito.absorber_pendiente(request.user)
 
-        context = {
-            'carrito': carrito,
-            'items': items_con_stock,
-        }
-    except Pedido.DoesNotExist:
-        context = {
-            'carrito': None,
-            'items': [],
-        }
+    items = carrito.lineas()
+    context = {
+        'carrito': carrito if items else None,
+        'items': items,
+    }
 
-    return render(request, 'productos/carrito.html', context)
+    response = render(request, 'productos/carrito.html', context)
+    if carrito.modificado:
+        carrito.guardar(response)
+    return response
 
 
-@login_required
-def actualizar_cantidad_carrito(request, item_id):
-    """Actualizar cantidad de un item en el carrito"""
+def actualizar_cantidad_carrito(request, producto_id):
+    """Actualizar cantidad de un producto en el carrito"""
     if request.method == 'POST':
-        item = get_object_or_404(ItemPedido, id=item_id, pedido__usuario=request.user)
-        nueva_cantidad = int(request.POST.get('cantidad', 1))
+        carrito = Carrito.desde_request(request)
+        if not carrito.cantidad(producto_id):
+            raise Http404('El producto no está en el carrito')
+        producto = get_object_or_404(Producto, id=producto_id)
+        nueva_cantidad = _cantidad_pedida(request)
 
-        if nueva_cantidad < 1:
+        if nueva_cantidad is None:
             messages.error(request, 'La cantidad debe ser al menos 1.')
             return redirect('productos:ver_carrito')
 
         # Validar stock
-        if not item.producto.tiene_stock(nueva_cantidad):
+        if not producto.tiene_stock(nueva_cantidad):
             messages.error(
                 request,
-                f'Stock insuficiente. Solo hay {item.producto.stock} unidades disponibles.'
+                f'Stock insuficiente. Solo hay {producto.stock} unidades disponibles.'
             )
             return redirect('productos:ver_carrito')
 
-        item.cantidad = nueva_cantidad
-        item.save()
+        carrito.actualizar(producto_id, nueva_cantidad)
         messages.success(request, 'Cantidad actualizada.')
+        response = redirect('productos:ver_carrito')
+        carrito.guardar(response)
+        return response
 
     return redirect('productos:ver_carrito')
 
 
-@login_required
-def eliminar_del_carrito(request, item_id):
-    """Eliminar un item del carrito"""
-    item = get_object_or_404(ItemPedido, id=item_id, pedido__usuario=request.user)
-    producto_nombre = item.producto.nombre
-    item.delete()
-    messages.success(request, f'{producto_nombre} eliminado del carrito.')
-    return redirect('productos:ver_carrito')
+def eliminar_del_carrito(request, producto_id):
+    """Eliminar un producto del carrito"""
+    carrito = Carrito.desde_request(request)
+    if not carrito.cantidad(producto_id):
+        raise Http404('El producto no está en el carrito')
+    producto_nombre = Producto.objects.filter(pk=producto_id).values_list('nombre', flat=True).first()
+    carrito.quitar(producto_id)
+    if producto_nombre:
+        messages.success(request, f'{producto_nombre} eliminado del carrito.')
+    response = redirect('productos:ver_carrito')
+    carrito.guardar(response)
+    return response
+
+
+def _avisar_faltantes(request, faltantes):
+    for faltante in faltantes:
+        messages.error(
+            request,
+            f'Stock insuficiente para {faltante.nombre}: pediste {faltante.solicitado} '
+            f'y quedan {faltante.disponible}.'
+        )
 
 
 # Fragmento de código para actualizar la vista confirmar_pedido en productos/views.py
 @login_required
-@transaction.atomic
 def confirmar_pedido(request):
-    """Vista para confirmar el pedido con selección de método de pago"""
-    try:
-        carrito = Pedido.objects.get(usuario=request.user, estado='PENDIENTE')
-        items = carrito.items.all()
+    """
+    Vista para confirmar el pedido con selección de método de pago. Recién
+    acá el carrito de la cookie se convierte en un Pedido con sus items.
+    """
+    carrito = Carrito.desde_request(request)
+    if carrito.absorber_pendiente(request.user):
+        # Carrito PENDIENTE de la base: se pasa a la cookie y se vuelve a empezar
+        response = redirect('productos:confirmar_pedido')
+        carrito.guardar(response)
+        return response
+
+    items = carrito.lineas()
+    if not items:
+        messages.error(request, 'Tu carrito está vacío.')
+        return redirect('productos:ver_carrito')
 
-        if not items:
-            messages.error(request, 'Tu carrito está vacío.')
-            return redirect('productos:ver_carrito')
+    # Validar stock con los productos ya leídos por lineas() (sin consultas);
+    # el descuento real al confirmar vuelve a validar en la base
+    sin_stock = [item for item in items if not item.stock_suficiente]
+    if sin_stock:
+        for item in sin_stock:
+            messages.error(
+                request,
+                f'Stock insuficiente para {item.producto.nombre}.'
+            )
+        return redirect('productos:ver_carrito')
 
-        # Validar stock
-        for item in items:
-            if not item.producto.tiene_stock(item.cantidad):
-                messages.error(
-                    request,
-                    f'Stock insuficiente para {item.producto.nombre}.'
-                )
-                return redirect('productos:ver_carrito')
+    # Verificar si solo hay productos digitales
+    solo_digitales = all(item.producto.tipo_producto == 'DIGITAL' for item in items)
 
-        # Verificar si solo hay productos digitales
-        solo_digitales = all(item.producto.tipo_producto == 'DIGITAL' for item in items)
+    # Obtener configuración de pagos
+    try:
+        config_pagos = ConfiguracionPagos.objects.first()
+    except ConfiguracionPagos.DoesNotExist:
+        config_pagos = None
 
-        # Obtener configuración de pagos
-        try:
-            config_pagos = ConfiguracionPagos.objects.first()
-        except ConfiguracionPagos.DoesNotExist:
-            config_pagos = None
-
-        if request.method == 'POST':
-            # Obtener datos del formulario
-            metodo_pago = request.POST.get('metodo_pago')
-            nombre_completo = request.POST.get('nombre_completo')
-            email = request.POST.get('email')
-            telefono = request.POST.get('telefono')
-            direccion_envio = request.POST.get('direccion_envio', '')
-            ciudad = request.POST.get('ciudad', '')
-            notas = request.POST.get('notas', '')
-            comprobante = request.FILES.get('comprobante_pago')
-
-            # Obtener datos bancarios dinámicos si se enviaron
-            datos_banco_nombre = request.POST.get('datos_banco_nombre', '')
-            datos_banco_cuenta = request.POST.get('datos_banco_cuenta', '')
-            datos_banco_titular = request.POST.get('datos_banco_titular', '')
-            datos_banco_cedula = request.POST.get('datos_banco_cedula', '')
-
-            print(f"DEBUG: Método de pago recibido: {metodo_pago}")  # Debug
-
-            # Validaciones básicas
-            if not metodo_pago:
-                messages.error(request, 'Por favor selecciona un método de pago.')
+    if request.method == 'POST':
+        # Obtener datos del formulario
+        metodo_pago = request.POST.get('metodo_pago')
+        nombre_completo = request.POST.get('nombre_completo')
+        email = request.POST.get('email')
+        telefono = request.POST.get('telefono')
+        direccion_envio = request.POST.get('direccion_envio', '')
+        ciudad = request.POST.get('ciudad', '')
+        notas = request.POST.get('notas', '')
+        comprobante = request.FILES.get('comprobante_pago')
+
+        # Obtener datos bancarios dinámicos si se enviaron
+        datos_banco_nombre = request.POST.get('datos_banco_nombre', '')
+        datos_banco_cuenta = request.POST.get('datos_banco_cuenta', '')
+        datos_banco_titular = request.POST.get('datos_banco_titular', '')
+        datos_banco_cedula = request.POST.get('datos_banco_cedula', '')
+
+        # Validaciones básicas
+        if not metodo_pago:
+            messages.error(request, 'Por favor selecciona un método de pago.')
+            return redirect('productos:confirmar_pedido')
+
+        if not nombre_completo or not email or not telefono:
+            messages.error(request, 'Por favor completa tu nombre, email y teléfono.')
+            return redirect('productos:confirmar_pedido')
+
+        # Validación específica por método de pago
+        if metodo_pago == 'TRANSFERENCIA':
+            # Para transferencias: requiere comprobante siempre
+            if not comprobante:
+                messages.error(request, 'Para transferencias debes subir el comprobante de pago.')
                 return redirect('productos:confirmar_pedido')
 
-            if not nombre_completo or not email or not telefono:
-                messages.error(request, 'Por favor completa tu nombre, email y teléfono.')
+            # Si hay productos físicos, requiere dirección
+            if not solo_digitales:
+                if not direccion_envio or not ciudad:
+                    messages.error(request, 'Para productos físicos necesitamos la dirección de entrega.')
+                    return redirect('productos:confirmar_pedido')
+
+        elif metodo_pago == 'CONTRA_ENTREGA':
+            # Para contra entrega: siempre requiere dirección
+            if not direccion_envio or not ciudad:
+                messages.error(request, 'Para pago en puerta necesitamos la dirección de entrega.')
                 return redirect('productos:confirmar_pedido')
 
-            # Validación específica por método de pago
-            if metodo_pago == 'TRANSFERENCIA':
-                print("DEBUG: Procesando transferencia")  # Debug
+        elif metodo_pago == 'TARJETA':
+            messages.error(request, 'El método de pago con tarjeta aún no está disponible.')
+            return redirect('productos:confirmar_pedido')
+
+        # Crear o actualizar configuración bancaria si se enviaron datos
+        if metodo_pago == 'TRANSFERENCIA' and datos_banco_nombre and datos_banco_cuenta:
+            if not config_pagos:
+                config_pagos = ConfiguracionPagos.objects.create(
+                    banco_nombre=datos_banco_nombre,
+                    banco_cuenta=datos_banco_cuenta,
+                    banco_titular=datos_banco_titular,
+                    banco_cedula=datos_banco_cedula
+                )
+            else:
+                config_pagos.banco_nombre = datos_banco_nombre
+                config_pagos.banco_cuenta = datos_banco_cuenta
+                config_pagos.banco_titular = datos_banco_titular
+                config_pagos.banco_cedula = datos_banco_cedula
+                config_pagos.save()
+
+        # Atribución: si el carrito no tiene afiliado pero la cookie
+        # apunta a uno de sus productos, la venta es de ese afiliado
+        if not carrito.afiliado_referido_id:
+            for item in items:
+                afiliado_id = afiliado_para(request, item.producto_id)
+                if afiliado_id:
+                    carrito.afiliado_referido_id = afiliado_id
+                    break
+
+        pedido = carrito.nuevo_pedido(
+            request.user,
+            nombre_completo=nombre_completo,
+            email=email,
+            telefono=telefono,
+            direccion_envio=direccion_envio,
+            ciudad=ciudad,
+            notas=notas,
+            metodo_pago=metodo_pago,
+            comprobante_pago=comprobante or None,
+        )
 
-                # Para transferencias: requiere comprobante siempre
-                if not comprobante:
-                    messages.error(request, 'Para transferencias debes subir el comprobante de pago.')
-                    return redirect('productos:confirmar_pedido')
+        # Procesar el pedido
+        try:
+            # El comprobante se comprime (Pillow) antes de la transacción:
+            # nada lento corre mientras haya filas bloqueadas
+            procesar_comprobante(pedido)
 
-                # Si hay productos físicos, requiere dirección
-                if not solo_digitales:
-                    if not direccion_envio or not ciudad:
-                        messages.error(request, 'Para productos físicos necesitamos la dirección de entrega.')
-                        return redirect('productos:confirmar_pedido')
+            with transaction.atomic():
+                # Crear el pedido confirmado con los items del carrito
+                carrito.crear_pedido(pedido)
 
-            elif metodo_pago == 'CONTRA_ENTREGA':
-                print("DEBUG: Procesando contra entrega")  # Debug
+                # El stock se descuenta abajo: las reservas del checkout sobran
+                reservas.liberar(request.user)
 
-                # Para contra entrega: siempre requiere dirección
-                if not direccion_envio or not ciudad:
-                    messages.error(request, 'Para pago en puerta necesitamos la dirección de entrega.')
-                    return redirect('productos:confirmar_pedido')
+                # Email de confirmación a la cola de salida (lo manda enviar_correos)
+                if metodo_pago == 'TRANSFERENCIA':
+                    encolar_email_confirmacion_transferencia(pedido, config_pagos)
+                else:
+                    encolar_email_confirmacion(pedido)
 
-            elif metodo_pago == 'TARJETA':
-                messages.error(request, 'El método de pago con tarjeta aún no está disponible.')
-                return redirect('productos:confirmar_pedido')
+                # Validar y descontar el stock de todos los productos a la vez
+                # (si alguno no alcanza no se descuenta nada). Va al final: los
+                # UPDATE bloquean las filas de los productos hasta el commit
+                inventario.descontar(inventario.cantidades_fisicas(items), usuario=request.user)
 
-            # Crear o actualizar configuración bancaria si se enviaron datos
-            if metodo_pago == 'TRANSFERENCIA' and datos_banco_nombre and datos_banco_cuenta:
-                if not config_pagos:
-                    config_pagos = ConfiguracionPagos.objects.create(
-                        banco_nombre=datos_banco_nombre,
-                        banco_cuenta=datos_banco_cuenta,
-                        banco_titular=datos_banco_titular,
-                        banco_cedula=datos_banco_cedula
-                    )
-                    print("DEBUG: Configuración bancaria creada")  # Debug
-                else:
-                    config_pagos.banco_nombre = datos_banco_nombre
-                    config_pagos.banco_cuenta = datos_banco_cuenta
-                    config_pagos.banco_titular = datos_banco_titular
-                    config_pagos.banco_cedula = datos_banco_cedula
-                    config_pagos.save()
-                    print("DEBUG: Configuración bancaria actualizada")  # Debug
-
-            # Procesar el pedido
-            try:
-                with transaction.atomic():
-                    # Verificar stock una vez más
-                    for item in items:
-                        if not item.producto.tiene_stock(item.cantidad):
-                            messages.error(
-                                request,
-                                f'Stock insuficiente para {item.producto.nombre}.'
-                            )
-                            return redirect('productos:ver_carrito')
-
-                    # Actualizar el pedido
-                    carrito.nombre_completo = nombre_completo
-                    carrito.email = email
-                    carrito.telefono = telefono
-                    carrito.direccion_envio = direccion_envio
-                    carrito.ciudad = ciudad
-                    carrito.notas = notas
-                    carrito.metodo_pago = metodo_pago
-
-                    if comprobante:
-                        carrito.comprobante_pago = comprobante
-
-                    # Confirmar el pedido
-                    carrito.estado = 'CONFIRMADO'
-                    carrito.fecha_confirmacion = timezone.now()
-                    carrito.save()
-
-                    print(f"DEBUG: Pedido {carrito.numero_pedido} confirmado con método {metodo_pago}")  # Debug
-
-                    # Reducir stock
-                    for item in items:
-                        if item.producto.tipo_producto == 'FISICO':
-                            item.producto.reducir_stock(item.cantidad)
-
-                # Enviar email de confirmación
-                try:
-                    if metodo_pago == 'TRANSFERENCIA':
-                        enviar_email_confirmacion_transferencia(carrito, config_pagos)
-                    else:
-                        enviar_email_confirmacion(carrito)
-                    print("DEBUG: Email de confirmación enviado")  # Debug
-                except Exception as e:
-                    print(f"Error enviando email: {e}")
-
-                messages.success(
-                    request,
-                    f'¡Pedido #{carrito.numero_pedido} confirmado exitosamente!'
-                )
-                return redirect('productos:detalle_pedido', pedido_id=carrito.id)
+            messages.success(
+                request,
+                f'¡Pedido #{pedido.numero_pedido} confirmado exitosamente!'
+            )
+            response = redirect('productos:detalle_pedido', pedido_id=pedido.id)
+            carrito.vaciar()
+            carrito.guardar(response)
+            return response
 
-            except Exception as e:
-                print(f"Error procesando pedido: {e}")  # Debug
-                messages.error(request, 'Hubo un error al procesar tu pedido. Inténtalo de nuevo.')
-                return redirect('productos:confirmar_pedido')
+        except inventario.StockInsuficiente as e:
+            _avisar_faltantes(request, e.faltantes)
+            return redirect('productos:ver_carrito')
+
+        except Exception:
+            logger.exception('Error procesando el pedido de %s', request.user.pk)
+            messages.error(request, 'Hubo un error al procesar tu pedido. Inténtalo de nuevo.')
+            return redirect('productos:confirmar_pedido')
 
-        # GET - mostrar formulario
-        context = {
-            'carrito': carrito,
-            'items': items,
-            'solo_digitales': solo_digitales,
-            'config_pagos': config_pagos,
-        }
+    # GET - mostrar formulario, apartando el stock mientras se completa
+    faltantes = reservas.reservar(request.user, inventario.cantidades_fisicas(items))
+    if faltantes:
+        _avisar_faltantes(request, faltantes)
+        return redirect('productos:ver_carrito')
 
-        return render(request, 'productos/confirmar_pedido.html', context)
+    context = {
+        'carrito': carrito,
+        'items': items,
+        'solo_digitales': solo_digitales,
+        'config_pagos': config_pagos,
+    }
 
-    except Pedido.DoesNotExist:
-        messages.error(request, 'No tienes un carrito activo.')
-        return redirect('productos:home')
+    return render(request, 'productos/confirmar_pedido.html', context)
 
 
 # ✅ NUEVA FUNCIÓN: Email específico para transferencias
-def enviar_email_confirmacion_transferencia(pedido, config_pagos):
+def encolar_email_confirmacion_transferencia(pedido, config_pagos):
     """
-    Función auxiliar para enviar email de confirmación para transferencias
+    Función auxiliar que deja en la cola de salida el email de confirmación
+    para transferencias
     """
-    from django.core.mail import send_mail
-    from django.conf import settings
-
     asunto = f'Pedido #{pedido.numero_pedido} - Transferencia Recibida'
 
     # Información bancaria en el email
@@ -631,23 +779,14 @@ Saludos,
 Tu Tienda
     """
 
-    send_mail(
-        asunto,
-        mensaje,
-        settings.DEFAULT_FROM_EMAIL,
-        [pedido.email],
-        fail_silently=True,
-    )
+    correos.encolar(asunto, mensaje, [pedido.email], pedido=pedido)
 
 
 # Función original para otros métodos de pago (ya existente)
-def enviar_email_confirmacion(pedido):
+def encolar_email_confirmacion(pedido):
     """
-    Función auxiliar para enviar email de confirmación
+    Función auxiliar que deja en la cola de salida el email de confirmación
     """
-    from django.core.mail import send_mail
-    from django.conf import settings
-
     asunto = f'Pedido #{pedido.numero_pedido} - Confirmación'
     mensaje = f"""
 Hola {pedido.nombre_completo},
@@ -666,13 +805,7 @@ Saludos,
 Tu Tienda
     """
 
-    send_mail(
-        asunto,
-        mensaje,
-        settings.DEFAULT_FROM_EMAIL,
-        [pedido.email],
-        fail_silently=True,
-    )
+    correos.encolar(asunto, mensaje, [pedido.email], pedido=pedido)
 
 
 @login_required
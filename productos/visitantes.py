@@ -0,0 +1,74 @@
+"""
+Visitantes únicos por link de afiliado (afiliado, producto, día).
+
+No se guarda la lista de visitantes: cada combinación tiene un sketch
+HyperLogLog (hll.py) de unos pocos KB como máximo. Los sketches se
+alimentan desde el buffer de clicks (clics.py): al vaciar un lote se arma
+un sketch por combinación con los hashes de visitante y se fusiona con el
+guardado en la base, así que no hay una escritura más por visita.
+
+Como los sketches se fusionan, los totales de varios días (o de todos los
+productos de un afiliado) salen de juntar las filas en Python.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .models import SketchVisitantes
+
+
+def _precision():
+    return getattr(settings, 'VISITANTES_PRECISION', 12)
+
+
+def acumular(clicks):
+    """
+    Suma a los sketches guardados los visitantes de un lote de clicks
+    [(afiliado_id, producto_id, fecha, visitante)].
+    """
+    nuevos = defaultdict(lambda: HyperLogLog(_precision()))
+    for afiliado_id, producto_id, fecha, visitante in clicks:
+        nuevos[(afiliado_id, producto_id, timezone.localdate(fecha))].agregar(visitante)
+
+    for (afiliado_id, producto_id, dia), sketch in nuevos.items():
+        with transaction.atomic():
+            fila, creada = SketchVisitantes.objects.select_for_update().get_or_create(
+                afiliado_id=afiliado_id, producto_id=producto_id, dia=dia,
+                defaults={'sketch': sketch.a_bytes()},
+            )
+            if not creada:
+                guardado = HyperLogLog.desde_bytes(fila.sketch)
+                if guardado.p == sketch.p:
+                    sketch.fusionar(guardado)
+                fila.sketch = sketch.a_bytes()
+                fila.save(update_fields=['sketch'])
+
+
+def visitantes_por_producto(afiliado, dias=None):
+    """
+    ({producto_id: visitantes únicos}, visitantes únicos en total) del
+    afiliado en los últimos `dias` días (VISITANTES_DIAS por defecto).
+    """
+    dias = dias or getattr(settings, 'VISITANTES_DIAS', 30)
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    filas = SketchVisitantes.objects.filter(
+        afiliado=afiliado, dia__gte=desde
+    ).values_list('producto_id', 'sketch')
+
+    por_producto = {}
+    total = HyperLogLog(_precision())
+    for producto_id, datos in filas:
+        sketch = HyperLogLog.desde_bytes(datos)
+        if sketch.p != total.p:
+            continue
+        if producto_id in por_producto:
+            por_producto[producto_id].fusionar(sketch)
+        else:
+            por_producto[producto_id] = sketch
+        total.fusionar(sketch)
+
+    return {pk: sketch.estimar() for pk, sketch in por_producto.items()}, total.estimar()
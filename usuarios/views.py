@@ -9,6 +9,10 @@ from productos.models import Pedido, Producto
 from django.shortcuts import render
 from django.conf import settings
 from productos.models import Producto
+from productos.catalogo import contar_productos_por_tipo
+from productos.cache_paginas import cachear_pagina_anonima
+from productos.condicional import condicional_catalogo
+from productos.carrito import Carrito
 
 
 def registro_usuario(request):
@@ -173,12 +177,8 @@ def home(request):
             usuario=request.user
         ).exclude(estado='PENDIENTE').count()
 
-        # Items en carrito
-        try:
-            carrito = Pedido.objects.get(usuario=request.user, estado='PENDIENTE')
-            context['items_carrito'] = carrito.items.count()
-        except Pedido.DoesNotExist:
-            context['items_carrito'] = 0
+        # Items en carrito (cookie, ver productos/carrito.py)
+        context['items_carrito'] = len(Carrito.desde_request(request))
 
         # Últimos 5 pedidos
         context['ultimos_pedidos'] = Pedido.objects.filter(
@@ -377,16 +377,22 @@ def custom_google_signup_handler(request, socialaccount):
 
 
 # ======== LANDING PAGE PRINCIPAL ========
+@condicional_catalogo
+@cachear_pagina_anonima('landing')
 def landing_page(request):
     """
     Vista de la landing page principal que se muestra a TODOS los usuarios.
     Ya no redirige automáticamente a usuarios logueados.
+
+    Para visitantes anónimos la respuesta sale de la caché de páginas.
     """
-    # Estadísticas básicas para mostrar en la landing (datos reales)
+    # Estadísticas básicas para mostrar en la landing (datos reales, cacheados)
+    totales = contar_productos_por_tipo()
+
     context = {
-        'total_productos': Producto.objects.filter(activo=True).count(),
-        'productos_fisicos': Producto.objects.filter(activo=True, tipo_producto='FISICO').count(),
-        'productos_digitales': Producto.objects.filter(activo=True, tipo_producto='DIGITAL').count(),
+        'total_productos': totales['total'],
+        'productos_fisicos': totales['fisicos'],
+        'productos_digitales': totales['digitales'],
 
         # Configuración de la plataforma desde settings
         'platform_name': getattr(settings, 'PLATFORM_NAME', 'AfiliaMax'),
@@ -416,17 +422,10 @@ def comprador_dashboard(request):
             usuario=request.user
         ).exclude(estado='PENDIENTE').order_by('-fecha_creacion')[:5],
 
-        # Items en carrito actual
-        'items_carrito': 0,
+        # Items en carrito actual (cookie, ver productos/carrito.py)
+        'items_carrito': len(Carrito.desde_request(request)),
     }
 
-    # Calcular items en carrito
-    try:
-        carrito = Pedido.objects.get(usuario=request.user, estado='PENDIENTE')
-        context['items_carrito'] = carrito.items.count()
-    except Pedido.DoesNotExist:
-        pass
-
     return render(request, 'usuarios/comprador_dashboard.html', context)
 
 